@@ -0,0 +1,77 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""
+Compares the configuration loading time of a fresh process:
+without the cache, with a cold (empty) cache, and with a warm cache.
+
+Usage: python benchmarks/config_startup.py [runs]
+"""
+
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+_PROBE = '''
+import time
+t0 = time.perf_counter()
+from spline_agent.config_loader import load_config
+t1 = time.perf_counter()
+load_config()['spline.mode']
+t2 = time.perf_counter()
+print(t1 - t0, t2 - t1)
+'''
+
+
+def _run(env: dict[str, str]) -> tuple[float, float]:
+    out = subprocess.run([sys.executable, '-c', _PROBE], env=env, check=True, capture_output=True, text=True).stdout
+    import_sec, load_sec = map(float, out.split())
+    return import_sec, load_sec
+
+
+def _report(label: str, samples: list[tuple[float, float]]):
+    import_ms = statistics.median(s[0] for s in samples) * 1000
+    load_ms = statistics.median(s[1] for s in samples) * 1000
+    print(f'{label:<10} import: {import_ms:8.2f} ms   load_config(): {load_ms:8.2f} ms')
+
+
+def main(runs: int):
+    src_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+    base_env = {k: v for k, v in os.environ.items() if k != 'SPLINE_CONFIG_CACHE_DIR'}
+    base_env['PYTHONPATH'] = os.pathsep.join(filter(None, [src_dir, base_env.get('PYTHONPATH')]))
+
+    cache_dir = tempfile.mkdtemp(prefix='spline-config-cache-')
+    cache_env = dict(base_env, SPLINE_CONFIG_CACHE_DIR=cache_dir)
+    try:
+        no_cache = [_run(base_env) for _ in range(runs)]
+
+        cold = []
+        for _ in range(runs):
+            shutil.rmtree(cache_dir)
+            cold.append(_run(cache_env))
+
+        warm = [_run(cache_env) for _ in range(runs)]
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    _report('no cache', no_cache)
+    _report('cold', cold)
+    _report('warm', warm)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
@@ -0,0 +1,73 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+Measures the memory taken by the lineage buffered in the process, e.g. in the deferred harvesting queue,
+in bytes per `Lineage` of a tracked function reading from three data sources.
+
+Usage: python benchmarks/lineage_memory.py [count]
+"""
+
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from spline_agent.context import LineageTrackingContext  # noqa: E402
+from spline_agent.datasources import DataSource  # noqa: E402
+from spline_agent.enums import WriteMode  # noqa: E402
+from spline_agent.harvester import harvest_lineage  # noqa: E402
+from spline_agent.lineage_model import NameAndVersion  # noqa: E402
+
+_SYSTEM_INFO = NameAndVersion(name='benchmark', version='1.0')
+
+
+def tracked_function():
+    pass
+
+
+def _harvest(i: int):
+    # the data sources are parsed from strings per execution, as in the decorators
+    ctx = LineageTrackingContext()
+    ctx.name = 'tracked_function'
+    ctx.system_info = _SYSTEM_INFO
+    for n in range(3):
+        ctx.add_input(DataSource(''.join(('s3://bucket/input/', str(n)))))
+    ctx.output = DataSource(''.join(('s3://bucket/output/', 'table')))
+    ctx.write_mode = WriteMode.APPEND
+    return harvest_lineage(ctx, tracked_function, 1000 + i, None, timestamp=i)
+
+
+def main(count: int):
+    tracemalloc.start()
+
+    # warm up the caches, e.g. the source code and the process environment, and let the internal tables grow
+    for i in range(count):
+        _harvest(i)
+
+    gc.collect()
+    before, _ = tracemalloc.get_traced_memory()
+    buffered = [_harvest(i) for i in range(count)]
+    gc.collect()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f'{(after - before) / len(buffered):.0f} bytes per buffered Lineage ({count} buffered)')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
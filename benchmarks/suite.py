@@ -0,0 +1,322 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+"""
+Measures the agent overhead, and compares the results against a baseline.
+
+    python benchmarks/suite.py run [--output results.json] [--group harvest ...]
+    python benchmarks/suite.py compare baseline.json results.json [--threshold 0.2]
+
+The `compare` command exits with the status 1 when any benchmark is worse than the baseline
+by more than the threshold, i.e. the relative change. The times are the best of several repeats,
+so the results of the same machine are comparable, while the results of different machines are not.
+"""
+
+import argparse
+import gc
+import importlib.util
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+from types import ModuleType
+from typing import Any, Callable, Iterator, NamedTuple, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+import spline_agent  # noqa: E402
+from spline_agent import msgpack_codec  # noqa: E402
+from spline_agent.context import LineageTrackingContext  # noqa: E402
+from spline_agent.datasources import DataSource  # noqa: E402
+from spline_agent.decorators.spel_evaluator import SpELEvaluator  # noqa: E402
+from spline_agent.dispatcher import LineageDispatcher  # noqa: E402
+from spline_agent.dispatchers.http_dispatcher import HttpLineageDispatcher  # noqa: E402
+from spline_agent.enums import SplineMode, WriteMode  # noqa: E402
+from spline_agent.harvester import harvest_lineage  # noqa: E402
+from spline_agent.json_serde import to_compact_json_str, to_ndjson_str  # noqa: E402
+from spline_agent.lineage_model import ExecutionEvent, ExecutionPlan, Lineage, NameAndVersion  # noqa: E402
+from spline_agent.testing.fake_producer import EVENTS_PATH, PLANS_PATH, FakeSplineProducer  # noqa: E402
+
+_SYSTEM_INFO = NameAndVersion(name='benchmark', version='1.0')
+
+DEFAULT_THRESHOLD = 0.2
+
+
+class Result(NamedTuple):
+    name: str
+    value: float
+    unit: str
+    higher_is_better: bool = False
+
+
+class NoOpDispatcher(LineageDispatcher):
+    def send_plan(self, plan: ExecutionPlan):
+        pass
+
+    def send_event(self, event: ExecutionEvent):
+        pass
+
+
+def _ns_per_call(func: Callable[[], Any], repeat: int = 5) -> float:
+    """
+    The best time of a call out of the repeated runs, each taking at least 0.2 seconds
+    """
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number * 1e9
+
+
+def _retained_bytes(func: Callable[[], Any], count: int = 200) -> float:
+    """
+    The memory retained by the objects returned by the function, per object
+    """
+    func()
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    retained = [func() for _ in range(count)]
+    gc.collect()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (after - before) / len(retained)
+
+
+def _source_module(directory: str, statement_count: int) -> ModuleType:
+    """
+    A module with a single function of the given number of statements, to measure the source code capture
+    """
+    name = f'bench_source_{statement_count}'
+    path = os.path.join(directory, f'{name}.py')
+    with open(path, 'w') as f:
+        f.write('def tracked_function():\n')
+        f.writelines(f'    x{i} = {i}\n' for i in range(statement_count))
+    spec = importlib.util.spec_from_file_location(name, path)
+    assert spec is not None and spec.loader is not None
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _harvest(func: Callable, input_count: int) -> Lineage:
+    ctx = LineageTrackingContext()
+    ctx.name = 'tracked_function'
+    ctx.system_info = _SYSTEM_INFO
+    for i in range(input_count):
+        ctx.add_input(DataSource(f's3://bucket/input/{i}'))
+    ctx.output = DataSource('s3://bucket/output')
+    ctx.write_mode = WriteMode.APPEND
+    return harvest_lineage(ctx, func, 1000, None)
+
+
+def bench_call_overhead(_directory: str) -> Iterator[Result]:
+    def plain_function():
+        pass
+
+    yield Result('call_overhead[plain]', _ns_per_call(plain_function), 'ns')
+
+    @spline_agent.track_lineage(mode=SplineMode.ENABLED, dispatcher=NoOpDispatcher(), system_info=_SYSTEM_INFO)
+    @spline_agent.inputs('s3://bucket/input')
+    @spline_agent.output('s3://bucket/output', WriteMode.OVERWRITE)
+    def tracked_function():
+        pass
+
+    # the same function in every mode, switched at runtime
+    try:
+        for mode in (SplineMode.DISABLED, SplineMode.BYPASS, SplineMode.ENABLED):
+            spline_agent.set_mode(mode)
+            yield Result(f'call_overhead[{mode.name}]', _ns_per_call(tracked_function), 'ns')
+    finally:
+        spline_agent.set_mode(None)
+
+
+def bench_spel_evaluator(_directory: str) -> Iterator[Result]:
+    for binding_count in (1, 8, 32):
+        params = ', '.join(f'p{i}' for i in range(binding_count))
+        namespace: dict[str, Any] = {}
+        exec(f'def func({params}): pass', namespace)
+        func = namespace['func']
+        args = tuple(f'value-{i}' for i in range(binding_count))
+
+        def evaluate():
+            SpELEvaluator(func, args, {}).eval_as_data_source('{p0}')
+
+        yield Result(f'spel_eval[bindings={binding_count}]', _ns_per_call(evaluate), 'ns')
+
+
+def bench_harvest(directory: str) -> Iterator[Result]:
+    small_module = _source_module(directory, 10)
+    for input_count in (1, 10, 100):
+        def harvest():
+            return _harvest(small_module.tracked_function, input_count)
+
+        yield Result(f'harvest[inputs={input_count}]', _ns_per_call(harvest), 'ns')
+        yield Result(f'harvest_memory[inputs={input_count}]', _retained_bytes(harvest), 'bytes')
+
+    for statement_count in (100, 10000):
+        module = _source_module(directory, statement_count)
+
+        def harvest_source():
+            return _harvest(module.tracked_function, 1)
+
+        yield Result(f'harvest[source_lines={statement_count}]', _ns_per_call(harvest_source), 'ns')
+        yield Result(f'harvest_memory[source_lines={statement_count}]', _retained_bytes(harvest_source), 'bytes')
+
+
+def bench_serialization(directory: str) -> Iterator[Result]:
+    module = _source_module(directory, 10)
+    for input_count in (1, 100):
+        lineage = _harvest(module.tracked_function, input_count)
+        for kind, obj in (('plan', lineage.plan), ('event', lineage.event)):
+            size = len(to_compact_json_str(obj).encode('utf-8'))
+            ns = _ns_per_call(lambda: to_compact_json_str(obj))
+            yield Result(f'serialization[{kind},inputs={input_count}]', ns, 'ns')
+            yield Result(f'serialization_throughput[{kind},inputs={input_count}]', size / ns * 1e3, 'MB/s', True)
+
+
+def bench_binary_codec(directory: str) -> Iterator[Result]:
+    """
+    MessagePack vs. JSON, for the records written into the local lineage files
+    """
+    module = _source_module(directory, 10)
+    for input_count in (1, 100):
+        lineage = _harvest(module.tracked_function, input_count)
+        for kind, obj in (('plan', lineage.plan), ('event', lineage.event)):
+            json_bytes = to_ndjson_str(obj).encode('utf-8')
+            msgpack_bytes = msgpack_codec.packb(obj)
+            case = f'{kind},inputs={input_count}'
+            yield Result(f'codec_size[json,{case}]', len(json_bytes), 'bytes')
+            yield Result(f'codec_size[msgpack,{case}]', len(msgpack_bytes), 'bytes')
+            yield Result(f'codec_encode[json,{case}]', _ns_per_call(lambda: to_ndjson_str(obj).encode('utf-8')), 'ns')
+            yield Result(f'codec_encode[msgpack,{case}]', _ns_per_call(lambda: msgpack_codec.packb(obj)), 'ns')
+            yield Result(f'codec_decode[json,{case}]', _ns_per_call(lambda: json.loads(json_bytes)), 'ns')
+            yield Result(f'codec_decode[msgpack,{case}]', _ns_per_call(lambda: msgpack_codec.unpackb(msgpack_bytes)), 'ns')
+
+
+def bench_http_dispatch(directory: str) -> Iterator[Result]:
+    with FakeSplineProducer() as producer:
+        dispatcher = HttpLineageDispatcher(producer.url, PLANS_PATH, EVENTS_PATH, 'application/json')
+        lineage = _harvest(_source_module(directory, 10).tracked_function, 10)
+        ns = _ns_per_call(lambda: dispatcher.send_event(lineage.event), repeat=3)
+        yield Result('http_dispatch[event]', ns, 'ns')
+        yield Result('http_dispatch_throughput[event]', 1e9 / ns, 'events/s', True)
+
+
+BENCHMARKS: dict[str, Callable[[str], Iterator[Result]]] = {
+    'call_overhead': bench_call_overhead,
+    'spel_eval': bench_spel_evaluator,
+    'harvest': bench_harvest,
+    'serialization': bench_serialization,
+    'binary_codec': bench_binary_codec,
+    'http_dispatch': bench_http_dispatch,
+}
+
+
+def run(groups: Optional[list[str]]) -> list[Result]:
+    # e.g. the BYPASS mode warns on every call, which would flood the output
+    logging.disable(logging.CRITICAL)
+    # the first tracked function configures the agent, so do it upfront, for the results not to depend on the filter
+    spline_agent.track_lineage(mode=SplineMode.BYPASS, dispatcher=NoOpDispatcher(), system_info=_SYSTEM_INFO)(print)
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix='spline-bench-') as directory:
+        for group, benchmark in BENCHMARKS.items():
+            if groups and group not in groups:
+                continue
+            for result in benchmark(directory):
+                print(f'{result.name:<50} {result.value:14.1f} {result.unit}', flush=True)
+                results.append(result)
+    return results
+
+
+def save(results: list[Result], path: str):
+    document = {
+        'metadata': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+            'cpu_count': os.cpu_count(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        },
+        'results': {
+            r.name: {'value': r.value, 'unit': r.unit, 'higher_is_better': r.higher_is_better} for r in results
+        },
+    }
+    with open(path, 'w') as f:
+        json.dump(document, f, indent=2)
+
+
+def compare(baseline_path: str, current_path: str, threshold: float) -> bool:
+    """
+    Prints the relative changes, and returns `False` if any benchmark is worse than the threshold allows
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)['results']
+    with open(current_path) as f:
+        current = json.load(f)['results']
+
+    ok = True
+    print(f'{"benchmark":<50} {"baseline":>14} {"current":>14} {"change":>8}')
+    for name, cur in current.items():
+        base = baseline.get(name)
+        if base is None or not base['value']:
+            print(f'{name:<50} {"":>14} {cur["value"]:14.1f} {"new":>8}')
+            continue
+        change = (cur['value'] - base['value']) / base['value']
+        regression = -change if cur['higher_is_better'] else change
+        status = 'WORSE' if regression > threshold else 'ok'
+        ok = ok and status == 'ok'
+        print(f'{name:<50} {base["value"]:14.1f} {cur["value"]:14.1f} {change:+8.1%}  {status}')
+
+    for name in sorted(baseline.keys() - current.keys()):
+        print(f'{name:<50} {"missing":>14}')
+    return ok
+
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='run the benchmarks')
+    run_parser.add_argument('--output', help='JSON file to save the results into')
+    run_parser.add_argument('--group', action='append', choices=list(BENCHMARKS),
+                            help='only run the given benchmark group, can be repeated')
+
+    compare_parser = commands.add_parser('compare', help='compare the results against a baseline')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                                help=f'max allowed relative change for the worse (default: {DEFAULT_THRESHOLD})')
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        results = run(args.group)
+        if args.output:
+            save(results, args.output)
+        return 0
+    for path in (args.baseline, args.current):
+        if not os.path.isfile(path):
+            print(f"No benchmark results at '{path}', save them with 'run --output {path}' first", file=sys.stderr)
+            return 2
+    return 0 if compare(args.baseline, args.current, args.threshold) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
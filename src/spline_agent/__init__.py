@@ -12,8 +12,14 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
+from spline_agent.batch import ExecutionBatch
+from spline_agent.data_volume import tracked_open, track_stream
 from spline_agent.datasources import DataSource
-from spline_agent.decorators.io_decorators import inputs, output
+from spline_agent.dispatcher import dispatch_batch
+from spline_agent.decorators.io_decorators import inputs, output, add_output
 from spline_agent.decorators.model import DsParamExpr
 from spline_agent.decorators.track_lineage_decorator import track_lineage
+from spline_agent.harvester import harvest_many
 from .context import get_tracking_context
+from .instrumentation import stats
+from .mode_switch import set_mode, get_mode
@@ -0,0 +1,90 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+from array import array
+from dataclasses import dataclass
+from typing import Any, Iterator, Mapping, Optional
+from uuid import UUID
+
+from spline_agent.lineage_model import DurationNs, ExecutionEvent, ExecutionPlan, Timestamp
+
+# Stands for an unknown duration in the durations array
+_NO_DURATION = -1
+
+
+class ExecutionBatch:
+    """
+    Executions of the same tracked function, e.g. the partition tasks of a batch job,
+    recorded to be harvested at once with `harvest_many()`.
+
+    The executions are stored column-wise in compact arrays of 64-bit integers, so recording an execution
+    only costs a few appends, and no object is kept per execution. The errors are stored by the execution index.
+    """
+
+    __slots__ = ('timestamps', 'durations_ns', 'errors')
+
+    def __init__(self):
+        self.timestamps = array('q')
+        self.durations_ns = array('q')
+        self.errors: dict[int, Any] = {}
+
+    def append(self, timestamp: Timestamp, duration_ns: Optional[DurationNs], error: Optional[Any] = None):
+        """
+        Record an execution
+        :param timestamp: the execution end time
+        """
+        if error is not None:
+            self.errors[len(self.timestamps)] = error
+        self.timestamps.append(timestamp)
+        self.durations_ns.append(_NO_DURATION if duration_ns is None else duration_ns)
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+
+class EventBatch:
+    """
+    The execution events of a single plan, harvested from an `ExecutionBatch`.
+    They share the plan ID and the `extra`, and are only materialized as `ExecutionEvent` objects on iteration.
+    """
+
+    __slots__ = ('planId', 'extra', '__timestamps', '__durations_ns', '__errors')
+
+    def __init__(self, plan_id: UUID, executions: ExecutionBatch, errors: dict[int, Any], extra: Mapping[str, Any]):
+        self.planId = plan_id
+        self.extra = extra
+        # the batch might still be appended to, so the columns are copied
+        self.__timestamps = array('q', executions.timestamps)
+        self.__durations_ns = array('q', executions.durations_ns)
+        self.__errors = errors
+
+    def __len__(self) -> int:
+        return len(self.__timestamps)
+
+    def __iter__(self) -> Iterator[ExecutionEvent]:
+        errors = self.__errors
+        for i, (timestamp, duration_ns) in enumerate(zip(self.__timestamps, self.__durations_ns)):
+            yield ExecutionEvent(
+                planId=self.planId,
+                timestamp=timestamp,
+                durationNs=None if duration_ns == _NO_DURATION else duration_ns,
+                error=errors.get(i),
+                extra=self.extra,
+            )
+
+
+@dataclass
+class LineageBatch:
+    plan: ExecutionPlan
+    events: EventBatch
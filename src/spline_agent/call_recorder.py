@@ -0,0 +1,226 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import logging
+import re
+import sys
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from types import CodeType, FrameType
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from spline_agent.commons.configuration import Configuration
+
+logger = logging.getLogger(__name__)
+
+# The agent's own code is never recorded
+_EXCLUDED_MODULES = ('spline_agent',)
+
+# The classification of the code objects is cached. The cache is dropped when it grows beyond this size.
+_MAX_CLASSIFIED_CODES = 100_000
+
+_NOT_ALLOWED = ''  # the classification of the code outside the allowed modules
+
+_recording: ContextVar[Optional[set[CodeType]]] = ContextVar('recording', default=None)
+
+
+class CallRecorder:
+    """
+    Records which user code functions are actually entered while a tracked function runs.
+
+    On Python 3.12+ it uses `sys.monitoring` (PEP 669) `PY_START` events, that are only enabled while a recording
+    is active. The callback is disabled for every code location that's not in the allowed modules, so after the
+    first call the non-user code runs at full speed. While there's a single active recording, the user code is
+    disabled too, once it's recorded. The events are re-enabled when the next recording starts.
+    On older versions it falls back to a `sys.setprofile()` function, installed in the recording thread only,
+    which is considerably slower.
+
+    The allowed modules are given as module name prefixes, and are compiled into a single regular expression.
+    Before Python 3.11 the code objects have no qualified name, so it's looked up when the code is first entered:
+    among the registered tracked functions, the module globals, and the class of the `self` or `cls` argument.
+    Note: with the fallback the calls made in other threads, e.g. spawned by the tracked function, are not recorded.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.__allowed_modules: set[str] = set()
+        self.__allowed_pattern: Optional[re.Pattern] = None
+        self.__classified: dict[CodeType, str] = {}
+        self.__qualnames: dict[CodeType, str] = {}
+        self.__registered: dict[CodeType, str] = {}
+        self.__active_count = 0
+        self.__user_code_disabled = False
+        self.__lock = threading.Lock()
+        self.__tool_id: Optional[int] = None
+        self.__monitoring: Any = getattr(sys, 'monitoring', None)
+
+    def configure(self, config: Configuration):
+        self.enabled = bool(config['spline.source_capture.runtime_calls.enabled'])
+        self.allow_modules(config.get('spline.source_capture.runtime_calls.modules') or ())
+
+    def allow_modules(self, modules: Iterable[str]):
+        """
+        Add module name prefixes to the allow-list, e.g. `my_app` allows `my_app` and `my_app.jobs.etl`
+        """
+        with self.__lock:
+            new_modules = set(modules) - self.__allowed_modules
+            if not new_modules:
+                return
+            self.__allowed_modules |= new_modules
+            alternatives = '|'.join(re.escape(m) for m in sorted(self.__allowed_modules))
+            self.__allowed_pattern = re.compile(rf'(?:{alternatives})(?:\.|$)')
+            # the previously rejected code might be allowed now
+            self.__classified = {}
+            self.__qualnames = {}
+            if self.__tool_id is not None:
+                self.__monitoring.restart_events()
+
+    def register_function(self, func: Callable):
+        """
+        Remember the qualified name of a tracked function, that can't be told from its code before Python 3.11,
+        e.g. of a function nested in another one
+        """
+        code = getattr(func, '__code__', None)
+        if code is not None and not hasattr(code, 'co_qualname'):
+            self.__registered[code] = func.__qualname__
+
+    @contextmanager
+    def recording(self) -> Iterator[set[CodeType]]:
+        """
+        Records the allowed functions entered within the block in the current thread (and context),
+        into the yielded set of code objects. The recordings can be nested, the calls are recorded by the innermost one.
+        """
+        calls: set[CodeType] = set()
+        token = _recording.set(calls)
+        if self.__monitoring is not None:
+            self.__start_monitoring()
+            try:
+                yield calls
+            finally:
+                self.__stop_monitoring()
+                _recording.reset(token)
+        else:
+            previous_profile = sys.getprofile()
+            sys.setprofile(self.__on_profile_event)
+            try:
+                yield calls
+            finally:
+                sys.setprofile(previous_profile)
+                _recording.reset(token)
+
+    def function_names(self, calls: Iterable[CodeType]) -> list[str]:
+        """
+        Returns the sorted qualified names of the recorded functions, e.g. `my_app.jobs.MyJob.run`
+        """
+        classified = self.__classified
+        qualnames = self.__qualnames
+        return sorted(
+            f'{classified.get(code) or code.co_filename}.'
+            f'{getattr(code, "co_qualname", None) or qualnames.get(code) or code.co_name}'
+            for code in calls)
+
+    def __start_monitoring(self):
+        monitoring = self.__monitoring
+        with self.__lock:
+            if self.__active_count == 0:
+                if self.__tool_id is None:
+                    self.__tool_id = _acquire_tool_id(monitoring)
+                    monitoring.register_callback(self.__tool_id, monitoring.events.PY_START, self.__on_py_start)
+                monitoring.set_events(self.__tool_id, monitoring.events.PY_START)
+            if self.__user_code_disabled:
+                # the user code recorded by the previous recording has to be recorded again
+                self.__user_code_disabled = False
+                monitoring.restart_events()
+            self.__active_count += 1
+
+    def __stop_monitoring(self):
+        with self.__lock:
+            self.__active_count -= 1
+            if self.__active_count == 0:
+                self.__monitoring.set_events(self.__tool_id, 0)
+
+    def __on_py_start(self, code: CodeType, _instruction_offset: int) -> Any:
+        module = self.__classified.get(code)
+        if module is None:
+            # the callback runs on top of the frame of the started function
+            module = self.__classify(code, sys._getframe(1))
+        if not module:
+            return self.__monitoring.DISABLE
+        calls = _recording.get()
+        if calls is not None:
+            calls.add(code)
+            if self.__active_count == 1:
+                # no other recording needs to know about this code
+                self.__user_code_disabled = True
+                return self.__monitoring.DISABLE
+        return None
+
+    def __on_profile_event(self, frame, event: str, _arg: Any):
+        if event != 'call':
+            return
+        code = frame.f_code
+        module = self.__classified.get(code)
+        if module is None:
+            module = self.__classify(code, frame)
+        if module:
+            calls = _recording.get()
+            if calls is not None:
+                calls.add(code)
+
+    def __classify(self, code: CodeType, frame: FrameType) -> str:
+        func_globals = frame.f_globals
+        module_name = func_globals.get('__name__') or ''
+        pattern = self.__allowed_pattern
+        allowed = (
+            pattern is not None
+            and pattern.match(module_name) is not None
+            and not module_name.startswith(_EXCLUDED_MODULES))
+        classified = self.__classified
+        if len(classified) >= _MAX_CLASSIFIED_CODES:
+            classified.clear()
+            self.__qualnames.clear()
+        if allowed and not hasattr(code, 'co_qualname'):
+            self.__qualnames[code] = self.__registered.get(code) or _find_qualname(code, frame)
+        module = classified[code] = module_name if allowed else _NOT_ALLOWED
+        return module
+
+
+def _find_qualname(code: CodeType, frame: FrameType) -> str:
+    name = code.co_name
+    candidates: list[Any] = [frame.f_globals.get(name)]
+    # a method, looked up in the class of its first argument
+    if code.co_argcount > 0:
+        first_arg = frame.f_locals.get(code.co_varnames[0])
+        owner = first_arg if isinstance(first_arg, type) else type(first_arg)
+        for klass in owner.__mro__:
+            attr = klass.__dict__.get(name)
+            candidates.append(getattr(attr, '__func__', attr))
+    for candidate in candidates:
+        if getattr(candidate, '__code__', None) is code:
+            return str(candidate.__qualname__)
+    return name
+
+
+def _acquire_tool_id(monitoring) -> int:
+    for tool_id in (monitoring.PROFILER_ID, 3, 4, 5):
+        try:
+            monitoring.use_tool_id(tool_id, 'spline_agent')
+            return tool_id
+        except ValueError:
+            continue
+    raise RuntimeError('No free sys.monitoring tool ID')
+
+
+call_recorder = CallRecorder()
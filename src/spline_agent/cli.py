@@ -0,0 +1,96 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""
+The `spline-agent` command line tool.
+
+    spline-agent replay [options] FILE_OR_DIR...
+"""
+
+import argparse
+import logging
+import os
+import sys
+from typing import Optional, Sequence
+
+from spline_agent.config_loader import load_config
+from spline_agent.exceptions import ReplayError
+from spline_agent.replay import LineageReplayer
+
+_HTTP_CONFIG_PREFIX = 'spline.lineage_dispatcher.http'
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    config = load_config()
+
+    parser = argparse.ArgumentParser(prog='spline-agent', description='Spline agent for Python')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    replay = commands.add_parser(
+        'replay', help='upload lineage files to a Spline server',
+        description='Upload NDJSON or binary lineage files, plain or gzip-compressed, to a Spline producer. '
+                    'The directories are replayed file by file, in the order of the file names. '
+                    'The producer URLs default to the HTTP dispatcher configuration.')
+    replay.add_argument('paths', nargs='+', metavar='FILE_OR_DIR')
+    replay.add_argument('--url', default=config.get(f'{_HTTP_CONFIG_PREFIX}.base_url'),
+                        help='the producer API base URL')
+    replay.add_argument('--plans-url', default=config.get(f'{_HTTP_CONFIG_PREFIX}.plans_url'))
+    replay.add_argument('--events-url', default=config.get(f'{_HTTP_CONFIG_PREFIX}.events_url'))
+    replay.add_argument('--content-type', default=config.get(f'{_HTTP_CONFIG_PREFIX}.content_type'))
+    replay.add_argument('--batch-size', type=int, default=100, help='events per request (default: 100)')
+    replay.add_argument('--connections', type=int, default=4, help='concurrent requests (default: 4)')
+    replay.add_argument('--rate', type=float, help='max events per second')
+    replay.add_argument('--retries', type=int, default=3, help='retries of a failed request (default: 3)')
+    replay.add_argument('--checkpoint', help='file to save the progress into, and resume from')
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, format='%(levelname)s %(message)s')
+    if not args.url:
+        parser.error('the producer URL is not configured, use --url')
+    return _replay(args)
+
+
+def _replay(args: argparse.Namespace) -> int:
+    replayer = LineageReplayer(
+        args.url, args.plans_url, args.events_url, args.content_type,
+        batch_size=args.batch_size, connections=args.connections, max_events_per_s=args.rate,
+        retries=args.retries, checkpoint_path=args.checkpoint)
+    try:
+        stats = replayer.replay(_files(args.paths))
+    except ReplayError as e:
+        print(f'{e}' + (f'\nRun again to resume from the checkpoint {args.checkpoint}' if args.checkpoint else ''),
+              file=sys.stderr)
+        return 1
+    print(f'{stats.plans_sent} plans ({stats.duplicate_plans} duplicates skipped) and {stats.events_sent} events '
+          f'sent in {stats.elapsed_s:.1f} s ({stats.events_per_s:.0f} events/s), '
+          f'{stats.requests} requests, {stats.retries} retries')
+    return 0
+
+
+def _files(paths: Sequence[str]) -> list[str]:
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            # skipping the files being written, e.g. compressed segments of the NDJSON dispatcher
+            files.extend(sorted(
+                os.path.join(path, name) for name in os.listdir(path)
+                if os.path.isfile(os.path.join(path, name)) and not name.endswith('.tmp')))
+        else:
+            files.append(path)
+    return files
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -16,3 +16,4 @@ from .composite_configuration import *
 from .configuration import *
 from .dict_configuration import *
 from .dynaconf_configuration import *
+from .snapshot_configuration import *
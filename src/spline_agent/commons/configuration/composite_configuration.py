@@ -12,28 +12,53 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
-from typing import Type, Optional
+from types import MappingProxyType
+from typing import Type, Optional, Any, Mapping
 
 from .base_configuration import BaseConfiguration
 from .configuration import Configuration
 from .configuration import T
 
+_MISSING = object()
+
 
 class CompositeConfiguration(BaseConfiguration):
     """
     Composite implementation that merges one or more other Configuration instances.
     When looking up by a key, the first value found is returned. The search is depth-first.
+
+    All the keys, that the nested configurations can enumerate (see `Configuration.snapshot()`),
+    are resolved up front into a single dictionary. Other keys are resolved on the first lookup and memoized.
+    So the nested configurations are expected to be immutable.
     """
 
     def __init__(self, *configs: Configuration) -> None:
         assert configs
         self.__configs = configs
+        self.__resolved: dict[str, Any] = {}
+        for config in configs:
+            for key in config.snapshot():
+                if key not in self.__resolved:
+                    self.__resolved[key] = self.__resolve(key)
 
     def get(self, key: str, typ: Optional[Type[T]] = None) -> Optional[T]:
+        value = self.__lookup(key)
+        return None if value is _MISSING else value
+
+    def __contains__(self, key: str) -> bool:
+        return self.__lookup(key) is not _MISSING
+
+    def snapshot(self) -> Mapping[str, Any]:
+        return MappingProxyType({k: v for k, v in self.__resolved.items() if v is not _MISSING})
+
+    def __lookup(self, key: str) -> Any:
+        value = self.__resolved.get(key, _MISSING)
+        if value is _MISSING and key not in self.__resolved:
+            value = self.__resolved[key] = self.__resolve(key)
+        return value
+
+    def __resolve(self, key: str) -> Any:
         for config in self.__configs:
             if key in config:
                 return config.get(key)
-        return None
-
-    def __contains__(self, key: str) -> bool:
-        return any(key in config for config in self.__configs)
+        return _MISSING
@@ -13,7 +13,8 @@
 #  limitations under the License.
 
 from abc import ABC, abstractmethod
-from typing import Any, TypeVar, Type, Optional
+from types import MappingProxyType
+from typing import Any, TypeVar, Type, Optional, Mapping
 
 T = TypeVar('T')
 
@@ -44,3 +45,11 @@ class Configuration(ABC):
         Allows for syntax like `if key in config: ...`
         """
         pass
+
+    def snapshot(self) -> Mapping[str, Any]:
+        """
+        Returns a frozen, flattened view of all the settings that this configuration can enumerate up front,
+        keyed by the full dot-notation key (a.b.c). Configurations that can't enumerate their keys return
+        an empty mapping (the default), but they still have to answer the lookups by key.
+        """
+        return MappingProxyType({})
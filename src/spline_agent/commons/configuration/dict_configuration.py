@@ -32,3 +32,6 @@ class DictConfiguration(BaseConfiguration):
 
     def __contains__(self, key: str) -> bool:
         return key in self.__settings
+
+    def snapshot(self) -> Mapping[str, Any]:
+        return self.__settings
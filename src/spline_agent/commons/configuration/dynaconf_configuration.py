@@ -12,35 +12,47 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
-from functools import reduce
-from typing import Type, Optional
-
-from dynaconf import Dynaconf
+from types import MappingProxyType
+from typing import Type, Optional, Any, Mapping, TYPE_CHECKING
 
 from .base_configuration import BaseConfiguration
 from .configuration import T
 
+if TYPE_CHECKING:
+    from dynaconf import Dynaconf
+
 
 class DynaconfConfiguration(BaseConfiguration):
     """
     A Configuration adapter for Dynaconf.
-    Supports retrieving keys using dot-notation (a.b.c)
+    Supports retrieving keys using dot-notation (a.b.c). The keys are case-insensitive.
+
+    The settings are flattened once, on creation, so that every lookup is a single dictionary hit.
+    Every nested node is accessible by its full path, unless a path segment itself contains a dot.
+    Such keys are only accessible as part of the parent node value.
     """
 
-    def __init__(self, settings: Dynaconf) -> None:
-        self.__settings = settings
+    def __init__(self, settings: 'Dynaconf') -> None:
+        flat_settings: dict[str, Any] = {}
+        _flatten(settings.as_dict(), '', flat_settings)
+        self.__settings = MappingProxyType(flat_settings)
 
     def get(self, key: str, typ: Optional[Type[T]] = None) -> Optional[T]:
-        return self.__locate_item(key)
+        return self.__settings.get(key.lower())
 
     def __contains__(self, key: str) -> bool:
-        return self.__locate_item(key) is not None
-
-    def __locate_item(self, key: str) -> Optional[T]:
-        keys = key.split('.')
-        root = self.__settings
-        return reduce(
-            lambda i, k: i.get(k) if i is not None and hasattr(i, 'get') and callable(i.get) else None,
-            keys,
-            root
-        )
+        return key.lower() in self.__settings
+
+    def snapshot(self) -> Mapping[str, Any]:
+        return self.__settings
+
+
+def _flatten(node: Mapping[str, Any], prefix: str, result: dict[str, Any]):
+    for k, v in node.items():
+        if v is None:
+            # Dynaconf doesn't distinguish between a missing key and a key with no value
+            continue
+        key = f'{prefix}{str(k).lower()}'
+        result[key] = v
+        if isinstance(v, Mapping):
+            _flatten({nk: nv for nk, nv in v.items() if '.' not in str(nk)}, f'{key}.', result)
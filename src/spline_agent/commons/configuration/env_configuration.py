@@ -14,9 +14,7 @@
 
 from __future__ import annotations
 
-from typing import Type, Optional
-
-from dynaconf import Dynaconf
+from typing import Type, Optional, Any, Mapping
 
 from . import DynaconfConfiguration
 from .base_configuration import BaseConfiguration
@@ -29,20 +27,32 @@ class EnvConfiguration(BaseConfiguration):
     It loads environment variables with the specified prefix.
     """
 
-    def __init__(self, prefix: str = '') -> None:
+    def __init__(self, prefix: str = '', encoded_settings: Optional[Mapping[str, Any]] = None) -> None:
         """
         :param prefix: environment variable name prefix
+        :param encoded_settings: the `encoded_settings` previously read from the same environment.
+        If given, the environment is not read again.
         """
-        dynaconf_env_prefix: str | bool = prefix.replace('.', '_') if prefix else False
-        self.__dynaconf = DynaconfConfiguration(Dynaconf(envvar_prefix=dynaconf_env_prefix))
+        if encoded_settings is None:
+            from dynaconf import Dynaconf  # heavy, imported on the first config read
+            dynaconf_env_prefix: str | bool = prefix.replace('.', '_') if prefix else False
+            encoded_settings = DynaconfConfiguration(Dynaconf(envvar_prefix=dynaconf_env_prefix)).snapshot()
+        self.__settings = encoded_settings
         self.__prefix = f'{prefix}.' if prefix else ''
         self.__prefix_len = len(self.__prefix)
 
+    @property
+    def encoded_settings(self) -> Mapping[str, Any]:
+        """
+        The parsed environment variable values, keyed by the lowercase variable names without the prefix
+        """
+        return self.__settings
+
     def get(self, key: str, typ: Optional[Type[T]] = None) -> Optional[T]:
-        return self.__dynaconf.get(self.__encode_key(key)) if key.startswith(self.__prefix) else None
+        return self.__settings.get(self.__encode_key(key)) if key.startswith(self.__prefix) else None
 
     def __contains__(self, key: str) -> bool:
-        return key.startswith(self.__prefix) and self.__dynaconf.__contains__(self.__encode_key(key))
+        return key.startswith(self.__prefix) and self.__encode_key(key) in self.__settings
 
     def __encode_key(self, key: str) -> str:
-        return key[self.__prefix_len:].replace('.', '_')
+        return key[self.__prefix_len:].replace('.', '_').lower()
@@ -12,9 +12,7 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
-from typing import Type, Optional
-
-from dynaconf import Dynaconf
+from typing import Type, Optional, Any, Mapping
 
 from . import DynaconfConfiguration
 from .base_configuration import BaseConfiguration
@@ -30,6 +28,7 @@ class FileConfiguration(BaseConfiguration):
         """
         :param file_path: absolute path to the config file
         """
+        from dynaconf import Dynaconf  # heavy, imported on the first config read
         self.__dynaconf = DynaconfConfiguration(Dynaconf(settings_files=[file_path]))
 
     def get(self, key: str, typ: Optional[Type[T]] = None) -> Optional[T]:
@@ -37,3 +36,6 @@ class FileConfiguration(BaseConfiguration):
 
     def __contains__(self, key: str) -> bool:
         return self.__dynaconf.__contains__(key)
+
+    def snapshot(self) -> Mapping[str, Any]:
+        return self.__dynaconf.snapshot()
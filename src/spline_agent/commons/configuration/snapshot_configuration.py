@@ -0,0 +1,41 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+from types import MappingProxyType
+from typing import Any, Mapping, Type, Optional
+
+from . import T
+from .base_configuration import BaseConfiguration
+
+
+class SnapshotConfiguration(BaseConfiguration):
+    """
+    A configuration restored from a `snapshot()` of another one, e.g. loaded from a cache.
+    Same as the file based configurations, the keys are case-insensitive.
+    """
+
+    def __init__(self, snapshot: Mapping[str, Any]) -> None:
+        """
+        :param snapshot: flat settings keyed by the lowercase dot-separated keys
+        """
+        self.__settings = MappingProxyType(dict(snapshot))
+
+    def get(self, key: str, typ: Optional[Type[T]] = None) -> Optional[T]:
+        return self.__settings.get(key.lower())
+
+    def __contains__(self, key: str) -> bool:
+        return key.lower() in self.__settings
+
+    def snapshot(self) -> Mapping[str, Any]:
+        return self.__settings
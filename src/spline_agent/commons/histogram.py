@@ -0,0 +1,68 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import threading
+from bisect import bisect_left
+from typing import Sequence, Union
+
+Number = Union[int, float]
+
+# Upper bounds of the default buckets for durations measured in nanoseconds: 1µs ... 10s
+DEFAULT_DURATION_NS_BUCKETS: tuple[int, ...] = tuple(
+    base * 10 ** exp for exp in range(3, 10) for base in (1, 2, 5)) + (10 ** 10,)
+
+
+class Histogram:
+    """
+    A thread-safe histogram with fixed bucket upper bounds, in the Prometheus style:
+    the bucket counts are cumulative, i.e. each bucket counts all observations less than or equal to its bound,
+    and the last (implicit) bucket '+Inf' counts all the observations.
+    """
+
+    def __init__(self, bounds: Sequence[Number] = DEFAULT_DURATION_NS_BUCKETS):
+        assert list(bounds) == sorted(bounds)
+        self.__bounds = tuple(bounds)
+        self.__counts = [0] * (len(self.__bounds) + 1)
+        self.__sum: Number = 0
+        self.__lock = threading.Lock()
+
+    @property
+    def bounds(self) -> tuple[Number, ...]:
+        return self.__bounds
+
+    def observe(self, value: Number):
+        i = bisect_left(self.__bounds, value)
+        with self.__lock:
+            self.__counts[i] += 1
+            self.__sum += value
+
+    def snapshot(self) -> tuple[Number, int, tuple[int, ...]]:
+        """
+        Returns a consistent triple: sum of all observations, total count,
+        and the cumulative counts for each bucket bound (excluding '+Inf', which equals the total count).
+        """
+        with self.__lock:
+            counts = list(self.__counts)
+            total_sum = self.__sum
+        cumulative = []
+        running = 0
+        for c in counts:
+            running += c
+            cumulative.append(running)
+        return total_sum, running, tuple(cumulative[:-1])
+
+    def reset(self):
+        with self.__lock:
+            self.__counts = [0] * (len(self.__bounds) + 1)
+            self.__sum = 0
@@ -0,0 +1,160 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import json
+import logging
+import os
+from typing import Any, Optional, Sequence
+
+from spline_agent.commons.configuration import Configuration, CompositeConfiguration, SnapshotConfiguration
+from spline_agent.commons.configuration.env_configuration import EnvConfiguration
+from spline_agent.commons.configuration.file_configuration import FileConfiguration
+from spline_agent.constants import CONFIG_FILE_DEFAULT, CONFIG_FILE_USER
+
+logger = logging.getLogger(__name__)
+
+ENV_PREFIX = 'spline'
+
+# Directory to cache the compiled configuration in. The cache is disabled unless it's set.
+CACHE_DIR_ENV_VAR = 'SPLINE_CONFIG_CACHE_DIR'
+
+_CACHE_FORMAT_VERSION = 1
+
+
+def load_config(user_config: Optional[Configuration] = None) -> Configuration:
+    """
+    Builds the agent configuration from, in order of precedence,
+    the `SPLINE_*` environment variables, the user config (`spline.yaml` in the working directory by default)
+    and the default config file.
+
+    If the `SPLINE_CONFIG_CACHE_DIR` environment variable is set, and no custom user config is given,
+    the compiled configuration is cached in that directory, see `ConfigCache`.
+
+    :param user_config: custom user configuration to use instead of the `spline.yaml` file
+    """
+    logger.debug(f'CONFIG_FILE_DEFAULT : {CONFIG_FILE_DEFAULT}')
+    logger.debug(f'CONFIG_FILE_USER    : {CONFIG_FILE_USER}')
+
+    if user_config is not None:
+        return CompositeConfiguration(
+            EnvConfiguration(prefix=ENV_PREFIX),
+            user_config,
+            FileConfiguration(CONFIG_FILE_DEFAULT))
+
+    cache_dir = os.environ.get(CACHE_DIR_ENV_VAR)
+    if cache_dir:
+        return ConfigCache(cache_dir, (CONFIG_FILE_USER, CONFIG_FILE_DEFAULT)).load()
+
+    return CompositeConfiguration(
+        EnvConfiguration(prefix=ENV_PREFIX),
+        FileConfiguration(CONFIG_FILE_USER),
+        FileConfiguration(CONFIG_FILE_DEFAULT))
+
+
+class ConfigCache:
+    """
+    Caches the environment and the config files, parsed and flattened, in a single JSON file,
+    so that the subsequent process starts only need a single file read instead of parsing the files with Dynaconf.
+
+    The cache entry is keyed by the config file paths, their modification times and sizes,
+    and the environment variables that Dynaconf reads (`SPLINE_*`, `DYNACONF_*` and `*_FOR_DYNACONF`).
+    Any change to those invalidates the entry, and it's rebuilt on the next load.
+    """
+
+    def __init__(self, cache_dir: str, file_paths: Sequence[str], env_prefix: str = ENV_PREFIX) -> None:
+        """
+        :param cache_dir: directory to store the cache files in
+        :param file_paths: config files in order of precedence
+        :param env_prefix: environment variable name prefix
+        """
+        self.__file_paths = tuple(file_paths)
+        self.__env_prefix = env_prefix
+        sources_id = _sha256_hex(json.dumps([env_prefix, self.__file_paths]))
+        self.__cache_file_path = os.path.join(cache_dir, f'config-{sources_id[:16]}.json')
+
+    @property
+    def cache_file_path(self) -> str:
+        return self.__cache_file_path
+
+    def load(self) -> Configuration:
+        key = self.__cache_key()
+        cached = self.__read(key)
+        if cached is not None:
+            logger.debug(f'Configuration loaded from cache: {self.__cache_file_path}')
+            return CompositeConfiguration(
+                EnvConfiguration(prefix=self.__env_prefix, encoded_settings=cached['env']),
+                SnapshotConfiguration(cached['files']))
+
+        env_config = EnvConfiguration(prefix=self.__env_prefix)
+        files_config = CompositeConfiguration(*(FileConfiguration(path) for path in self.__file_paths))
+        self.__write({
+            'key': key,
+            'env': dict(env_config.encoded_settings),
+            'files': dict(files_config.snapshot()),
+        })
+        return CompositeConfiguration(env_config, files_config)
+
+    def __cache_key(self) -> str:
+        env_prefix = f'{self.__env_prefix.replace(".", "_").upper()}_'
+        env_vars = sorted(
+            (name, value) for name, value in os.environ.items()
+            if name.upper().startswith((env_prefix, 'DYNACONF_')) or '_FOR_DYNACONF' in name.upper())
+        files = [(path, *_file_stamp(path)) for path in self.__file_paths]
+        return _sha256_hex(json.dumps([_CACHE_FORMAT_VERSION, files, env_vars]))
+
+    def __read(self, key: str) -> Optional[dict[str, Any]]:
+        try:
+            with open(self.__cache_file_path, 'rb') as f:
+                content = json.loads(f.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.debug(f'Ignoring unreadable configuration cache {self.__cache_file_path}: {e}')
+            return None
+        return content if isinstance(content, dict) and content.get('key') == key else None
+
+    def __write(self, content: dict[str, Any]):
+        try:
+            data = json.dumps(content).encode('utf-8')
+        except (TypeError, ValueError) as e:
+            logger.debug(f'Configuration is not cacheable: {e}')
+            return
+
+        cache_dir = os.path.dirname(self.__cache_file_path)
+        try:
+            import tempfile  # rarely needed, only when the cache is (re)built
+            os.makedirs(cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix='.config-', suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, self.__cache_file_path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except OSError as e:
+            logger.warning(f'Failed to write configuration cache {self.__cache_file_path}: {e}')
+
+
+def _file_stamp(path: str) -> tuple[Optional[int], Optional[int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None, None
+    return st.st_mtime_ns, st.st_size
+
+
+def _sha256_hex(s: str) -> str:
+    import hashlib  # loads OpenSSL, only needed if the cache is enabled
+    return hashlib.sha256(s.encode('utf-8')).hexdigest()
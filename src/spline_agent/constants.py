@@ -12,25 +12,48 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
-import importlib.metadata
 import os
-import platform
+from typing import Any, Callable
 from uuid import UUID
 
-import spline_agent
 from spline_agent.lineage_model import NameAndVersion
 
-AGENT_INFO = NameAndVersion(
-    name='spline-python-agent',
-    version=importlib.metadata.version(spline_agent.__name__)
-)
-
-DEFAULT_SYSTEM_INFO = NameAndVersion(
-    name=platform.python_implementation(),
-    version=platform.python_version()
-)
+# Computed lazily on the first access, see `__getattr__()` below
+AGENT_INFO: NameAndVersion
+DEFAULT_SYSTEM_INFO: NameAndVersion
 
 EXECUTION_PLAN_NAMESPACE: UUID = UUID('475196d0-16ca-4cba-aec7-c9f2ddd9326c')
 
 CONFIG_FILE_DEFAULT = f'{os.path.dirname(__file__)}/spline.default.yaml'
 CONFIG_FILE_USER = f'{os.getcwd()}/spline.yaml'
+
+
+def _agent_info() -> NameAndVersion:
+    import importlib.metadata  # reads the package metadata from disk
+    return NameAndVersion(
+        name='spline-python-agent',
+        version=importlib.metadata.version(__package__)
+    )
+
+
+def _default_system_info() -> NameAndVersion:
+    import platform
+    return NameAndVersion(
+        name=platform.python_implementation(),
+        version=platform.python_version()
+    )
+
+
+_LAZY_CONSTANTS: dict[str, Callable[[], Any]] = {
+    'AGENT_INFO': _agent_info,
+    'DEFAULT_SYSTEM_INFO': _default_system_info,
+}
+
+
+def __getattr__(name: str) -> Any:
+    # PEP 562: only called for the attributes not found in the module, i.e. once per lazy constant
+    factory = _LAZY_CONSTANTS.get(name)
+    if factory is None:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = globals()[name] = factory()
+    return value
@@ -14,23 +14,57 @@
 
 import logging
 from contextvars import ContextVar
-from typing import Optional, Callable, List
+from dataclasses import dataclass
+from types import CodeType
+from typing import Optional, Callable, Iterable, List, NamedTuple, TYPE_CHECKING
 
-from spline_agent.datasources import DataSource
+from spline_agent.datasources import DataSource, data_source_interner
 from spline_agent.enums import WriteMode
 from spline_agent.exceptions import LineageTrackingContextNotInitializedError
 from spline_agent.lineage_model import NameAndVersion
 
+if TYPE_CHECKING:
+    from spline_agent.data_volume import VolumeCounter
+
 logger = logging.getLogger(__name__)
 
 
+@dataclass(frozen=True)
+class TrackedOutput:
+    """
+    An output of the tracked execution, and the inputs it's derived from.
+    The `None` inputs stand for all the inputs of the execution.
+    """
+    ds: DataSource
+    write_mode: WriteMode
+    inputs: Optional[tuple[DataSource, ...]] = None
+
+
+class PipelineStage(NamedTuple):
+    """
+    A finished nested tracked call, that is a stage of the pipeline tracked by the outermost call.
+    The parent is the context of the tracked call the stage was called from.
+    """
+    ctx: 'LineageTrackingContext'
+    parent: 'LineageTrackingContext'
+    func: Callable
+    duration_ns: int
+    error: Optional[str]
+
+
 class LineageTrackingContext:
     def __init__(self):
         self.__name: Optional[str] = None
         self.__ins: List[DataSource] = []
         self.__out: Optional[DataSource] = None
         self.__write_mode: Optional[WriteMode] = None
+        self.__out_inputs: Optional[tuple[DataSource, ...]] = None
+        self.__other_outs: List[TrackedOutput] = []
         self.__system_info: Optional[NameAndVersion] = None
+        self.__volume_counters: List[tuple[DataSource, 'VolumeCounter']] = []
+        self.__recorded_calls: Optional[set[CodeType]] = None
+        self.__pipeline_root: Optional[LineageTrackingContext] = None
+        self.__stages: List[PipelineStage] = []
 
     @property
     def name(self) -> Optional[str]:
@@ -49,7 +83,7 @@ class LineageTrackingContext:
         return tuple(self.__ins)
 
     def add_input(self, ds: DataSource):
-        self.__ins.append(ds)
+        self.__ins.append(data_source_interner.data_source(ds))
 
     @property
     def output(self) -> Optional[DataSource]:
@@ -58,11 +92,37 @@ class LineageTrackingContext:
     @output.setter
     def output(self, ds: DataSource):
         assert ds is not None
+        ds = data_source_interner.data_source(ds)
         if self.__out is not None:
             logger.warning(f"Tracking context property 'output' is reassigned: "
                            f"old value '{self.__out}', new value '{ds}'")
         self.__out = ds
 
+    def add_output(self, ds: DataSource, write_mode: WriteMode, inputs: Optional[Iterable[DataSource]] = None):
+        """
+        Add an output of the execution. A lineage is harvested for every output.
+        The first output becomes the primary one, i.e. the `output` and the `write_mode`.
+        :param inputs: the inputs the output is derived from. Defaults to all the inputs of the execution.
+        """
+        assert ds is not None
+        ds = data_source_interner.data_source(ds)
+        out_inputs = tuple(data_source_interner.data_source(i) for i in inputs) if inputs is not None else None
+        if self.__out is None:
+            self.__out = ds
+            self.__write_mode = write_mode
+            self.__out_inputs = out_inputs
+        else:
+            self.__other_outs.append(TrackedOutput(ds, write_mode, out_inputs))
+
+    @property
+    def outputs(self) -> tuple[TrackedOutput, ...]:
+        """
+        All the outputs, starting with the primary one
+        """
+        if self.__out is None or self.__write_mode is None:
+            return tuple(self.__other_outs)
+        return (TrackedOutput(self.__out, self.__write_mode, self.__out_inputs), *self.__other_outs)
+
     @property
     def write_mode(self) -> Optional[WriteMode]:
         return self.__write_mode
@@ -79,6 +139,48 @@ class LineageTrackingContext:
     def system_info(self, mode: NameAndVersion):
         self.__system_info = mode
 
+    @property
+    def volume_counters(self) -> tuple[tuple[DataSource, 'VolumeCounter'], ...]:
+        return tuple(self.__volume_counters)
+
+    def add_volume_counter(self, ds: DataSource, counter: 'VolumeCounter'):
+        self.__volume_counters.append((data_source_interner.data_source(ds), counter))
+
+    @property
+    def recorded_calls(self) -> Optional[set[CodeType]]:
+        """
+        The code of the user functions entered during the execution, if the runtime call recording is enabled
+        """
+        return self.__recorded_calls
+
+    @recorded_calls.setter
+    def recorded_calls(self, calls: set[CodeType]):
+        self.__recorded_calls = calls
+
+    @property
+    def pipeline_root(self) -> Optional['LineageTrackingContext']:
+        """
+        The context of the outermost call in the pipeline nesting mode, the context itself for that call,
+        or `None` if the nested tracked calls report their own lineage
+        """
+        return self.__pipeline_root
+
+    @pipeline_root.setter
+    def pipeline_root(self, ctx: 'LineageTrackingContext'):
+        self.__pipeline_root = ctx
+
+    @property
+    def stages(self) -> tuple[PipelineStage, ...]:
+        """
+        The pipeline stages, in the order they have finished
+        """
+        return tuple(self.__stages)
+
+    def add_stage(self, stage: PipelineStage):
+        self.__stages.append(stage)
+        # the data moved by the stages is reported by the pipeline
+        self.__volume_counters.extend(stage.ctx.volume_counters)
+
 
 _context_holder: ContextVar[LineageTrackingContext] = ContextVar('context')
 
@@ -97,6 +199,16 @@ def get_tracking_context() -> LineageTrackingContext:
     return ctx
 
 
+def current_tracking_context() -> Optional[LineageTrackingContext]:
+    """
+    Returns the active tracking context, or `None` if the lineage is not tracked,
+    i.e. outside a tracked function, or in the DISABLED or BYPASS mode.
+    """
+    ctx = _context_holder.get(None)
+    # in the BYPASS mode the context is an isolated proxy, not a real context instance
+    return ctx if isinstance(ctx, LineageTrackingContext) else None
+
+
 def with_context_do(ctx: LineageTrackingContext, call: Callable):
     ctx_token = _context_holder.set(ctx)
     try:
@@ -0,0 +1,262 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import io
+import os
+from typing import Any, IO, Optional, Union
+
+from spline_agent.context import LineageTrackingContext, current_tracking_context
+from spline_agent.datasources import DataSource
+
+_NEWLINE = b'\n'
+
+
+class VolumeCounter:
+    """
+    Counts the data moved through a single file handle or stream.
+    Every handle has its own counter, so no synchronization is needed when counting.
+    The counters are summed up per data source when the lineage is harvested.
+    Records are counted as newline characters, and only if requested.
+    """
+
+    __slots__ = ('bytes_read', 'bytes_written', 'records_read', 'records_written', 'count_records')
+
+    def __init__(self, count_records: bool = False):
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.records_read = 0
+        self.records_written = 0
+        self.count_records = count_records
+
+    def on_read(self, data: Union[bytes, bytearray, memoryview]):
+        self.bytes_read += len(data)
+        if self.count_records:
+            self.records_read += _count_newlines(data)
+
+    def on_write(self, data: Union[bytes, bytearray, memoryview]):
+        self.bytes_written += len(data)
+        if self.count_records:
+            self.records_written += _count_newlines(data)
+
+    def add_to(self, totals: dict[str, int]):
+        totals['bytes_read'] = totals.get('bytes_read', 0) + self.bytes_read
+        totals['bytes_written'] = totals.get('bytes_written', 0) + self.bytes_written
+        if self.count_records:
+            totals['records_read'] = totals.get('records_read', 0) + self.records_read
+            totals['records_written'] = totals.get('records_written', 0) + self.records_written
+
+
+class CountingRawIO(io.RawIOBase):
+    """
+    A raw binary stream that counts the bytes passing through the underlying raw stream.
+    As it sits beneath the buffering layer, it's only called once per buffer fill or flush,
+    rather than once per user level read or write call.
+    """
+
+    def __init__(self, raw: io.RawIOBase, counter: VolumeCounter):
+        super().__init__()
+        self.__raw = raw
+        self.__counter = counter
+
+    def readinto(self, b) -> Optional[int]:
+        n = self.__raw.readinto(b)
+        if n:
+            self.__counter.on_read(memoryview(b)[:n])
+        return n
+
+    def write(self, b) -> Optional[int]:
+        n = self.__raw.write(b)
+        if n:
+            self.__counter.on_write(memoryview(b)[:n])
+        return n
+
+    def readable(self) -> bool:
+        return self.__raw.readable()
+
+    def writable(self) -> bool:
+        return self.__raw.writable()
+
+    def seekable(self) -> bool:
+        return self.__raw.seekable()
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        return self.__raw.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self.__raw.tell()
+
+    def truncate(self, size: Optional[int] = None) -> int:
+        return self.__raw.truncate(size)
+
+    def fileno(self) -> int:
+        return self.__raw.fileno()
+
+    def isatty(self) -> bool:
+        return self.__raw.isatty()
+
+    def close(self):
+        if not self.closed:
+            try:
+                self.__raw.close()
+            finally:
+                super().close()
+
+
+class CountingStream:
+    """
+    A transparent proxy around an arbitrary binary file-like object, that counts the data read or written.
+    The attributes, that don't transfer any data, are delegated to the target stream as is.
+    """
+
+    def __init__(self, stream: IO[bytes], counter: VolumeCounter):
+        self.__stream = stream
+        self.__counter = counter
+
+    def read(self, *args) -> bytes:
+        data = self.__stream.read(*args)
+        self.__counter.on_read(data)
+        return data
+
+    def read1(self, *args) -> bytes:
+        data = self.__stream.read1(*args)  # type: ignore
+        self.__counter.on_read(data)
+        return data
+
+    def readline(self, *args) -> bytes:
+        data = self.__stream.readline(*args)
+        self.__counter.on_read(data)
+        return data
+
+    def readlines(self, *args) -> list[bytes]:
+        lines = self.__stream.readlines(*args)
+        for line in lines:
+            self.__counter.on_read(line)
+        return lines
+
+    def readinto(self, b) -> Optional[int]:
+        n = self.__stream.readinto(b)  # type: ignore
+        if n:
+            self.__counter.on_read(memoryview(b)[:n])
+        return n
+
+    def readinto1(self, b) -> Optional[int]:
+        n = self.__stream.readinto1(b)  # type: ignore
+        if n:
+            self.__counter.on_read(memoryview(b)[:n])
+        return n
+
+    def write(self, b) -> int:
+        n = self.__stream.write(b)
+        self.__counter.on_write(memoryview(b)[:n] if n is not None else b)
+        return n
+
+    def writelines(self, lines) -> None:
+        for line in lines:
+            self.write(line)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> bytes:
+        line = self.readline()
+        if not line:
+            raise StopIteration
+        return line
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.__stream.close()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.__stream, name)
+
+
+def tracked_open(
+        file: Union[str, bytes, os.PathLike],
+        mode: str = 'r',
+        ds: Union[str, DataSource, None] = None,
+        count_records: bool = False,
+        buffering: int = -1,
+        encoding: Optional[str] = None,
+        errors: Optional[str] = None,
+        newline: Optional[str] = None):
+    """
+    Same as the built-in `open()`, but counts the bytes (and optionally records) read from or written to the file,
+    and attributes them to the given data source in the current tracking context.
+    The totals are reported in the execution event `extra` as `data_volume`.
+    Outside an active tracking context it's just a plain `open()`.
+
+    :param ds: the data source the file represents. Defaults to the file path.
+    :param count_records: also count records, i.e. lines
+    """
+    ctx = current_tracking_context()
+    if ctx is None or ('b' not in mode and buffering == 0):
+        # the latter is an invalid combination, let the built-in `open()` raise the error
+        return open(file, mode, buffering, encoding, errors, newline)
+
+    counter = VolumeCounter(count_records)
+    ctx.add_volume_counter(_as_data_source(ds if ds is not None else os.fsdecode(file)), counter)
+
+    raw = io.FileIO(file, mode.replace('b', '').replace('t', ''))
+    counting_raw = CountingRawIO(raw, counter)
+    if buffering == 0:
+        return counting_raw
+
+    buffer_size = buffering if buffering > 1 else io.DEFAULT_BUFFER_SIZE
+    buffered: Union[io.BufferedRandom, io.BufferedReader, io.BufferedWriter]
+    if '+' in mode:
+        buffered = io.BufferedRandom(counting_raw, buffer_size)  # type: ignore
+    elif raw.readable():
+        buffered = io.BufferedReader(counting_raw, buffer_size)
+    else:
+        buffered = io.BufferedWriter(counting_raw, buffer_size)
+
+    if 'b' in mode:
+        return buffered
+    return io.TextIOWrapper(buffered, encoding, errors, newline, line_buffering=buffering == 1)
+
+
+def track_stream(stream: IO[bytes], ds: Union[str, DataSource], count_records: bool = False) -> IO[bytes]:
+    """
+    Wrap a binary file-like object to count the bytes (and optionally records) read from or written into it,
+    and attribute them to the given data source in the current tracking context.
+    Outside an active tracking context the stream is returned as is.
+    """
+    ctx = current_tracking_context()
+    if ctx is None:
+        return stream
+
+    counter = VolumeCounter(count_records)
+    ctx.add_volume_counter(_as_data_source(ds), counter)
+    return CountingStream(stream, counter)  # type: ignore
+
+
+def _as_data_source(ds: Union[str, DataSource]) -> DataSource:
+    return ds if isinstance(ds, DataSource) else DataSource(ds)
+
+
+def _count_newlines(data: Union[bytes, bytearray, memoryview]) -> int:
+    return (data.tobytes() if isinstance(data, memoryview) else data).count(_NEWLINE)
+
+
+def volume_totals(ctx: LineageTrackingContext) -> dict[DataSource, dict[str, int]]:
+    """
+    Sum up the counters per data source
+    """
+    totals: dict[DataSource, dict[str, int]] = {}
+    for ds, counter in ctx.volume_counters:
+        counter.add_to(totals.setdefault(ds, {}))
+    return totals
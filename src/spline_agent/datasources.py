@@ -12,9 +12,121 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
+import os
+import posixpath
+import re
+import threading
+import weakref
 from dataclasses import dataclass
+from typing import Any, Mapping, Union
+from urllib.parse import urlsplit, urlunsplit
+
+from spline_agent.commons.configuration import Configuration
+
+# the scheme is at least two characters long, not to be confused with a Windows drive letter
+_SCHEME_RE = re.compile(r'[a-zA-Z][a-zA-Z0-9+.-]+:')
+
+# the schemes of the hierarchical file systems, where the `.` and `..` segments and the redundant slashes
+# have the same meaning as in a local path
+_FILE_SYSTEM_SCHEMES = frozenset({'file', 'hdfs'})
 
 
 @dataclass(frozen=True)
 class DataSource:
     url: str
+
+
+class DataSourceInterner:
+    """
+    Canonicalizes the data source URLs, and interns the data sources, so that the URLs pointing to the same
+    logical data source are represented by the same `DataSource` object, and result in the same plan ID.
+
+    A hierarchical URL (`<scheme>://...`) is canonicalized as follows: the scheme and the host are lower-cased,
+    and the configured scheme aliases are replaced by the canonical scheme (e.g. `s3a` by `s3`).
+    The path is only normalized for the file system schemes (`file`, `hdfs`), i.e. the redundant slashes,
+    `.` and `..` segments, and the trailing slash are removed. Elsewhere they can be a part of the name,
+    e.g. of an object store key. Opaque and nested URLs, e.g. `jdbc:postgresql://host/db`, are kept as they are.
+    Other URLs are considered local file paths, and are normalized according to the platform.
+    The canonicalization is disabled by default, as it changes the reported URLs, and so the plan IDs.
+
+    The canonical data sources are remembered per given URL, in a table that is cleared when it's full.
+    The data sources still in use stay shared after that, as they're also tracked by weak references.
+    """
+
+    def __init__(self, max_size: int = 4096):
+        self.enabled = False
+        self.max_size = max_size
+        self.scheme_aliases: dict[str, str] = {}
+        self.__by_url: dict[str, DataSource] = {}
+        self.__by_canonical_url: weakref.WeakValueDictionary[str, DataSource] = weakref.WeakValueDictionary()
+        self.__lock = threading.Lock()
+
+    def configure(self, config: Configuration):
+        self.enabled = bool(config['spline.data_sources.canonicalize'])
+        self.max_size = int(config['spline.data_sources.cache_size'])
+        aliases: Mapping[str, Any] = config.get('spline.data_sources.scheme_aliases') or {}
+        scheme_aliases = {str(k).lower(): str(v).lower() for k, v in aliases.items() if v}
+        if scheme_aliases != self.scheme_aliases:
+            self.scheme_aliases = scheme_aliases
+            self.reset()
+
+    def reset(self):
+        with self.__lock:
+            self.__by_url = {}
+            self.__by_canonical_url = weakref.WeakValueDictionary()
+
+    def data_source(self, ds: Union[str, DataSource]) -> DataSource:
+        """
+        Returns the canonical data source for the given URL or data source
+        """
+        url = ds.url if isinstance(ds, DataSource) else ds
+        if not self.enabled:
+            return ds if isinstance(ds, DataSource) else DataSource(url)
+
+        canonical = self.__by_url.get(url)
+        if canonical is not None:
+            return canonical
+
+        canonical_url = self.canonical_url(url)
+        with self.__lock:
+            canonical = self.__by_canonical_url.get(canonical_url)
+            if canonical is None:
+                if isinstance(ds, DataSource) and ds.url == canonical_url:
+                    canonical = ds
+                else:
+                    canonical = DataSource(canonical_url)
+                self.__by_canonical_url[canonical_url] = canonical
+            if len(self.__by_url) >= self.max_size:
+                self.__by_url = {}
+            self.__by_url[url] = canonical
+            # the canonical data source is usually canonicalized again, e.g. when added to the tracking context
+            self.__by_url[canonical_url] = canonical
+        return canonical
+
+    def canonical_url(self, url: str) -> str:
+        scheme_match = _SCHEME_RE.match(url)
+        if scheme_match is None:
+            return os.path.normpath(url) if url else url
+        if not url.startswith('//', scheme_match.end()):
+            return url
+
+        scheme, netloc, path, query, fragment = urlsplit(url)
+        scheme = scheme.lower()
+        scheme = self.scheme_aliases.get(scheme, scheme)
+
+        # the user info, if any, is case-sensitive
+        user_info, at, host = netloc.rpartition('@')
+        netloc = f'{user_info}{at}{host.lower()}'
+
+        if path and scheme in _FILE_SYSTEM_SCHEMES:
+            path = posixpath.normpath(path)
+            if path.startswith('//'):
+                # POSIX allows two leading slashes to have a special meaning, so `normpath()` keeps them
+                path = '/' + path.lstrip('/')
+            if path == '.':
+                path = ''
+
+        return urlunsplit((scheme, netloc, path, query, fragment))
+
+
+data_source_interner = DataSourceInterner()
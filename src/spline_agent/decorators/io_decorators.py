@@ -16,43 +16,70 @@ from __future__ import annotations
 
 import logging
 from functools import wraps
-from typing import Callable
+from typing import Callable, Optional, Sequence
 
-from .model import DsParamExpr, DataSource
-from ..context import get_tracking_context, LineageTrackingContext
+from .model import DsParamExpr
+from ..context import current_tracking_context, get_tracking_context, LineageTrackingContext
 from ..decorators.spel_evaluator import SpELEvaluator
-from ..enums import WriteMode
+from ..enums import WriteMode, SplineMode
+from ..exceptions import LineageTrackingContextNotInitializedError
+from ..mode_switch import mode_switch
 
 logger = logging.getLogger(__name__)
 
 
 def inputs(*exprs: DsParamExpr):
-    def handler(ctx: LineageTrackingContext, ds: DataSource):
-        ctx.add_input(ds)
+    def handler(ctx: LineageTrackingContext, spel_evaluator: SpELEvaluator):
+        for expr in exprs:
+            ctx.add_input(spel_evaluator.eval_as_data_source(expr))
 
-    return lambda func: _decor(func, handler, *exprs)
+    return lambda func: _decor(func, handler)
 
 
 def output(expr: DsParamExpr, write_mode: WriteMode):
-    def handler(ctx: LineageTrackingContext, ds: DataSource):
-        ctx.output = ds
+    def handler(ctx: LineageTrackingContext, spel_evaluator: SpELEvaluator):
+        ctx.output = spel_evaluator.eval_as_data_source(expr)
         ctx.write_mode = write_mode
 
-    return lambda func: _decor(func, handler, expr)
+    return lambda func: _decor(func, handler)
+
+
+def add_output(expr: DsParamExpr, write_mode: WriteMode, input_sources: Optional[Sequence[DsParamExpr]] = None):
+    """
+    Add an output of the tracked execution, unlike `output()` that (re)assigns the primary one.
+    A separate lineage is reported for every output.
+    :param input_sources: the inputs the output is derived from. Defaults to all the inputs of the execution.
+    """
+    input_exprs = tuple(input_sources) if input_sources is not None else None
+
+    def handler(ctx: LineageTrackingContext, spel_evaluator: SpELEvaluator):
+        out_inputs = None
+        if input_exprs is not None:
+            out_inputs = [spel_evaluator.eval_as_data_source(e) for e in input_exprs]
+        ctx.add_output(spel_evaluator.eval_as_data_source(expr), write_mode, out_inputs)
+
+    return lambda func: _decor(func, handler)
 
 
 def _decor(
         func: Callable,
-        handler: Callable[[LineageTrackingContext, DataSource], None],
-        *ds_exprs: DsParamExpr
+        handler: Callable[[LineageTrackingContext, SpELEvaluator], None],
 ):
     @wraps(func)
     def wrapper(*args, **kwargs):
-        ctx = get_tracking_context()
-        spel_evaluator = SpELEvaluator(func, args, kwargs)
-        for expr in ds_exprs:
-            ds = spel_evaluator.eval_as_data_source(expr)
-            handler(ctx, ds)
+        # the context only exists when the tracking wasn't DISABLED when the tracked call was entered,
+        # the mode switched in the meantime doesn't matter
+        if mode_switch.mode is SplineMode.DISABLED and current_tracking_context() is None:
+            return func(*args, **kwargs)
+        try:
+            ctx = get_tracking_context()
+        except LineageTrackingContextNotInitializedError:
+            # no tracked call to record into is expected, only when the tracking is switched off at runtime
+            if mode_switch.mode in (SplineMode.DISABLED, SplineMode.BYPASS):
+                return func(*args, **kwargs)
+            raise
+
+        handler(ctx, SpELEvaluator(func, args, kwargs))
 
         return func(*args, **kwargs)
 
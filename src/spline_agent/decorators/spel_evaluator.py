@@ -13,21 +13,20 @@
 #  limitations under the License.
 
 import inspect
-from typing import Callable, Mapping, Any
-from urllib.parse import urlparse
+from functools import lru_cache
+from typing import Callable, Any
 
-from spline_agent.datasources import DataSource
+from spline_agent.datasources import DataSource, data_source_interner
 from spline_agent.decorators.model import SpELExpr, DsParamExpr
 
 
 class SpELEvaluator:
     def __init__(self, func: Callable, args, kwargs):
-        # inspect the 'func' signature and collect the parameter names
-        sig: inspect.Signature = inspect.signature(func)
-        params: Mapping[str, inspect.Parameter] = sig.parameters
+        # collect the 'func' parameter names
+        params = _param_names(func)
 
         # create a combined dictionary of all arguments passed to target function
-        self.__bindings = {**{key: arg for key, arg in zip(params, args)}, **kwargs}
+        self.__bindings = {**dict(zip(params, args)), **kwargs}
 
     def eval(self, expr: SpELExpr) -> Any:
         if type(expr) is not str:
@@ -40,13 +39,18 @@ class SpELEvaluator:
 
     def eval_as_data_source(self, expr: DsParamExpr) -> DataSource:
         if isinstance(expr, DataSource):
-            return expr
+            return data_source_interner.data_source(expr)
 
         if type(expr) is str:
             val = self.eval(expr)
-            if isinstance(val, DataSource):
-                return val
-            if type(val) is str and urlparse(val):
-                return DataSource(val)
+            if isinstance(val, DataSource) or type(val) is str:
+                return data_source_interner.data_source(val)
 
         raise ValueError(f'{expr} should be a DataSource, URL string, or a parameter binding expression like {{name}}')
+
+
+@lru_cache(maxsize=1024)
+def _param_names(func: Callable) -> tuple[str, ...]:
+    # inspecting the signature is relatively expensive, so it's done once per function
+    sig: inspect.Signature = inspect.signature(func)
+    return tuple(sig.parameters)
@@ -15,21 +15,30 @@
 import inspect
 import logging
 import time
-from functools import wraps
+from functools import wraps, lru_cache
 from typing import Optional, Any, cast, Callable
 
-from spline_agent.commons.configuration import Configuration, CompositeConfiguration
-from spline_agent.commons.configuration.env_configuration import EnvConfiguration
-from spline_agent.commons.configuration.file_configuration import FileConfiguration
+from spline_agent import constants
+from spline_agent.commons.configuration import Configuration
 from spline_agent.commons.proxy import ObservingProxy
-from spline_agent.constants import CONFIG_FILE_DEFAULT, CONFIG_FILE_USER, DEFAULT_SYSTEM_INFO
-from spline_agent.context import with_context_do, LineageTrackingContext
+from spline_agent.commons.utils import current_time
+from spline_agent.config_loader import load_config
+from spline_agent.context import with_context_do, current_tracking_context, LineageTrackingContext, PipelineStage
 from spline_agent.decorators.spel_evaluator import SpELEvaluator
-from spline_agent.dispatcher import LineageDispatcher
-from spline_agent.enums import SplineMode
-from spline_agent.harvester import harvest_lineage
+from spline_agent.datasources import data_source_interner
+from spline_agent.deferred_harvester import DeferredHarvester, ExecutionRecord, get_deferred_harvester
+from spline_agent.dispatcher import LineageDispatcher, dispatch_lineage
+from spline_agent.enums import NestingPolicy, SplineMode
+from spline_agent.harvester import harvest_lineages, validate_tracking_context
+from spline_agent.instrumentation import overhead_stats, Phase
 from spline_agent.lineage_model import NameAndVersion, DurationNs
+from spline_agent.metrics import configure_metrics
+from spline_agent.mode_switch import mode_switch
 from spline_agent.object_factory import ObjectFactory
+from spline_agent.payload_layout import payload_layout
+from spline_agent.resource_usage import take_snapshot, usage_delta
+from spline_agent.source_analysis import callee_finder
+from spline_agent.source_capture import source_capture
 
 logger = logging.getLogger(__name__)
 
@@ -40,6 +49,10 @@ def track_lineage(
         system_info: Optional[NameAndVersion] = None,
         dispatcher: Optional[LineageDispatcher] = None,
         config: Optional[Configuration] = None,
+        deferred: Optional[bool] = None,
+        resource_usage: Optional[bool] = None,
+        record_calls: Optional[bool] = None,
+        nesting: Optional[NestingPolicy] = None,
 ):
     # check if the decorator is used correctly
     first_arg = locals()[next(iter(inspect.signature(track_lineage).parameters.keys()))]
@@ -50,28 +63,67 @@ def track_lineage(
             f'@{track_lineage.__name__}() decorator should be used with parentheses, even if no arguments are provided')
 
     # configure
-    logger.debug(f'CONFIG_FILE_DEFAULT : {CONFIG_FILE_DEFAULT}')
-    logger.debug(f'CONFIG_FILE_USER    : {CONFIG_FILE_USER}')
-    default_config = FileConfiguration(CONFIG_FILE_DEFAULT)
-    user_config = config if config is not None else FileConfiguration(CONFIG_FILE_USER)
-    env_config = EnvConfiguration(prefix='spline')
-    config = CompositeConfiguration(env_config, user_config, default_config)
+    config = load_config(config)
 
     # determine mode
     mode = mode if mode is not None else SplineMode[config['spline.mode']]
 
+    # start watching for runtime mode overrides, if configured
+    mode_switch.configure(config)
+
+    # enable the agent's own overhead instrumentation, if configured
+    overhead_stats.configure(config)
+
+    # start exporting the agent metrics, if configured
+    configure_metrics(config)
+
+    # decide what goes into the plan and the event, and the event size limits
+    payload_layout.configure(config)
+
+    # whether and how the data source URLs are canonicalized
+    data_source_interner.configure(config)
+
+    # how much of the tracked functions source code to capture
+    source_capture.configure(config)
+    callee_finder.configure(config)
+
+    # record the user code functions actually entered by each call.
+    # The call recorder is only imported when it's used, to keep the agent import fast.
+    record_calls = record_calls if record_calls is not None else config['spline.source_capture.runtime_calls.enabled']
+    if record_calls:
+        from spline_agent.call_recorder import call_recorder
+        call_recorder.configure(config)
+
     # proceed according to the mode
-    if mode is SplineMode.ENABLED:
-        logging.info('Lineage tracking is ENABLED')
-        # obtain dispatcher from config if not provided
-        factory = ObjectFactory(config)
-        disp = dispatcher if dispatcher is not None else factory.instantiate(LineageDispatcher)
-        si = system_info if system_info is not None else DEFAULT_SYSTEM_INFO
-        return lambda func: _active_decorator(func, name, si, disp)
-
-    elif mode is SplineMode.BYPASS:
-        logging.info('Lineage tracking is in BYPASS mode -- not captured')
-        return _bypass_decorator
+    if mode is SplineMode.ENABLED or mode is SplineMode.BYPASS:
+        if mode is SplineMode.ENABLED:
+            logging.info('Lineage tracking is ENABLED')
+        else:
+            logging.info('Lineage tracking is in BYPASS mode -- not captured')
+
+        # obtain dispatcher from config if not provided.
+        # In the BYPASS mode it's only instantiated if the tracking is switched on at runtime.
+        disp_provider = _dispatcher_provider(dispatcher, ObjectFactory(config))
+        if mode is SplineMode.ENABLED:
+            disp_provider()
+
+        si = system_info if system_info is not None else constants.DEFAULT_SYSTEM_INFO
+
+        # in the deferred mode the lineage is harvested and dispatched off the caller thread
+        deferred = deferred if deferred is not None else config['spline.harvesting.deferred']
+        harvester = get_deferred_harvester(config['spline.harvesting.queue_size']) if deferred else None
+
+        # capture CPU, memory, context switches and I/O used by each call
+        capture_usage = resource_usage if resource_usage is not None else config['spline.resource_usage.enabled']
+
+        # whether the nested tracked calls are reported separately, or as the stages of this call
+        if nesting is None:
+            nesting = NestingPolicy(config['spline.harvesting.nesting'].lower())
+
+        decorated_mode = mode
+        nesting_policy = nesting
+        return lambda func: _switchable_decorator(
+            func, decorated_mode, name, si, disp_provider, harvester, capture_usage, record_calls, nesting_policy)
 
     elif mode is SplineMode.DISABLED:
         logging.info('Lineage tracking is DISABLED')
@@ -82,28 +134,92 @@ def track_lineage(
         raise ValueError(f"Unknown Spline mode '{mode_name}'")
 
 
+def _dispatcher_provider(
+        dispatcher: Optional[LineageDispatcher],
+        factory: ObjectFactory,
+) -> Callable[[], LineageDispatcher]:
+    if dispatcher is not None:
+        return lambda: dispatcher
+    return lru_cache(maxsize=None)(lambda: factory.instantiate(LineageDispatcher))
+
+
+def _switchable_decorator(
+        func: Callable,
+        decorated_mode: SplineMode,
+        name: Optional[str],
+        system_info: NameAndVersion,
+        dispatcher_provider: Callable[[], LineageDispatcher],
+        harvester: Optional[DeferredHarvester],
+        capture_usage: bool,
+        record_calls: bool,
+        nesting: NestingPolicy,
+):
+    active_wrapper = _active_decorator(
+        func, name, system_info, dispatcher_provider, harvester, capture_usage, record_calls, nesting)
+    bypass_wrapper = _bypass_decorator(func)
+
+    @wraps(func)
+    def switchable_wrapper(*args, **kwargs):
+        # the runtime override (if any) takes precedence over the mode resolved at decoration time
+        mode = mode_switch.mode or decorated_mode
+        if mode is SplineMode.ENABLED:
+            return active_wrapper(*args, **kwargs)
+        elif mode is SplineMode.BYPASS:
+            return bypass_wrapper(*args, **kwargs)
+        else:
+            return func(*args, **kwargs)
+
+    return switchable_wrapper
+
+
 def _active_decorator(
         func: Callable,
         name: Optional[str],
         system_info: NameAndVersion,
-        dispatcher: LineageDispatcher,
+        dispatcher_provider: Callable[[], LineageDispatcher],
+        harvester: Optional[DeferredHarvester],
+        capture_usage: bool,
+        record_calls: bool,
+        nesting: NestingPolicy,
 ):
+    if record_calls:
+        from spline_agent.call_recorder import call_recorder
+        call_recorder.allow_modules([func.__module__])
+        call_recorder.register_function(inspect.unwrap(func))
+
     @wraps(func)
     def active_wrapper(*args, **kwargs):
-        spel_evaluator = SpELEvaluator(func, args, kwargs)
+        timer = overhead_stats.start_timer()
+
+        app_name = SpELEvaluator(func, args, kwargs).eval(name) if name else name
+        if timer:
+            timer.lap(Phase.SPEL_EVALUATION)
 
         # create and pre-populate a new harvesting context
         ctx = LineageTrackingContext()
-        app_name = spel_evaluator.eval(name) if name else name
         ctx.name = app_name if app_name else func.__name__
         ctx.system_info = system_info
 
+        parent_ctx = current_tracking_context()
+        if parent_ctx is not None and parent_ctx.pipeline_root is not None:
+            # a stage of the pipeline tracked by an outer call
+            ctx.pipeline_root = parent_ctx.pipeline_root
+        elif nesting is NestingPolicy.PIPELINE:
+            ctx.pipeline_root = ctx
+        if timer:
+            timer.lap(Phase.CONTEXT_SETUP)
+
         # prepare execution stage
         error: Optional[Any] = None
+        usage_start = take_snapshot() if capture_usage else None
         start_time: DurationNs = time.time_ns()
 
         # call target function within the given tracking context
         try:
+            if record_calls:
+                with call_recorder.recording() as calls:
+                    ctx.recorded_calls = calls
+                    return with_context_do(ctx, lambda: func(*args, **kwargs))
             return with_context_do(ctx, lambda: func(*args, **kwargs))
         except Exception as ex:
             error = ex
@@ -111,13 +227,33 @@ def _active_decorator(
         finally:
             end_time: DurationNs = time.time_ns()
             duration_ns = end_time - start_time
+            error_str = error.__str__() if error is not None else None
+            event_extra = {'resource_usage': usage_delta(usage_start, take_snapshot())} if usage_start else None
+            if timer:
+                timer.restart()
+
+            if parent_ctx is not None and ctx.pipeline_root is not None and ctx.pipeline_root is not ctx:
+                # the outermost call harvests and dispatches the lineage of the whole pipeline
+                ctx.pipeline_root.add_stage(PipelineStage(ctx, parent_ctx, func, duration_ns, error_str))
+            elif harvester is not None:
+                # only record the execution, the lineage is harvested and dispatched by a background worker
+                validate_tracking_context(ctx)
+                record = ExecutionRecord(
+                    ctx, func, current_time(), duration_ns, error_str, dispatcher_provider(), event_extra)
+                harvester.submit(record)
+            else:
+                # obtain lineage model, one per output
+                lineages = harvest_lineages(ctx, func, duration_ns, error_str, timer=timer, event_extra=event_extra)
 
-            # obtain lineage model
-            lineage = harvest_lineage(ctx, func, duration_ns, error.__str__() if error is not None else None)
+                # dispatch captured lineage
+                dispatcher = dispatcher_provider()
+                for lineage in lineages:
+                    dispatch_lineage(dispatcher, lineage)
+                if timer:
+                    timer.lap(Phase.DISPATCH)
 
-            # dispatch captured lineage
-            dispatcher.send_plan(lineage.plan)
-            dispatcher.send_event(lineage.event)
+            if timer:
+                timer.commit()
 
     return active_wrapper
 
@@ -0,0 +1,158 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import atexit
+import logging
+import os
+import queue
+import threading
+from typing import Any, Callable, Mapping, NamedTuple, Optional
+
+from spline_agent.context import LineageTrackingContext
+from spline_agent.dispatcher import LineageDispatcher, dispatch_lineage
+from spline_agent.harvester import harvest_lineages
+from spline_agent.instrumentation import overhead_stats, Phase
+from spline_agent.lineage_model import DurationNs, Timestamp
+from spline_agent.metrics import QUEUE_DEPTH, DROPPED
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutionRecord(NamedTuple):
+    """
+    A raw record of a tracked function execution, captured on the hot path.
+    The context holds the function name, data sources and the write mode
+    and is not mutated anymore after the tracked function has returned.
+    """
+    ctx: LineageTrackingContext
+    func: Callable
+    timestamp: Timestamp
+    duration_ns: DurationNs
+    error: Optional[str]
+    dispatcher: LineageDispatcher
+    event_extra: Optional[Mapping[str, Any]] = None
+
+
+class DeferredHarvester:
+    """
+    Builds and dispatches lineage off the caller thread.
+    The tracked function only puts an `ExecutionRecord` into a bounded queue,
+    while a background worker thread harvests the lineage model from it and sends it to the dispatcher.
+    When the queue is full the record is dropped, rather than blocking the tracked function.
+
+    A forked child process starts with an empty queue and its own worker thread,
+    the records queued before the fork are left to the parent process.
+    """
+
+    def __init__(self, queue_size: int):
+        assert queue_size > 0
+        self.__queue_size = queue_size
+        self.__dropped = 0
+        self.__lock = threading.Lock()
+        self.__start()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self.__reset)
+
+    @property
+    def queue_size(self) -> int:
+        return self.__queue_size
+
+    @property
+    def queue_depth(self) -> int:
+        return self.__queue.qsize()
+
+    @property
+    def dropped(self) -> int:
+        return self.__dropped
+
+    def submit(self, record: ExecutionRecord) -> bool:
+        """
+        Enqueue the record for harvesting.
+        :return: `True` if accepted, `False` if the record was dropped because the queue is full
+        """
+        try:
+            self.__queue.put_nowait(record)
+            return True
+        except queue.Full:
+            with self.__lock:
+                self.__dropped += 1
+                dropped = self.__dropped
+            DROPPED.inc(queue='harvesting')
+            logger.warning(f"Lineage harvesting queue is full, execution record of '{record.ctx.name}' is dropped "
+                           f"({dropped} dropped so far)")
+            return False
+
+    def flush(self):
+        """
+        Block until all the enqueued records are harvested and dispatched
+        """
+        self.__queue.join()
+
+    def __start(self):
+        self.__queue: queue.Queue[ExecutionRecord] = queue.Queue(maxsize=self.__queue_size)
+        self.__thread = threading.Thread(target=self.__run, name='spline-deferred-harvester', daemon=True)
+        self.__thread.start()
+
+    def __reset(self):
+        # the worker thread doesn't survive the fork, and the inherited queue might never be drained
+        self.__lock = threading.Lock()
+        self.__start()
+
+    def __run(self):
+        while True:
+            record = self.__queue.get()
+            try:
+                timer = overhead_stats.start_timer()
+                lineages = harvest_lineages(
+                    record.ctx, record.func, record.duration_ns, record.error, record.timestamp, timer,
+                    record.event_extra)
+                for lineage in lineages:
+                    dispatch_lineage(record.dispatcher, lineage)
+                if timer:
+                    timer.lap(Phase.DISPATCH)
+                    timer.commit()
+            except Exception as ex:
+                logger.error(f"Failed to harvest or dispatch lineage of '{record.ctx.name}': {ex}", exc_info=True)
+            finally:
+                self.__queue.task_done()
+
+
+_instance: Optional[DeferredHarvester] = None
+_instance_lock = threading.Lock()
+
+
+def get_deferred_harvester(queue_size: int) -> DeferredHarvester:
+    """
+    Returns the process-wide deferred harvester, creating it on the first call.
+    Its queue size is given by the first call, a different size requested later is ignored with a warning.
+    Records still in the queue are flushed when the interpreter exits.
+    """
+    global _instance
+    with _instance_lock:
+        if _instance is None:
+            _instance = DeferredHarvester(queue_size)
+            QUEUE_DEPTH.set_function(lambda: _instance.queue_depth if _instance else 0, queue='harvesting')
+            atexit.register(_instance.flush)
+        elif queue_size != _instance.queue_size:
+            logger.warning(f"Lineage harvesting queue size {queue_size} is ignored, "
+                           f"the queue is already created with size {_instance.queue_size}")
+        return _instance
+
+
+def flush_deferred_harvester():
+    """
+    Block until the records enqueued in the process-wide deferred harvester, if it's created, are dispatched
+    """
+    if _instance is not None:
+        _instance.flush()
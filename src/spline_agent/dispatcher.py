@@ -12,9 +12,13 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
+import atexit
 from abc import ABC, abstractmethod
+from typing import Any, Callable, Iterable, Sequence
 
-from spline_agent.lineage_model import ExecutionPlan, ExecutionEvent
+from spline_agent.batch import LineageBatch
+from spline_agent.lineage_model import ExecutionPlan, ExecutionEvent, Lineage
+from spline_agent.source_capture import source_capture
 
 
 class LineageDispatcher(ABC):
@@ -23,6 +27,10 @@ class LineageDispatcher(ABC):
     sending captured lineage information to a target destination.
     """
 
+    # Whether the dispatcher reports the delivered plans to `source_capture.plan_sent()` itself,
+    # e.g. as it sends them asynchronously. Otherwise, a plan is delivered once `send_plan()` returns.
+    reports_delivery = False
+
     @abstractmethod
     def send_plan(self, plan: ExecutionPlan):
         """Send execution plan"""
@@ -32,3 +40,70 @@ class LineageDispatcher(ABC):
     def send_event(self, event: ExecutionEvent):
         """Send execution event"""
         pass
+
+    def send_events(self, events: Iterable[ExecutionEvent]):
+        """
+        Send many execution events at once, e.g. an `EventBatch`.
+        By default, they are sent one by one.
+        """
+        for event in events:
+            self.send_event(event)
+
+    def send_serialized(self, kind: str, records: Sequence[Any], records_json: Sequence[str]):
+        """
+        Send the plans or events, that are already serialized into the compact JSON (see `to_compact_json_str()`),
+        e.g. by a dispatcher pipeline, once for all its sinks.
+        By default, the JSON is ignored, and the records are sent as usual.
+
+        The plans sent this way are reported delivered by the caller.
+
+        :param kind: `plan` or `event`
+        :param records_json: the JSON of every record
+        """
+        if kind == 'plan':
+            for plan in records:
+                self.send_plan(plan)
+        elif len(records) == 1:
+            self.send_event(records[0])
+        else:
+            self.send_events(records)
+
+
+def dispatch_lineage(dispatcher: LineageDispatcher, lineage: Lineage):
+    """
+    Send the plan and the event, and report the plan delivered, unless the dispatcher does it itself
+    """
+    _send_plan(dispatcher, lineage.plan)
+    dispatcher.send_event(lineage.event)
+
+
+def dispatch_batch(dispatcher: LineageDispatcher, lineage: LineageBatch):
+    """
+    Send the plan and the events harvested by `harvest_many()`, and report the plan delivered,
+    unless the dispatcher does it itself
+    """
+    _send_plan(dispatcher, lineage.plan)
+    dispatcher.send_events(lineage.events)
+
+
+def _send_plan(dispatcher: LineageDispatcher, plan: ExecutionPlan):
+    dispatcher.send_plan(plan)
+    # not `if not ...`, as a mock dispatcher has a truthy mock attribute
+    if dispatcher.reports_delivery is not True:
+        source_capture.plan_sent(plan)
+
+
+def close_at_exit(close: Callable[[], None]):
+    """
+    Registers the close method of a dispatcher, to be called when the interpreter exits.
+    The lineage still queued for harvesting is dispatched before, even if the deferred harvester is created
+    before the dispatcher, and so its own exit handler would only run after that one.
+    """
+    atexit.register(_close_at_exit, close)
+
+
+def _close_at_exit(close: Callable[[], None]):
+    from spline_agent.deferred_harvester import flush_deferred_harvester
+
+    flush_deferred_harvester()
+    close()
@@ -12,9 +12,12 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
+import time
+
 from spline_agent.dispatcher import LineageDispatcher
 from spline_agent.json_serde import to_pretty_json_str
 from spline_agent.lineage_model import ExecutionEvent, ExecutionPlan
+from spline_agent.metrics import record_dispatch
 
 
 class ConsoleLineageDispatcher(LineageDispatcher):
@@ -24,9 +27,18 @@ class ConsoleLineageDispatcher(LineageDispatcher):
     """
 
     def send_plan(self, plan: ExecutionPlan):
+        start_time = time.perf_counter()
         plan_json: str = to_pretty_json_str(plan)
         print(f'Execution Plan: {plan_json}')
+        self.__record(plan_json, 'plan', start_time)
 
     def send_event(self, event: ExecutionEvent):
+        start_time = time.perf_counter()
         event_json: str = to_pretty_json_str(event)
         print(f'Execution Event: {event_json}')
+        self.__record(event_json, 'event', start_time)
+
+    @staticmethod
+    def __record(json_str: str, kind: str, start_time: float):
+        size = len(json_str.encode('utf-8'))
+        record_dispatch('console', kind, size, size, time.perf_counter() - start_time)
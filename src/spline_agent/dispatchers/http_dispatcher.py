@@ -13,6 +13,8 @@
 #  limitations under the License.
 
 import logging
+import time
+from typing import Any, Iterable, Sequence
 from urllib.parse import urljoin
 
 import requests
@@ -22,6 +24,7 @@ from requests import Response
 from spline_agent.dispatcher import LineageDispatcher
 from spline_agent.json_serde import to_compact_json_str
 from spline_agent.lineage_model import ExecutionEvent, ExecutionPlan
+from spline_agent.metrics import record_dispatch, DISPATCH_FAILURES
 
 logger = logging.getLogger(__name__)
 
@@ -49,16 +52,47 @@ class HttpLineageDispatcher(LineageDispatcher):
     def send_plan(self, plan: ExecutionPlan):
         """POST execution plan"""
         plan_json: str = to_compact_json_str(plan)
-        res = self.__do_send(plan_json, self.__plans_url)
+        res = self.__do_send(plan_json, self.__plans_url, 'plan')
         logger.info(f'execution plan sent: {res.status_code}, {res.text}')
 
     def send_event(self, event: ExecutionEvent):
         """POST execution event"""
         event_json: str = to_compact_json_str([event])
-        res = self.__do_send(event_json, self.__events_url)
+        res = self.__do_send(event_json, self.__events_url, 'event')
         logger.info(f'execution event sent: {res.status_code}, {res.text}')
 
-    def __do_send(self, json_payload: str, url: str) -> Response:
-        res = requests.post(url=url, data=json_payload, headers={HttpHeaders.CONTENT_TYPE: self.__content_type})
-        res.raise_for_status()
+    def send_events(self, events: Iterable[ExecutionEvent]):
+        """POST execution events in a single request"""
+        event_list = list(events)
+        if not event_list:
+            return
+        events_json: str = to_compact_json_str(event_list)
+        res = self.__do_send(events_json, self.__events_url, 'event', len(event_list))
+        logger.info(f'{len(event_list)} execution events sent: {res.status_code}, {res.text}')
+
+    def send_serialized(self, kind: str, records: Sequence[Any], records_json: Sequence[str]):
+        """POST the pre-serialized plans one by one, or the events in a single request"""
+        if kind == 'plan':
+            for plan_json in records_json:
+                res = self.__do_send(plan_json, self.__plans_url, 'plan')
+                logger.info(f'execution plan sent: {res.status_code}, {res.text}')
+        elif records_json:
+            res = self.__do_send(f'[{",".join(records_json)}]', self.__events_url, 'event', len(records_json))
+            logger.info(f'{len(records_json)} execution events sent: {res.status_code}, {res.text}')
+
+    def __do_send(self, json_payload: str, url: str, kind: str, count: int = 1) -> Response:
+        body = json_payload.encode('utf-8')
+        start_time = time.perf_counter()
+        try:
+            res = requests.post(url=url, data=body, headers={HttpHeaders.CONTENT_TYPE: self.__content_type})
+            res.raise_for_status()
+        except requests.HTTPError as ex:
+            status = str(ex.response.status_code) if ex.response is not None else 'unknown'
+            DISPATCH_FAILURES.inc(dispatcher='http', kind=kind, status=status)
+            raise
+        except requests.RequestException:
+            DISPATCH_FAILURES.inc(dispatcher='http', kind=kind, status='connection_error')
+            raise
+        # the request body is not compressed, so the payload and the sent sizes are equal
+        record_dispatch('http', kind, len(body), len(body), time.perf_counter() - start_time, count)
         return res
@@ -15,10 +15,12 @@
 from __future__ import annotations
 
 import logging
+import time
 
 from spline_agent.dispatcher import LineageDispatcher
 from spline_agent.json_serde import to_pretty_json_str
 from spline_agent.lineage_model import ExecutionEvent, ExecutionPlan
+from spline_agent.metrics import record_dispatch
 
 
 class LoggingLineageDispatcher(LineageDispatcher):
@@ -40,9 +42,18 @@ class LoggingLineageDispatcher(LineageDispatcher):
         self.__logger = logger if isinstance(logger, logging.Logger) else logging.getLogger(logger)
 
     def send_plan(self, plan: ExecutionPlan):
+        start_time = time.perf_counter()
         plan_json: str = to_pretty_json_str(plan)
         self.__logger.log(self.__level, f'Execution Plan: {plan_json}')
+        self.__record(plan_json, 'plan', start_time)
 
     def send_event(self, event: ExecutionEvent):
+        start_time = time.perf_counter()
         event_json: str = to_pretty_json_str(event)
         self.__logger.log(self.__level, f'Execution Event: {event_json}')
+        self.__record(event_json, 'event', start_time)
+
+    @staticmethod
+    def __record(json_str: str, kind: str, start_time: float):
+        size = len(json_str.encode('utf-8'))
+        record_dispatch('logging', kind, size, size, time.perf_counter() - start_time)
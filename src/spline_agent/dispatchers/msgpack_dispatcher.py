@@ -0,0 +1,33 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+from typing import Any, Optional
+
+from spline_agent.dispatchers.ndjson_dispatcher import NdjsonLineageDispatcher
+from spline_agent.msgpack_codec import FILE_MAGIC, encode_frame
+
+
+class MsgpackLineageDispatcher(NdjsonLineageDispatcher):
+    """
+    Same as `NdjsonLineageDispatcher`, but writes the binary lineage files (see `spline_agent.msgpack_codec`),
+    that are smaller, and skip the JSON serialization. They are converted to JSON by `spline-agent replay`.
+    """
+
+    _METRICS_NAME = 'msgpack'
+
+    def _encode(self, kind: str, records: list[Any], records_ndjson: Optional[list[str]] = None) -> bytes:
+        return b''.join(encode_frame(kind, r) for r in records)
+
+    def _file_header(self) -> bytes:
+        return FILE_MAGIC
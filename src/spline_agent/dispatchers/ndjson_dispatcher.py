@@ -0,0 +1,295 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import gzip
+import logging
+import os
+import shutil
+import sys
+import threading
+import time
+from typing import Any, BinaryIO, Iterable, Optional, Sequence
+
+from spline_agent.dispatcher import LineageDispatcher, close_at_exit
+from spline_agent.json_serde import to_ndjson_str
+from spline_agent.lineage_file import EVENT_KIND, PLAN_KIND, envelope_json
+from spline_agent.lineage_model import ExecutionEvent, ExecutionPlan
+from spline_agent.metrics import record_dispatch, DROPPED
+
+logger = logging.getLogger(__name__)
+
+# The path meaning the standard output
+STDOUT_PATH = '-'
+
+# While the file can't be written, the records are kept in the buffer up to that many times its size
+_MAX_BUFFERED_FACTOR = 4
+
+
+class NdjsonLineageDispatcher(LineageDispatcher):
+    """
+    Lineage dispatcher that appends the plans and events as compact NDJSON records (see `spline_agent.lineage_file`)
+    to a file or the standard output, to be shipped later, e.g. by `spline-agent replay`.
+
+    The records are collected in a write buffer, that is written out when it's full, every `flush_interval_sec`,
+    and on exit. So a crash loses at most the buffered records. When the file can't be written, the records
+    are kept in the buffer and retried, until it grows over 4 times its size, and then they are dropped.
+    A forked child process starts with an empty buffer, and opens the file again.
+    The records written after the dispatcher is closed, e.g. by the threads still running on exit, are dropped.
+
+    The file is rotated when it reaches `max_bytes`, or gets older than `max_age_sec`: it's renamed to
+    `<name>-<timestamp>-<sequence><ext>` in the same directory, and optionally gzip-compressed in the background.
+    The segment names sort in the order they were written, and before the active file.
+    A forked child process writes into its own file then, `<name>-<pid><ext>`, not to rotate the parent's one.
+    """
+
+    _METRICS_NAME = 'ndjson'
+
+    def __init__(self,
+                 path: str,
+                 buffer_size: int,
+                 flush_interval_sec: Optional[float],
+                 max_bytes: Optional[int],
+                 max_age_sec: Optional[float],
+                 compress: bool,
+                 ):
+        """
+        :param path: the active file path, or '-' for the standard output, that is never rotated
+        :param buffer_size: the write buffer size in bytes
+        :param flush_interval_sec: how often to write out the buffer. Empty means only when it's full.
+        :param max_bytes: rotate the file when it's that big. Empty means no size based rotation.
+        :param max_age_sec: rotate the file when it's that old. Empty means no time based rotation.
+        :param compress: gzip the rotated segments
+        """
+        self.__path = path
+        self.__buffer_size = int(buffer_size)
+        self.__max_bytes = int(max_bytes) if max_bytes else None
+        self.__max_age_sec = float(max_age_sec) if max_age_sec else None
+        self.__compress = bool(compress)
+        self.__buffer = bytearray()
+        self.__buffered_records = 0
+        self.__lock = threading.Lock()
+        self.__file: Optional[BinaryIO] = None
+        self.__file_size = 0
+        self.__file_opened_at = 0.0
+        self.__segment_seq = 0
+        self.__compressors: list[threading.Thread] = []
+        self.__closed = False
+
+        self.__stopped = threading.Event()
+        self.__flush_interval_sec = float(flush_interval_sec) if flush_interval_sec else None
+        self.__flusher: Optional[threading.Thread] = None
+        self.__start_flusher()
+        close_at_exit(self.close)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self.__reset)
+
+    def send_plan(self, plan: ExecutionPlan):
+        self.__write(PLAN_KIND, [plan])
+
+    def send_event(self, event: ExecutionEvent):
+        self.__write(EVENT_KIND, [event])
+
+    def send_events(self, events: Iterable[ExecutionEvent]):
+        self.__write(EVENT_KIND, list(events))
+
+    def send_serialized(self, kind: str, records: Sequence[Any], records_json: Sequence[str]):
+        self.__write(kind, list(records), [j.replace('\n', '') for j in records_json])
+
+    def flush(self):
+        """
+        Write out the buffered records, and rotate the file if it's due
+        """
+        with self.__lock:
+            self.__flush()
+            if self.__rotation_due():
+                self.__rotate()
+
+    def close(self):
+        self.__stopped.set()
+        with self.__lock:
+            if self.__closed:
+                return
+            self.__closed = True
+            try:
+                self.__flush()
+            except OSError as ex:
+                logger.error(f'Failed to write lineage to {self.__path}, {self.__buffered_records} records lost: {ex}')
+            if self.__file is not None and self.__path != STDOUT_PATH:
+                self.__file.close()
+            self.__file = None
+        for compressor in self.__compressors:
+            compressor.join()
+
+    def _encode(self, kind: str, records: list[Any], records_ndjson: Optional[list[str]] = None) -> bytes:
+        """
+        The records of the given kind, in the file format.
+        The records might be already serialized into single line JSON, to be used if the format is JSON.
+        """
+        if records_ndjson is None:
+            records_ndjson = [to_ndjson_str(r) for r in records]
+        return ''.join(f'{envelope_json(kind, j)}\n' for j in records_ndjson).encode('utf-8')
+
+    def _file_header(self) -> bytes:
+        """
+        Written at the start of every file
+        """
+        return b''
+
+    def __write(self, kind: str, records: list[Any], records_ndjson: Optional[list[str]] = None):
+        if not records:
+            return
+        start_time = time.perf_counter()
+        data = self._encode(kind, records, records_ndjson)
+        with self.__lock:
+            if self.__closed:
+                DROPPED.inc(len(records), queue=f'{self._METRICS_NAME}_closed')
+                logger.warning(f'The lineage dispatcher of {self.__path} is closed, {len(records)} records dropped')
+                return
+            self.__buffer += data
+            self.__buffered_records += len(records)
+            if len(self.__buffer) >= self.__buffer_size:
+                try:
+                    self.__flush()
+                    if self.__rotation_due():
+                        self.__rotate()
+                except OSError as ex:
+                    # the records stay buffered, and are retried on the next flush
+                    logger.error(f'Failed to write lineage to {self.__path}: {ex}')
+        record_dispatch(self._METRICS_NAME, kind, len(data), len(data), time.perf_counter() - start_time, len(records))
+
+    def __flush(self):
+        if not self.__buffer:
+            return
+        try:
+            self.__write_buffer()
+        except OSError:
+            if len(self.__buffer) > self.__buffer_size * _MAX_BUFFERED_FACTOR:
+                DROPPED.inc(self.__buffered_records, queue=f'{self._METRICS_NAME}_buffer')
+                logger.error(f'The lineage write buffer of {self.__path} is full, '
+                             f'{self.__buffered_records} records dropped')
+                self.__buffer.clear()
+                self.__buffered_records = 0
+            raise
+
+    def __write_buffer(self):
+        buffered_size = len(self.__buffer)
+        try:
+            f = self.__open()
+            _write_fully(f, self.__buffer)
+            f.flush()
+            self.__buffered_records = 0
+        finally:
+            self.__file_size += buffered_size - len(self.__buffer)
+
+    def __open(self) -> BinaryIO:
+        if self.__file is None:
+            if self.__path == STDOUT_PATH:
+                self.__file = sys.stdout.buffer
+            else:
+                self.__file = open(self.__path, 'ab', buffering=0)
+                self.__file_size = self.__file.tell()
+            self.__file_opened_at = time.monotonic()
+            header = self._file_header()
+            if header and not self.__file_size:
+                self.__file_size = _write_fully(self.__file, bytearray(header))
+        return self.__file
+
+    def __rotation_due(self) -> bool:
+        if self.__file is None or self.__path == STDOUT_PATH or not self.__file_size:
+            return False
+        return bool(
+            self.__max_bytes and self.__file_size >= self.__max_bytes
+            or self.__max_age_sec and time.monotonic() - self.__file_opened_at >= self.__max_age_sec)
+
+    def __rotate(self):
+        assert self.__file is not None
+        self.__file.close()
+        self.__file = None
+        stem, ext = os.path.splitext(self.__path)
+        timestamp = time.strftime('%Y%m%dT%H%M%S')
+        while True:
+            # the segments of a previous process might exist
+            self.__segment_seq += 1
+            segment_path = f'{stem}-{timestamp}-{self.__segment_seq:06d}{ext}'
+            if not os.path.exists(segment_path) and not os.path.exists(f'{segment_path}.gz'):
+                break
+        os.replace(self.__path, segment_path)
+        logger.debug(f'Rotated {self.__path} to {segment_path}')
+        if self.__compress:
+            compressor = threading.Thread(target=_compress, args=(segment_path,), name='spline-ndjson-compressor')
+            compressor.start()
+            self.__compressors = [t for t in self.__compressors if t.is_alive()] + [compressor]
+
+    def __start_flusher(self):
+        if self.__flush_interval_sec:
+            self.__flusher = threading.Thread(
+                target=self.__run, args=(self.__flush_interval_sec,), name='spline-ndjson-flusher', daemon=True)
+            self.__flusher.start()
+
+    def __reset(self):
+        # in a forked child: the buffered records are written by the parent, and the threads are gone
+        self.__lock = threading.Lock()
+        self.__buffer = bytearray()
+        self.__buffered_records = 0
+        if self.__file is not None and self.__path != STDOUT_PATH:
+            try:
+                self.__file.close()
+            except OSError:
+                pass
+        self.__file = None
+        self.__file_size = 0
+        self.__compressors = []
+        if self.__path != STDOUT_PATH and (self.__max_bytes or self.__max_age_sec):
+            # both processes would rename and compress the same files
+            stem, ext = os.path.splitext(self.__path)
+            self.__path = f'{stem}-{os.getpid()}{ext}'
+            self.__segment_seq = 0
+        if not self.__closed:
+            self.__stopped = threading.Event()
+            self.__start_flusher()
+
+    def __run(self, interval_sec: float):
+        while not self.__stopped.wait(interval_sec):
+            try:
+                self.flush()
+            except Exception as ex:
+                logger.error(f'Failed to write lineage to {self.__path}: {ex}')
+
+
+def _write_fully(f: BinaryIO, data: bytearray) -> int:
+    """
+    Writes the data, that is removed from the buffer as it's written, as a raw file can write only a part of it.
+    :return: the number of bytes written
+    """
+    written = 0
+    while data:
+        with memoryview(data) as view:
+            n = f.write(view)
+        if not n:
+            raise OSError(f'Failed to write into {f}')
+        del data[:n]
+        written += n
+    return written
+
+
+def _compress(path: str):
+    try:
+        # the compressed file only gets its final name once complete
+        tmp_path = f'{path}.gz.tmp'
+        with open(path, 'rb') as src, gzip.open(tmp_path, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(tmp_path, f'{path}.gz')
+        os.remove(path)
+    except OSError as ex:
+        logger.error(f'Failed to compress {path}: {ex}')
@@ -0,0 +1,339 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import dataclasses
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Iterable, Optional, Sequence, Union
+from uuid import UUID
+
+from spline_agent.dispatcher import LineageDispatcher, close_at_exit
+from spline_agent.json_serde import to_compact_json_str
+from spline_agent.lineage_file import EVENT_KIND, PLAN_KIND
+from spline_agent.lineage_model import ExecutionEvent, ExecutionPlan
+from spline_agent.metrics import QUEUE_DEPTH, DROPPED
+from spline_agent.object_factory import ObjectFactory
+from spline_agent.source_capture import source_capture, SOURCE_BLOBS_KEY
+
+logger = logging.getLogger(__name__)
+
+# A plan transformation, that returns the (possibly modified) plan, or `None` to drop it along with its events
+PlanStage = Callable[[ExecutionPlan], Optional[ExecutionPlan]]
+
+# How many dropped plan IDs are remembered, to drop their events too
+_MAX_DROPPED_PLAN_IDS = 10_000
+
+
+class DropByUrl:
+    """
+    Drops the plans that write into, or read from, a data source matching any of the given regular expressions,
+    e.g. `^file:///tmp/` or `\\.tmp$`. The patterns are searched for anywhere in the URL.
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self.__pattern = re.compile('|'.join(f'(?:{p})' for p in patterns))
+
+    def __call__(self, plan: ExecutionPlan) -> Optional[ExecutionPlan]:
+        operations = plan.operations
+        urls = [operations.write.outputSource] + [url for read in operations.reads for url in read.inputSources]
+        if any(self.__pattern.search(url) for url in urls):
+            logger.debug(f"Execution plan '{plan.name}' is dropped by the URL filter")
+            return None
+        return plan
+
+
+def without_source_code(plan: ExecutionPlan) -> ExecutionPlan:
+    """
+    Removes the source code text from the plan, i.e. the truncated source code of the operations,
+    and the source code blobs. The source code hashes are kept.
+    The plan ID is kept as is, so the events still refer to it.
+    """
+    other = tuple(
+        dataclasses.replace(op, extra={k: v for k, v in op.extra.items() if k != 'source_code'})
+        if 'source_code' in op.extra else op
+        for op in plan.operations.other)
+    extra_info = {k: v for k, v in plan.extraInfo.items() if k != SOURCE_BLOBS_KEY}
+    return dataclasses.replace(
+        plan,
+        operations=dataclasses.replace(plan.operations, other=other),
+        extraInfo=extra_info)
+
+
+class _Delivery:
+    """
+    Reports the plans delivered (see `LineageDispatcher.reports_delivery`) once all the sinks have sent them
+    """
+
+    def __init__(self, plans: Sequence[ExecutionPlan], sink_count: int):
+        self.__plans = plans
+        self.__remaining = sink_count
+        self.__lock = threading.Lock()
+
+    def sent(self):
+        with self.__lock:
+            self.__remaining -= 1
+            delivered = self.__remaining == 0
+        if delivered:
+            for plan in self.__plans:
+                source_capture.plan_sent(plan)
+
+
+class _Batch:
+    """
+    The records handed over to all the sinks. They're serialized once, by the first sink worker that sends them,
+    so the tracked function doesn't pay for the serialization.
+    """
+
+    def __init__(self, kind: str, records: Sequence[Any], delivery: Optional[_Delivery] = None):
+        self.kind = kind
+        self.records = records
+        self.delivery = delivery
+        self.__records_json: Optional[Sequence[str]] = None
+        self.__lock = threading.Lock()
+
+    @property
+    def records_json(self) -> Sequence[str]:
+        if self.__records_json is None:
+            with self.__lock:
+                if self.__records_json is None:
+                    self.__records_json = [to_compact_json_str(r) for r in self.records]
+        return self.__records_json
+
+
+class _Sink:
+    """
+    A dispatcher with its own bounded queue and worker thread, so a slow or failing dispatcher
+    doesn't hold back the other ones. When the queue is full the batch is dropped.
+    A forked child process starts with an empty queue and its own worker thread.
+    """
+
+    def __init__(self, name: str, dispatcher: LineageDispatcher, queue_size: int):
+        assert queue_size > 0
+        self.name = name
+        self.dispatcher = dispatcher
+        self.__queue_size = queue_size
+        self.__dropped = 0
+        self.__lock = threading.Lock()
+        self.__start()
+        QUEUE_DEPTH.set_function(lambda: self.__queue.qsize(), queue=f'sink_{name}')
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self.__reset)
+
+    @property
+    def dropped(self) -> int:
+        return self.__dropped
+
+    def submit(self, batch: _Batch):
+        try:
+            self.__queue.put_nowait(batch)
+        except queue.Full:
+            dropped = self.__count_dropped(1)
+            logger.warning(f"Lineage sink '{self.name}' queue is full, {len(batch.records)} {batch.kind}(s) dropped "
+                           f"({dropped} batches dropped so far)")
+
+    def flush(self):
+        self.__queue.join()
+
+    def stop(self, deadline: float):
+        """
+        Send the queued lineage and stop the worker thread.
+        What isn't sent by the deadline (see `time.monotonic()`) is dropped, so a stuck sink doesn't hang the exit.
+        """
+        try:
+            self.__queue.put(None, timeout=max(0.0, deadline - time.monotonic()))
+        except queue.Full:
+            pass
+        self.__thread.join(max(0.0, deadline - time.monotonic()))
+        if not self.__thread.is_alive():
+            return
+        left = 0
+        try:
+            while True:
+                if self.__queue.get_nowait() is not None:
+                    left += 1
+                self.__queue.task_done()
+        except queue.Empty:
+            pass
+        # stop the worker, if it ever gets unstuck
+        self.__queue.put_nowait(None)
+        if left:
+            self.__count_dropped(left)
+            logger.warning(f"Lineage sink '{self.name}' didn't send the queued lineage in time, "
+                           f"{left} batches dropped")
+
+    def __count_dropped(self, count: int) -> int:
+        DROPPED.inc(count, queue=f'sink_{self.name}')
+        with self.__lock:
+            self.__dropped += count
+            return self.__dropped
+
+    def __start(self):
+        self.__queue: queue.Queue[Optional[_Batch]] = queue.Queue(maxsize=self.__queue_size)
+        self.__thread = threading.Thread(target=self.__run, name=f'spline-sink-{self.name}', daemon=True)
+        self.__thread.start()
+
+    def __reset(self):
+        # the worker thread doesn't survive the fork, and the inherited queue would never be drained
+        self.__lock = threading.Lock()
+        self.__start()
+
+    def __run(self):
+        while True:
+            batch = self.__queue.get()
+            if batch is None:
+                self.__queue.task_done()
+                return
+            try:
+                self.dispatcher.send_serialized(batch.kind, batch.records, batch.records_json)
+                if batch.delivery is not None:
+                    batch.delivery.sent()
+            except Exception as ex:
+                logger.error(f"Lineage sink '{self.name}' failed to send {batch.kind}(s): {ex}", exc_info=True)
+            finally:
+                self.__queue.task_done()
+
+
+class PipelineLineageDispatcher(LineageDispatcher):
+    """
+    Lineage dispatcher that runs the plans through the filter and transformation stages,
+    and fans the lineage out to multiple sink dispatchers in parallel.
+
+    Every plan and event is serialized once, by the first sink worker thread that sends it,
+    and the same JSON is handed over to all the sinks (see `LineageDispatcher.send_serialized()`).
+    Only the plan stages run on the caller thread, e.g. in the tracked function.
+    Every sink has its own bounded queue and worker thread, so the caller is never blocked by a sink.
+    When a sink can't keep up, its lineage is dropped, and counted
+    in the `spline_dropped_total{queue="sink_<name>"}` metric.
+    On close, the sinks are given `drain_timeout_sec` in total to send the queued lineage, the rest is dropped.
+
+    The sinks are given either as dispatcher instances, or as the names of the dispatchers configured
+    under `spline.lineage_dispatcher.<name>`.
+
+    A plan is only reported delivered, when all the sinks have sent it. So the source code blobs
+    (see `spline_agent.source_capture`) of a plan that is filtered out, dropped or fails to be sent by any sink,
+    are attached to the next plans.
+    """
+
+    reports_delivery = True
+
+    def __init__(self,
+                 sinks: Sequence[Union[str, LineageDispatcher]],
+                 queue_size: int,
+                 drop_urls: Sequence[str],
+                 strip_source_code: bool,
+                 drain_timeout_sec: float,
+                 object_factory: Optional[ObjectFactory] = None,
+                 stages: Sequence[PlanStage] = (),
+                 ):
+        all_stages: list[PlanStage] = []
+        if drop_urls:
+            all_stages.append(DropByUrl(drop_urls))
+        if strip_source_code:
+            all_stages.append(without_source_code)
+        all_stages.extend(stages)
+        self.__stages = all_stages
+
+        self.__sinks = [
+            _Sink(*_named_dispatcher(sink, i, object_factory), queue_size=int(queue_size))
+            for i, sink in enumerate(sinks)]
+        self.__drain_timeout_sec = float(drain_timeout_sec)
+        self.__dropped_plan_ids: OrderedDict[UUID, None] = OrderedDict()
+        self.__lock = threading.Lock()
+
+        logger.info(f"Lineage sinks: {', '.join(s.name for s in self.__sinks)}")
+        close_at_exit(self.close)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self.__reset)
+
+    def send_plan(self, plan: ExecutionPlan):
+        transformed = self.__transform(plan)
+        if transformed is not None:
+            delivery = None
+            if SOURCE_BLOBS_KEY in plan.extraInfo:
+                # the source code blobs keep being attached to the next plans, until this one is sent by all the sinks.
+                # It's the given plan that's delivered, the stages might have removed the blobs from the sent one.
+                delivery = _Delivery([plan], len(self.__sinks))
+            self.__submit(_Batch(PLAN_KIND, [transformed], delivery))
+
+    def send_event(self, event: ExecutionEvent):
+        self.send_events([event])
+
+    def send_events(self, events: Iterable[ExecutionEvent]):
+        with self.__lock:
+            kept = [e for e in events if e.planId not in self.__dropped_plan_ids]
+        if kept:
+            self.__submit(_Batch(EVENT_KIND, kept))
+
+    def flush(self):
+        """
+        Block until the sinks have sent all the queued lineage, and flush the sinks that buffer it
+        """
+        for sink in self.__sinks:
+            sink.flush()
+            sink_flush = getattr(sink.dispatcher, 'flush', None)
+            if callable(sink_flush):
+                sink_flush()
+
+    def close(self):
+        """
+        Send the queued lineage within the drain timeout, stop the worker threads and close the sinks
+        that need closing
+        """
+        sinks, self.__sinks = self.__sinks, []
+        deadline = time.monotonic() + self.__drain_timeout_sec
+        for sink in sinks:
+            sink.stop(deadline)
+            sink_close = getattr(sink.dispatcher, 'close', None)
+            if callable(sink_close):
+                sink_close()
+
+    def __transform(self, plan: ExecutionPlan) -> Optional[ExecutionPlan]:
+        transformed = plan
+        for stage in self.__stages:
+            result = stage(transformed)
+            if result is None:
+                if plan.id is not None:
+                    self.__remember_dropped(plan.id)
+                return None
+            transformed = result
+        return transformed
+
+    def __reset(self):
+        self.__lock = threading.Lock()
+
+    def __remember_dropped(self, plan_id: UUID):
+        with self.__lock:
+            self.__dropped_plan_ids[plan_id] = None
+            while len(self.__dropped_plan_ids) > _MAX_DROPPED_PLAN_IDS:
+                self.__dropped_plan_ids.popitem(last=False)
+
+    def __submit(self, batch: _Batch):
+        for sink in self.__sinks:
+            sink.submit(batch)
+
+
+def _named_dispatcher(
+        sink: Union[str, LineageDispatcher],
+        index: int,
+        object_factory: Optional[ObjectFactory]) -> tuple[str, LineageDispatcher]:
+    if not isinstance(sink, str):
+        return f'{index}_{type(sink).__name__}', sink
+    if object_factory is None:
+        raise ValueError(f"Lineage sink '{sink}' is given by name, but there's no object factory to create it")
+    return sink, object_factory.instantiate_named(LineageDispatcher, sink)
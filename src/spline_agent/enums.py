@@ -24,3 +24,8 @@ class SplineMode(Enum):
     DISABLED = 0  # Fully disabled, the decorator is no-op.
     ENABLED = 1  # Fully enabled
     BYPASS = 2  # The context management is enabled (to avoid None errors in client code), but the side effect is zero.
+
+
+class NestingPolicy(Enum):
+    SEPARATE = 'separate'  # Every tracked call, including the nested ones, reports its own lineage.
+    PIPELINE = 'pipeline'  # The nested tracked calls are the stages of the outermost call, reported as a single plan.
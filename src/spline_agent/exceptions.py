@@ -38,3 +38,12 @@ class ConfigurationError(Exception):
 
     def __init__(self, message: str):
         super().__init__(message)
+
+
+class ReplayError(Exception):
+    """
+    Replaying the lineage files failed, and can be resumed from the last checkpoint
+    """
+
+    def __init__(self, message: str):
+        super().__init__(message)
@@ -12,104 +12,448 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
+import dataclasses
 import inspect
-import platform
+import sys
 import uuid
-from typing import Callable
+from functools import lru_cache
+from typing import Callable, Sequence
 
+from spline_agent import constants
+from spline_agent.batch import EventBatch, ExecutionBatch, LineageBatch
 from spline_agent.commons.utils import current_time
-from spline_agent.constants import AGENT_INFO, EXECUTION_PLAN_NAMESPACE
-from spline_agent.context import LineageTrackingContext, WriteMode
+from spline_agent.context import LineageTrackingContext, TrackedOutput, WriteMode
+from spline_agent.data_volume import volume_totals
+from spline_agent.datasources import DataSource
 from spline_agent.exceptions import LineageTrackingContextIncompleteError
-from spline_agent.json_serde import to_compact_json_str
+from spline_agent.instrumentation import overhead_stats, Phase, PhaseTimer
+from spline_agent.json_serde import PreSerializedMapping, to_compact_json_str
 from spline_agent.lineage_model import *
+from spline_agent.payload_layout import payload_layout
+from spline_agent.process_environment import process_environment
+from spline_agent.source_analysis import callee_finder
+from spline_agent.source_capture import source_capture, SourceBlob, SOURCE_BLOBS_KEY
 
 
 def harvest_lineage(
         ctx: LineageTrackingContext,
         entry_func: Callable,
         duration_ns: Optional[DurationNs],
-        error: Optional[Any]) -> Lineage:
-    if ctx.output is None:
-        raise LineageTrackingContextIncompleteError('output')
-    if ctx.write_mode is None:
-        raise LineageTrackingContextIncompleteError('write_mode')
-    if ctx.system_info is None:
-        raise LineageTrackingContextIncompleteError('system_info')
+        error: Optional[Any],
+        timestamp: Optional[Timestamp] = None,
+        timer: Optional[PhaseTimer] = None,
+        event_extra: Optional[Mapping[str, Any]] = None) -> Lineage:
+    """
+    Build the lineage model of the primary output from the tracking context of a finished execution.
+    See `harvest_lineages()` for all the outputs.
+    :param timestamp: the execution end time. Defaults to the current time.
+    :param timer: measures the HARVEST and PLAN_ID_HASHING phases, if the instrumentation is enabled.
+    :param event_extra: additional execution specific info to put into the event `extra`
+    """
+    return _harvest(ctx, entry_func, duration_ns, error, timestamp, timer, event_extra, primary_only=True)[0]
+
+
+def harvest_lineages(
+        ctx: LineageTrackingContext,
+        entry_func: Callable,
+        duration_ns: Optional[DurationNs],
+        error: Optional[Any],
+        timestamp: Optional[Timestamp] = None,
+        timer: Optional[PhaseTimer] = None,
+        event_extra: Optional[Mapping[str, Any]] = None) -> list[Lineage]:
+    """
+    Build the lineage model of every output from the tracking context of a finished execution,
+    starting with the primary output. An execution plan only has a single write operation, so there's a plan,
+    and an event, per output. The tracked function is only analyzed once for all of them.
+    The parameters are the same as in `harvest_lineage()`.
+    """
+    return _harvest(ctx, entry_func, duration_ns, error, timestamp, timer, event_extra, primary_only=False)
+
+
+def harvest_many(
+        ctx: LineageTrackingContext,
+        entry_func: Callable,
+        executions: ExecutionBatch,
+        event_extra: Optional[Mapping[str, Any]] = None) -> LineageBatch:
+    """
+    Build the lineage model of many executions of the same function, reading from and writing to the same data
+    sources, e.g. the partition tasks of a batch job. The plan is only built once, and the events share its ID
+    and the `extra`, so the per-execution cost is a few array appends.
+    Only the primary output is harvested. The data volume, if counted in the context, is not reported,
+    as it can't be attributed to the executions.
+    :param executions: the executions to harvest, see `ExecutionBatch.append()`
+    :param event_extra: additional info to put into the `extra` of every event
+    """
+    plans, environment = _harvest_plans(ctx, entry_func, ctx.outputs[:1])
+    plan = plans[0]
+    assert plan.id is not None
+
+    errors = {i: payload_layout.event_error(error) for i, error in executions.errors.items()}
+    extra = payload_layout.event_extra(environment, dict(event_extra) if event_extra else {})
+    return LineageBatch(plan, EventBatch(plan.id, executions, errors, extra))
+
+
+def _harvest(
+        ctx: LineageTrackingContext,
+        entry_func: Callable,
+        duration_ns: Optional[DurationNs],
+        error: Optional[Any],
+        timestamp: Optional[Timestamp],
+        timer: Optional[PhaseTimer],
+        event_extra: Optional[Mapping[str, Any]],
+        primary_only: bool) -> list[Lineage]:
+    cur_time = timestamp if timestamp is not None else current_time()
+
+    validate_tracking_context(ctx)
+    outputs = _outputs(ctx)
+    plans, environment = _harvest_plans(ctx, entry_func, outputs[:1] if primary_only else outputs, timer)
+
+    event_error = payload_layout.event_error(error)
+    totals = volume_totals(ctx)
+    stages = _stages(ctx)
+
+    lineages = []
+    for plan in plans:
+        assert plan.id is not None
+
+        event_extra_info: dict[str, Any] = {}
+
+        data_volume = _data_volume(totals, plan.operations.write, plan.operations.reads)
+        if data_volume:
+            event_extra_info['data_volume'] = data_volume
+
+        if stages:
+            event_extra_info['stages'] = stages
+
+        if event_extra:
+            event_extra_info.update(event_extra)
+
+        if timer and overhead_stats.attach_to_event:
+            # the phases measured so far, the dispatching happens after the event is created
+            event_extra_info['agent_overhead_ns'] = dict(timer.timings)
+
+        event = ExecutionEvent(
+            planId=plan.id,
+            timestamp=cur_time,
+            durationNs=duration_ns,
+            error=event_error,
+            extra=payload_layout.event_extra(environment, event_extra_info),
+        )
+        lineages.append(Lineage(plan, event))
+
+    if timer:
+        timer.lap(Phase.HARVEST)
+
+    return lineages
+
+
+def _harvest_plans(
+        ctx: LineageTrackingContext,
+        entry_func: Callable,
+        outputs: Sequence[TrackedOutput],
+        timer: Optional[PhaseTimer] = None) -> tuple[list[ExecutionPlan], PreSerializedMapping]:
+    """
+    Build an execution plan per output, and take the process environment snapshot to report with their events
+    """
+    validate_tracking_context(ctx)
+    assert ctx.system_info is not None
+
+    data_operations, source_blobs = _process_func(ctx, entry_func)
+    stage_operations, stage_blobs = _stage_operations(ctx)
+    source_blobs += stage_blobs
+
+    # the plan ID is calculated from the content of the plan without the ID
+    plan_templates = [
+        ExecutionPlan(
+            id=None,
+            name=ctx.name,
+            operations=_operations(out, out.inputs if out.inputs is not None else ctx.inputs, data_operations)
+            if not stage_operations else
+            _pipeline_operations(ctx, out, out.inputs if out.inputs is not None else ctx.inputs,
+                                 data_operations[0], stage_operations),
+            systemInfo=ctx.system_info,
+            agentInfo=constants.AGENT_INFO,
+            extraInfo={}
+        ) for out in outputs
+    ]
+
+    if timer:
+        timer.lap(Phase.HARVEST)
+
+    plan_ids = [
+        uuid.uuid5(constants.EXECUTION_PLAN_NAMESPACE, to_compact_json_str(plan_template))
+        for plan_template in plan_templates
+    ]
+
+    # Assigned after the ID is calculated, so that the same plan executed in a different environment has the same ID
+    plan_extra_info = payload_layout.plan_extra_info(process_environment)
+    environment = payload_layout.event_environment(process_environment)
+
+    # the source code is referenced by hash from the operations, and is only attached to the first plan
+    unsent_source_blobs = source_capture.unsent_blobs(source_blobs)
+    plans = [
+        dataclasses.replace(
+            plan_template,
+            id=plan_id,
+            extraInfo={**plan_extra_info, SOURCE_BLOBS_KEY: unsent_source_blobs}
+            if unsent_source_blobs and i == 0 else plan_extra_info)
+        for i, (plan_template, plan_id) in enumerate(zip(plan_templates, plan_ids))
+    ]
+
+    if timer:
+        timer.lap(Phase.PLAN_ID_HASHING)
 
-    cur_time = current_time()
+    return plans, environment
 
+
+def _operations(
+        out: TrackedOutput,
+        inputs: Sequence[DataSource],
+        data_operations: tuple[DataOperation, ...]) -> Operations:
     write_operation = WriteOperation(
-        id='op-0',
-        childIds=('op-1',),
+        id=_operation_id(0),
+        childIds=(_operation_id(1),),
         name='Write',  # todo: put something more meaningful here, maybe 'write to {ds.type}' (issue #15)
-        outputSource=ctx.output.url,
-        append=ctx.write_mode == WriteMode.APPEND,
+        outputSource=sys.intern(out.ds.url),
+        append=out.write_mode == WriteMode.APPEND,
     )
 
     read_operations = tuple(
         ReadOperation(
-            id=f'op-{i + 2}',
-            inputSources=(inp.url,),
+            id=_operation_id(i + 2),
+            inputSources=(sys.intern(inp.url),),
             name='Read',  # todo: put something more meaningful here, maybe 'read from {ds.type}' (issue #15)
-        ) for i, inp in zip(range(len(ctx.inputs)), ctx.inputs))
+        ) for i, inp in enumerate(inputs))
 
-    data_operations = _process_func(ctx, entry_func)
+    # the data operation reads from the inputs of this output
+    read_operation_ids = _read_operation_ids(len(inputs))
+    data_operations = tuple(
+        op if op.childIds == read_operation_ids else dataclasses.replace(op, childIds=read_operation_ids)
+        for op in data_operations)
 
-    operations = Operations(
+    return Operations(
         write=write_operation,
         reads=read_operations,
         other=data_operations,
     )
 
-    plan = ExecutionPlan(
-        id=None,  # the value assigned below as it needs to be calculated from the object hash
-        name=ctx.name,
-        operations=operations,
-        systemInfo=ctx.system_info,
-        agentInfo=AGENT_INFO,
-        extraInfo={}
-    )
 
-    plan.id = uuid.uuid5(EXECUTION_PLAN_NAMESPACE, to_compact_json_str(plan))
-
-    event = ExecutionEvent(
-        planId=plan.id,
-        timestamp=cur_time,
-        durationNs=duration_ns,
-        error=error,
-        extra={
-            'python_implementation': platform.python_implementation(),
-            'python_version': platform.python_version(),
-            'platform': platform.platform(),
-            'system': platform.system(),
-            'release': platform.release(),
-            'machine': platform.machine(),
-        }
+def _pipeline_operations(
+        ctx: LineageTrackingContext,
+        out: TrackedOutput,
+        inputs: Sequence[DataSource],
+        root_operation: DataOperation,
+        stage_operations: Sequence[DataOperation]) -> Operations:
+    """
+    The operations of a pipeline, i.e. of the outermost tracked call and of its stages.
+    Every stage, and the outermost call, is a data operation, that is linked to the stage that has last written
+    each of its inputs before, or to the read operation if there's no such stage.
+    The stages not linked that way are linked to the tracked call they were called from.
+    """
+    stages = ctx.stages
+    # the nodes are in the order they have finished, the outermost call is the last one
+    node_op_ids = [op.id for op in stage_operations] + [root_operation.id]
+    node_inputs = [stage.ctx.inputs for stage in stages] + [tuple(inputs)]
+    node_indexes = {id(stage.ctx): k for k, stage in enumerate(stages)}
+    node_indexes[id(ctx)] = len(stages)
+
+    writers: dict[str, list[int]] = {}
+    for k, stage in enumerate(stages):
+        for stage_out in stage.ctx.outputs:
+            writers.setdefault(stage_out.ds.url, []).append(k)
+
+    read_operations: list[ReadOperation] = []
+    read_op_ids: dict[str, OperationId] = {}
+    linked: set[int] = set()
+    node_child_ids: list[list[OperationId]] = []
+    for k, ds_list in enumerate(node_inputs):
+        child_ids = []
+        for ds in ds_list:
+            writer = next((w for w in reversed(writers.get(ds.url, ())) if w < k), None)
+            if writer is not None:
+                linked.add(writer)
+                child_ids.append(node_op_ids[writer])
+                continue
+            read_op_id = read_op_ids.get(ds.url)
+            if read_op_id is None:
+                read_op_id = read_op_ids[ds.url] = _operation_id(len(node_op_ids) + 1 + len(read_operations))
+                read_operations.append(ReadOperation(
+                    id=read_op_id,
+                    inputSources=(sys.intern(ds.url),),
+                    name='Read',
+                ))
+            child_ids.append(read_op_id)
+        node_child_ids.append(child_ids)
+
+    for k, stage in enumerate(stages):
+        if k not in linked:
+            node_child_ids[node_indexes[id(stage.parent)]].append(node_op_ids[k])
+
+    data_operations = [
+        dataclasses.replace(op, childIds=tuple(dict.fromkeys(child_ids)))
+        for op, child_ids in zip([*stage_operations, root_operation], node_child_ids)
+    ]
+
+    return Operations(
+        write=WriteOperation(
+            id=_operation_id(0),
+            childIds=(root_operation.id,),
+            name='Write',
+            outputSource=sys.intern(out.ds.url),
+            append=out.write_mode == WriteMode.APPEND,
+        ),
+        reads=tuple(read_operations),
+        # the outermost call first, as in a plan without stages
+        other=(data_operations[-1], *data_operations[:-1]),
     )
 
-    lineage = Lineage(plan, event)
-    return lineage
 
+def _stage_operations(ctx: LineageTrackingContext) -> tuple[list[DataOperation], tuple[Optional[SourceBlob], ...]]:
+    """
+    The data operations of the pipeline stages, numbered right after the operation of the outermost call.
+    They are linked to the other operations per plan, see `_pipeline_operations()`.
+    """
+    operations = []
+    source_blobs: tuple[Optional[SourceBlob], ...] = ()
+    for i, stage in enumerate(ctx.stages):
+        extra, blobs = _function_extra(stage.ctx, stage.func)
+        extra['outputs'] = [
+            {'url': stage_out.ds.url, 'append': stage_out.write_mode == WriteMode.APPEND}
+            for stage_out in stage.ctx.outputs
+        ]
+        name = stage.ctx.name or stage.func.__name__
+        operations.append(DataOperation(id=_operation_id(i + 2), childIds=(), name=name, extra=extra))
+        source_blobs += blobs
+    return operations, source_blobs
 
-def _process_func(ctx: LineageTrackingContext, func: Callable) -> tuple[DataOperation, ...]:
-    # todo: parse and process the imported modules/functions recursively (issue #4)
-    func_source_code = inspect.getsource(func)
 
-    func_name = func.__name__
-    # noinspection PyUnresolvedReferences
-    module_name = func.__module__
-    file_name = inspect.getfile(func)
+def _stages(ctx: LineageTrackingContext) -> list[dict[str, Any]]:
+    """
+    The execution specific info of the pipeline stages, linked to their operations by ID
+    """
+    return [
+        {
+            'operation_id': _operation_id(i + 2),
+            'name': stage.ctx.name,
+            'duration_ns': stage.duration_ns,
+            'error': payload_layout.event_error(stage.error),
+        } for i, stage in enumerate(ctx.stages)
+    ]
+
+
+def _outputs(ctx: LineageTrackingContext) -> tuple[TrackedOutput, ...]:
+    """
+    The outputs of the tracked call. A pipeline without own outputs outputs what its stages have written,
+    and no later stage has read.
+    """
+    outputs = ctx.outputs
+    if outputs or not ctx.stages:
+        return outputs
+
+    read_later: set[DataSource] = set()
+    final_outputs: dict[DataSource, TrackedOutput] = {}
+    for stage in reversed(ctx.stages):
+        for stage_out in stage.ctx.outputs:
+            if stage_out.ds not in read_later:
+                # in the pipeline plan the stage inputs are linked through the stage
+                final_outputs.setdefault(stage_out.ds, TrackedOutput(stage_out.ds, stage_out.write_mode, ()))
+        read_later.update(stage.ctx.inputs)
+    return tuple(reversed(final_outputs.values()))
+
+
+@lru_cache(maxsize=None)
+def _operation_id(index: int) -> OperationId:
+    """
+    The operation IDs are the same in every plan, so they are shared rather than formatted per plan
+    """
+    return sys.intern(f'op-{index}')
+
+
+@lru_cache(maxsize=None)
+def _read_operation_ids(count: int) -> tuple[OperationId, ...]:
+    return tuple(_operation_id(i + 2) for i in range(count))
+
+
+def validate_tracking_context(ctx: LineageTrackingContext):
+    """
+    Check that the context contains everything needed to harvest the lineage
+    """
+    if ctx.output is None and not _outputs(ctx):
+        raise LineageTrackingContextIncompleteError('output')
+    if ctx.output is not None and ctx.write_mode is None:
+        raise LineageTrackingContextIncompleteError('write_mode')
+    if ctx.system_info is None:
+        raise LineageTrackingContextIncompleteError('system_info')
+
 
+def _data_volume(
+        totals: Mapping[DataSource, Mapping[str, int]],
+        write_operation: WriteOperation,
+        read_operations: tuple[ReadOperation, ...]) -> list[dict[str, Any]]:
+    """
+    Data volume counted per data source, linked to the read and write operations by ID.
+    It's reported in the event rather than in the plan, so that the plan ID doesn't depend on it.
+    """
+    if not totals:
+        return []
+
+    op_ids: dict[str, OperationId] = {op.inputSources[0]: op.id for op in read_operations}
+    op_ids[write_operation.outputSource] = write_operation.id
+    return [
+        {'operation_id': op_ids.get(ds.url), 'url': ds.url, **counts}
+        for ds, counts in totals.items()
+    ]
+
+
+def _process_func(
+        ctx: LineageTrackingContext,
+        func: Callable) -> tuple[tuple[DataOperation, ...], tuple[Optional[SourceBlob], ...]]:
+    extra, source_blobs = _function_extra(ctx, func)
     operation = DataOperation(
-        id='op-1',
-        childIds=tuple(f'op-{i + 2}' for i in range(len(ctx.inputs))),
+        id=_operation_id(1),
+        childIds=_read_operation_ids(len(ctx.inputs)),
         name='Python script',
-        extra={
-            'function_name': func_name,
-            'module_name': module_name,
-            'source_file': file_name,
-            'source_code': func_source_code,
-        }
+        extra=extra,
     )
-    return (operation,)
+    return (operation,), source_blobs
+
+
+def _function_extra(
+        ctx: LineageTrackingContext,
+        func: Callable) -> tuple[dict[str, Any], tuple[Optional[SourceBlob], ...]]:
+    """
+    The info about the tracked function to put into its data operation `extra`, and its source code
+    """
+    source_blob = source_capture.blob(func)
+
+    func_name = func.__name__
+    # noinspection PyUnresolvedReferences
+    module_name = func.__module__
+    file_name = inspect.getfile(inspect.unwrap(func))
+
+    extra = {
+        'function_name': func_name,
+        'module_name': module_name,
+        'source_file': file_name,
+        **source_capture.operation_extra(source_blob),
+    }
+
+    # the user code functions called from the tracked function, transitively
+    callees = callee_finder.find_callees(func)
+    callee_blobs = tuple(source_capture.blob(callee) for callee in callees)
+    if callees:
+        extra['callees'] = [
+            {
+                'function_name': callee.__qualname__,
+                'module_name': callee.__module__,
+                'source_file': inspect.getfile(callee),
+                **source_capture.operation_extra(blob),
+            } for callee, blob in zip(callees, callee_blobs)
+        ]
+
+    # the user code functions the execution actually entered
+    if ctx.recorded_calls is not None:
+        from spline_agent.call_recorder import call_recorder
+        extra['executed_functions'] = call_recorder.function_names(ctx.recorded_calls)
+
+    return extra, (source_blob, *callee_blobs)
@@ -0,0 +1,130 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import time
+from enum import Enum
+from typing import Any, Mapping, Optional
+
+from spline_agent.commons.configuration import Configuration
+from spline_agent.commons.histogram import Histogram
+
+
+class Phase(Enum):
+    """
+    Phases of a tracked call, whose duration is measured by the agent.
+    Note: SERIALIZATION is measured wherever the lineage is converted into JSON,
+    so it overlaps with PLAN_ID_HASHING and DISPATCH.
+    """
+    SPEL_EVALUATION = 'spel_evaluation'
+    CONTEXT_SETUP = 'context_setup'
+    HARVEST = 'harvest'
+    PLAN_ID_HASHING = 'plan_id_hashing'
+    SERIALIZATION = 'serialization'
+    DISPATCH = 'dispatch'
+
+
+class PhaseTimer:
+    """
+    Measures the phases of a single tracked call.
+    Each `lap()` adds the time elapsed since the previous lap (or `restart()`) to the given phase.
+    The timings are recorded into the cumulative histograms on `commit()`.
+    """
+
+    def __init__(self, stats: 'OverheadStats'):
+        self.__stats = stats
+        self.__last = time.perf_counter_ns()
+        self.timings: dict[str, int] = {}
+
+    def restart(self):
+        """
+        Start measuring from now on, e.g. to exclude the time spent in the tracked function itself
+        """
+        self.__last = time.perf_counter_ns()
+
+    def lap(self, phase: Phase):
+        now = time.perf_counter_ns()
+        self.timings[phase.value] = self.timings.get(phase.value, 0) + now - self.__last
+        self.__last = now
+
+    def commit(self):
+        for phase_name, duration_ns in self.timings.items():
+            self.__stats.record(Phase(phase_name), duration_ns)
+
+
+class OverheadStats:
+    """
+    Cumulative histograms of the time the agent spends in each phase of tracked calls.
+    When disabled, the only cost on the hot path is reading the `enabled` attribute.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.attach_to_event = False
+        self.__histograms = {phase: Histogram() for phase in Phase}
+
+    def enable(self, attach_to_event: bool = False):
+        """
+        :param attach_to_event: also put the per-call phase timings into the `ExecutionEvent.extra`
+        """
+        self.attach_to_event = attach_to_event
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+        self.attach_to_event = False
+
+    def configure(self, config: Configuration):
+        if config['spline.instrumentation.enabled']:
+            self.enable(bool(config['spline.instrumentation.attach_to_event']))
+        else:
+            self.disable()
+
+    def start_timer(self) -> Optional[PhaseTimer]:
+        """
+        Returns a new timer, or `None` if the instrumentation is disabled
+        """
+        return PhaseTimer(self) if self.enabled else None
+
+    def record(self, phase: Phase, duration_ns: int):
+        self.__histograms[phase].observe(duration_ns)
+
+    def snapshot(self) -> Mapping[str, Any]:
+        result = {}
+        for phase, histogram in self.__histograms.items():
+            total_sum, count, cumulative_counts = histogram.snapshot()
+            buckets = {str(bound): c for bound, c in zip(histogram.bounds, cumulative_counts)}
+            buckets['+Inf'] = count
+            result[phase.value] = {
+                'count': count,
+                'sum_ns': total_sum,
+                'buckets_ns': buckets,
+            }
+        return result
+
+    def reset(self):
+        for histogram in self.__histograms.values():
+            histogram.reset()
+
+
+overhead_stats = OverheadStats()
+
+
+def stats() -> Mapping[str, Any]:
+    """
+    Returns the cumulative histograms of the agent's own overhead, per phase of a tracked call.
+    Each phase is represented by its observation count, sum of durations in nanoseconds,
+    and the cumulative bucket counts keyed by the bucket upper bound in nanoseconds.
+    The instrumentation is off by default, see `spline.instrumentation.enabled`.
+    """
+    return overhead_stats.snapshot()
@@ -13,28 +13,151 @@
 #  limitations under the License.
 
 import json
+import re
+import time
 import uuid
-from dataclasses import asdict
+from dataclasses import asdict, fields
 from json import JSONEncoder
-from typing import Any
+from typing import Any, Iterator, Mapping, Optional
 
+from spline_agent.instrumentation import overhead_stats, Phase
 from spline_agent.lineage_model import Lineage, ExecutionPlan, ExecutionEvent
 
+# Placeholders for the pre-serialized fragments are made unique per process,
+# so that they can't collide with an arbitrary string value in the document
+_PLACEHOLDER_PREFIX = f'\x00spline-fragment-{uuid.uuid4().hex}-'
+
+# Matches the placeholders in the encoded JSON, capturing the fragment index
+_PLACEHOLDER_PATTERN = re.compile(re.escape(json.dumps(_PLACEHOLDER_PREFIX)[:-1]) + r'(\d+)"')
+
 
 def to_compact_json_str(obj: Any):
-    json_str = json.dumps(obj, cls=LineageEncoder, indent=0)
-    return json_str
+    return _to_json_str(obj, 0)
+
+
+def to_ndjson_str(obj: Any):
+    """
+    Compact JSON on a single line.
+    The line breaks of the compact JSON are all between the tokens, as JSON strings can't contain them unescaped.
+    (The compact JSON itself can't change, as the plan ID is computed from it)
+    """
+    return _to_json_str(obj, 0).replace('\n', '')
 
 
 def to_pretty_json_str(obj: Any):
-    json_str = json.dumps(obj, cls=LineageEncoder, indent=4)
+    return _to_json_str(obj, 4)
+
+
+def _to_json_str(obj: Any, indent: int) -> str:
+    if not overhead_stats.enabled:
+        return _encode(obj, indent)
+
+    start_time = time.perf_counter_ns()
+    json_str = _encode(obj, indent)
+    overhead_stats.record(Phase.SERIALIZATION, time.perf_counter_ns() - start_time)
     return json_str
 
 
+def _encode(obj: Any, indent: int) -> str:
+    # With no indentation the nested JSON fragments don't depend on their position in the document,
+    # so the pre-serialized ones can be spliced in as is
+    encoder = LineageEncoder(indent=indent, splice_fragments=indent == 0)
+    return encoder.splice(encoder.encode(obj))
+
+
+class PreSerializedMapping(Mapping[str, Any]):
+    """
+    An immutable mapping of static values, that is only serialized into JSON once,
+    and then reused by every document that contains it, see `ExtraInfo`.
+    """
+
+    def __init__(self, items: Mapping[str, Any]):
+        self.__items = dict(items)
+        self.__members_json: Optional[str] = None
+
+    def __getitem__(self, key: str) -> Any:
+        return self.__items[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.__items)
+
+    def __len__(self) -> int:
+        return len(self.__items)
+
+    @property
+    def members_json(self) -> str:
+        """
+        Compact JSON of the members, without the enclosing braces
+        """
+        if self.__members_json is None:
+            self.__members_json = _members_json(self.__items)
+        return self.__members_json
+
+
+class ExtraInfo(Mapping[str, Any]):
+    """
+    The `extra` of an execution event: the shared, pre-serialized items followed by the execution specific ones.
+    In the compact JSON only the latter are serialized, and the JSON of the former is copied as is.
+    """
+
+    def __init__(self, shared: PreSerializedMapping, own: Mapping[str, Any]):
+        # on a key clash the own value wins, like in a dictionary update
+        self.__shared = shared if shared.keys().isdisjoint(own) else PreSerializedMapping({**shared, **own})
+        self.__own = own if self.__shared is shared else {}
+
+    def __getitem__(self, key: str) -> Any:
+        return self.__own[key] if key in self.__own else self.__shared[key]
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self.__shared
+        yield from self.__own
+
+    def __len__(self) -> int:
+        return len(self.__shared) + len(self.__own)
+
+    def to_json(self) -> str:
+        members = [m for m in (self.__shared.members_json, _members_json(self.__own)) if m]
+        return '{\n' + ',\n'.join(members) + '\n}' if members else '{}'
+
+
 class LineageEncoder(JSONEncoder):
+    def __init__(self, *args, splice_fragments: bool = False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.__fragments: Optional[list[str]] = [] if splice_fragments else None
+        # the same object, e.g. the `extra` shared by a batch of events, is only serialized once per document.
+        # The objects are referenced until the encoder is gone, so that their IDs can't be reused meanwhile.
+        self.__fragment_indexes: dict[int, tuple[int, ExtraInfo]] = {}
+
     def default(self, o: Any) -> Any:
         if isinstance(o, uuid.UUID):
             return str(o)
-        elif isinstance(o, Lineage) or isinstance(o, ExecutionPlan) or isinstance(o, ExecutionEvent):
+        elif isinstance(o, Lineage) or isinstance(o, ExecutionPlan):
             return asdict(o)
+        elif isinstance(o, ExecutionEvent):
+            # shallow, as `asdict()` would deep copy the `extra`, including the shared items
+            return {f.name: getattr(o, f.name) for f in fields(o)}
+        elif isinstance(o, ExtraInfo):
+            if self.__fragments is None:
+                return dict(o)
+            entry = self.__fragment_indexes.get(id(o))
+            if entry is None:
+                entry = self.__fragment_indexes[id(o)] = (len(self.__fragments), o)
+                self.__fragments.append(o.to_json())
+            return f'{_PLACEHOLDER_PREFIX}{entry[0]}'
+        elif isinstance(o, Mapping):
+            return dict(o)
         return super().default(o)
+
+    def splice(self, json_str: str) -> str:
+        """
+        Replace the placeholders, emitted by this encoder, with the pre-serialized fragments
+        """
+        fragments = self.__fragments
+        if not fragments:
+            return json_str
+        return _PLACEHOLDER_PATTERN.sub(lambda m: fragments[int(m.group(1))], json_str)
+
+
+def _members_json(items: Mapping[str, Any]) -> str:
+    # `indent=0` puts every member on its own line: '{\n"a": 1,\n"b": 2\n}'
+    return to_compact_json_str(items)[2:-2] if items else ''
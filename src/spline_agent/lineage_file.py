@@ -0,0 +1,115 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import gzip
+import json
+import logging
+from typing import Any, BinaryIO, Iterator, NamedTuple
+
+from spline_agent.msgpack_codec import FILE_MAGIC, read_frames, skip_frames
+
+logger = logging.getLogger(__name__)
+
+PLAN_KIND = 'plan'
+EVENT_KIND = 'event'
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+class LineageRecord(NamedTuple):
+    kind: str  # PLAN_KIND or EVENT_KIND
+    data: Any  # the plan or the event, as parsed from JSON
+    line: int  # the number of lines read, including the one of this record
+    offset: int  # the position right after the record line, in the uncompressed file content
+
+
+def envelope_json(kind: str, payload_json: str) -> str:
+    """
+    Wraps the plan or event JSON into a single line lineage file record: `{"kind":"plan","data":{...}}`
+    """
+    return f'{{"kind":"{kind}","data":{payload_json}}}'
+
+
+def read_head(path: str, size: int) -> bytes:
+    """
+    Reads up to the given number of bytes from the beginning of the uncompressed file content
+    """
+    with open(path, 'rb') as raw:
+        compressed = raw.read(2) == GZIP_MAGIC
+        raw.seek(0)
+        f: BinaryIO = gzip.GzipFile(fileobj=raw) if compressed else raw  # type: ignore
+        return f.read(size)
+
+
+def read_records(path: str, line: int = 0, offset: int = 0) -> Iterator[LineageRecord]:
+    """
+    Streams the records of a lineage file, plain or gzip-compressed, one by one.
+    The file is either NDJSON, or binary (see `spline_agent.msgpack_codec`), that is recognized by its header.
+
+    In NDJSON, besides the enveloped records, a line can be a bare plan, event, or a list of events.
+    The lines that are not lineage records are skipped. In a binary file a frame counts as a line.
+
+    The reading can be resumed from the position of a previously read record, given by its `line` and `offset`.
+    An unterminated last line, that is not a valid JSON, is considered being written, and is not read.
+    """
+    with open(path, 'rb') as raw:
+        compressed = raw.read(2) == GZIP_MAGIC
+        raw.seek(0)
+        f: BinaryIO = gzip.GzipFile(fileobj=raw) if compressed else raw  # type: ignore
+        binary = f.read(len(FILE_MAGIC)) == FILE_MAGIC
+        if compressed or not line:
+            f.seek(len(FILE_MAGIC) if binary else 0)
+            offset = f.tell()
+        else:
+            f.seek(offset)
+        # a compressed file can only be read through up to the position
+        skip, line = (line, 0) if compressed else (0, line)
+
+        if binary:
+            offset += skip_frames(f, skip)
+            line += skip
+            for kind, data, size in read_frames(f):
+                line += 1
+                offset += size
+                yield LineageRecord(kind, data, line, offset)
+            return
+
+        for raw_line in f:
+            value = None
+            if line >= skip and raw_line.strip():
+                try:
+                    value = json.loads(raw_line)
+                except ValueError as e:
+                    if not raw_line.endswith(b'\n'):
+                        # the last line is still being written
+                        return
+                    logger.warning(f'{path}:{line + 1}: not a JSON: {e}')
+            line += 1
+            offset += len(raw_line)
+            for kind, data in _classify(value):
+                yield LineageRecord(kind, data, line, offset)
+
+
+def _classify(value: Any) -> list[tuple[str, Any]]:
+    if isinstance(value, list):
+        return [(EVENT_KIND, e) for e in value if isinstance(e, dict)]
+    if not isinstance(value, dict):
+        return []
+    if 'kind' in value and 'data' in value:
+        return [(value['kind'], value['data'])] if value['kind'] in (PLAN_KIND, EVENT_KIND) else []
+    if 'planId' in value:
+        return [(EVENT_KIND, value)]
+    if 'operations' in value:
+        return [(PLAN_KIND, value)]
+    return []
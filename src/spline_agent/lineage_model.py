@@ -12,7 +12,7 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
-from dataclasses import dataclass
+from dataclasses import dataclass, fields
 from typing import Optional, Any, Mapping
 from uuid import UUID
 
@@ -26,14 +26,32 @@ DurationNs = int
 OperationId = str
 
 
-@dataclass
-class NameAndVersion:
+class _Frozen:
+    """
+    Base of the model classes, that are immutable dataclasses with `__slots__` and no per-instance `__dict__`.
+    The slots are declared by hand, as `@dataclass(slots=True)` requires Python 3.10.
+    The frozen instances can't be pickled or copied through `setattr()`, so the state is restored as dataclasses do.
+    """
+    __slots__ = ()
+
+    def __getstate__(self) -> list[Any]:
+        return [getattr(self, f.name) for f in fields(self)]  # type: ignore
+
+    def __setstate__(self, state: list[Any]):
+        for f, value in zip(fields(self), state):  # type: ignore
+            object.__setattr__(self, f.name, value)
+
+
+@dataclass(frozen=True)
+class NameAndVersion(_Frozen):
+    __slots__ = ('name', 'version')
     name: str
     version: str
 
 
-@dataclass
-class WriteOperation:
+@dataclass(frozen=True)
+class WriteOperation(_Frozen):
+    __slots__ = ('id', 'childIds', 'name', 'outputSource', 'append')
     id: OperationId
     childIds: tuple[OperationId, ...]
     name: str
@@ -41,30 +59,34 @@ class WriteOperation:
     append: bool
 
 
-@dataclass
-class ReadOperation:
+@dataclass(frozen=True)
+class ReadOperation(_Frozen):
+    __slots__ = ('id', 'name', 'inputSources')
     id: OperationId
     name: str
     inputSources: tuple[str, ...]
 
 
-@dataclass
-class DataOperation:
+@dataclass(frozen=True)
+class DataOperation(_Frozen):
+    __slots__ = ('id', 'childIds', 'name', 'extra')
     id: OperationId
     childIds: tuple[OperationId, ...]
     name: str
     extra: Mapping[str, Any]
 
 
-@dataclass
-class Operations:
+@dataclass(frozen=True)
+class Operations(_Frozen):
+    __slots__ = ('write', 'reads', 'other')
     write: WriteOperation
     reads: tuple[ReadOperation, ...]
     other: tuple[DataOperation, ...]
 
 
-@dataclass
-class ExecutionPlan:
+@dataclass(frozen=True)
+class ExecutionPlan(_Frozen):
+    __slots__ = ('id', 'name', 'operations', 'agentInfo', 'systemInfo', 'extraInfo')
     id: Optional[UUID]
     name: Optional[str]
     operations: Operations
@@ -73,8 +95,9 @@ class ExecutionPlan:
     extraInfo: Mapping[str, Any]
 
 
-@dataclass
-class ExecutionEvent:
+@dataclass(frozen=True)
+class ExecutionEvent(_Frozen):
+    __slots__ = ('planId', 'timestamp', 'durationNs', 'error', 'extra')
     planId: UUID
     timestamp: Timestamp
     durationNs: Optional[DurationNs]
@@ -82,7 +105,8 @@ class ExecutionEvent:
     extra: Mapping[str, Any]
 
 
-@dataclass
-class Lineage:
+@dataclass(frozen=True)
+class Lineage(_Frozen):
+    __slots__ = ('plan', 'event')
     plan: ExecutionPlan
     event: ExecutionEvent
@@ -0,0 +1,362 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import logging
+import os
+import threading
+from abc import ABC, abstractmethod
+from typing import Callable, Optional, Sequence, TypeVar
+
+from spline_agent.commons.configuration import Configuration
+from spline_agent.commons.histogram import Histogram, Number
+
+logger = logging.getLogger(__name__)
+
+LabelValues = tuple[str, ...]
+
+# Upper bounds of the default latency buckets in seconds: 1ms ... 10s
+DEFAULT_LATENCY_BUCKETS: tuple[float, ...] = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+M = TypeVar('M', bound='Metric')
+
+
+class Metric(ABC):
+    """
+    Base class for the metric types, rendered in the Prometheus text exposition format
+    """
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    @property
+    @abstractmethod
+    def type_name(self) -> str:
+        pass
+
+    @abstractmethod
+    def samples(self) -> list[tuple[str, str, Number]]:
+        """
+        Returns the metric samples as triples: name suffix, rendered labels, value
+        """
+        pass
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {_escape_help(self.help_text)}', f'# TYPE {self.name} {self.type_name}']
+        lines.extend(f'{self.name}{suffix}{labels} {_format_value(value)}' for suffix, labels, value in self.samples())
+        return '\n'.join(lines) + '\n'
+
+    def _label_values(self, labels: dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f'Metric {self.name} expects labels {self.label_names}, but got {tuple(labels)}')
+        return tuple(str(labels[n]) for n in self.label_names)
+
+    def _render_labels(self, values: LabelValues, extra: str = '') -> str:
+        pairs = [f'{n}="{_escape_label_value(v)}"' for n, v in zip(self.label_names, values)]
+        if extra:
+            pairs.append(extra)
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter(Metric):
+    """
+    A monotonically increasing value
+    """
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        super().__init__(name, help_text, label_names)
+        self.__values: dict[LabelValues, Number] = {}
+
+    @property
+    def type_name(self) -> str:
+        return 'counter'
+
+    def inc(self, amount: Number = 1, **labels: str):
+        assert amount >= 0
+        key = self._label_values(labels)
+        with self._lock:
+            self.__values[key] = self.__values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> Number:
+        return self.__values.get(self._label_values(labels), 0)
+
+    def samples(self) -> list[tuple[str, str, Number]]:
+        with self._lock:
+            items = list(self.__values.items())
+        return [('', self._render_labels(k), v) for k, v in items]
+
+
+class Gauge(Metric):
+    """
+    A value that can go up and down. It's either set explicitly, or read from a function on rendering.
+    """
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        super().__init__(name, help_text, label_names)
+        self.__values: dict[LabelValues, Number] = {}
+        self.__functions: dict[LabelValues, Callable[[], Number]] = {}
+
+    @property
+    def type_name(self) -> str:
+        return 'gauge'
+
+    def set(self, value: Number, **labels: str):
+        key = self._label_values(labels)
+        with self._lock:
+            self.__values[key] = value
+
+    def set_function(self, fn: Callable[[], Number], **labels: str):
+        key = self._label_values(labels)
+        with self._lock:
+            self.__functions[key] = fn
+
+    def value(self, **labels: str) -> Optional[Number]:
+        key = self._label_values(labels)
+        fn = self.__functions.get(key)
+        return fn() if fn is not None else self.__values.get(key)
+
+    def samples(self) -> list[tuple[str, str, Number]]:
+        with self._lock:
+            values = dict(self.__values)
+            functions = dict(self.__functions)
+        values.update({k: fn() for k, fn in functions.items()})
+        return [('', self._render_labels(k), v) for k, v in values.items()]
+
+
+class HistogramMetric(Metric):
+    """
+    A distribution of observed values, e.g. latencies, with cumulative buckets
+    """
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = (),
+                 bounds: Sequence[Number] = DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.__bounds = tuple(bounds)
+        self.__histograms: dict[LabelValues, Histogram] = {}
+
+    @property
+    def type_name(self) -> str:
+        return 'histogram'
+
+    def observe(self, value: Number, **labels: str):
+        key = self._label_values(labels)
+        histogram = self.__histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self.__histograms.setdefault(key, Histogram(self.__bounds))
+        histogram.observe(value)
+
+    def count(self, **labels: str) -> int:
+        histogram = self.__histograms.get(self._label_values(labels))
+        return histogram.snapshot()[1] if histogram is not None else 0
+
+    def samples(self) -> list[tuple[str, str, Number]]:
+        with self._lock:
+            items = list(self.__histograms.items())
+        result: list[tuple[str, str, Number]] = []
+        for key, histogram in items:
+            total_sum, count, cumulative_counts = histogram.snapshot()
+            for bound, c in zip(self.__bounds, cumulative_counts):
+                result.append(('_bucket', self._render_labels(key, f'le="{_format_value(bound)}"'), c))
+            result.append(('_bucket', self._render_labels(key, 'le="+Inf"'), count))
+            result.append(('_sum', self._render_labels(key), total_sum))
+            result.append(('_count', self._render_labels(key), count))
+        return result
+
+
+class MetricsRegistry:
+    """
+    A collection of metrics, that can be rendered in the Prometheus text exposition format
+    """
+
+    def __init__(self) -> None:
+        self.__metrics: dict[str, Metric] = {}
+        self.__lock = threading.Lock()
+
+    def counter(self, name: str, help_text: str, label_names: Sequence[str] = ()) -> Counter:
+        return self.__register(Counter(name, help_text, label_names))
+
+    def gauge(self, name: str, help_text: str, label_names: Sequence[str] = ()) -> Gauge:
+        return self.__register(Gauge(name, help_text, label_names))
+
+    def histogram(self, name: str, help_text: str, label_names: Sequence[str] = (),
+                  bounds: Sequence[Number] = DEFAULT_LATENCY_BUCKETS) -> HistogramMetric:
+        return self.__register(HistogramMetric(name, help_text, label_names, bounds))
+
+    def render(self) -> str:
+        with self.__lock:
+            metrics = list(self.__metrics.values())
+        return ''.join(m.render() for m in metrics)
+
+    def __register(self, metric: M) -> M:
+        with self.__lock:
+            if metric.name in self.__metrics:
+                raise ValueError(f'Metric {metric.name} is already registered')
+            self.__metrics[metric.name] = metric
+        return metric
+
+
+class MetricsHttpServer:
+    """
+    A tiny HTTP server exposing the registry on the `/metrics` path, running in a daemon thread
+    """
+
+    def __init__(self, registry: MetricsRegistry, host: str, port: int):
+        # `http.server` pulls in `email`, `socketserver` etc., so it's only imported if the server is enabled
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip('/') != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, fmt, *args):
+                logger.debug(fmt, *args)
+
+        self.__server = ThreadingHTTPServer((host, port), Handler)
+        self.__thread = threading.Thread(target=self.__server.serve_forever, name='spline-metrics-http', daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self.__server.server_address[1]
+
+    def start(self):
+        self.__thread.start()
+        logger.info(f'Serving Spline agent metrics on port {self.port}')
+
+    def stop(self):
+        self.__server.shutdown()
+        self.__server.server_close()
+
+
+class MetricsFileWriter:
+    """
+    Periodically writes the registry into a file, e.g. for the node_exporter textfile collector.
+    The file is replaced atomically, so readers never see a partially written content.
+    """
+
+    def __init__(self, registry: MetricsRegistry, file_path: str, interval_sec: float):
+        assert interval_sec > 0
+        self.__registry = registry
+        self.__file_path = file_path
+        self.__interval_sec = interval_sec
+        self.__stopped = threading.Event()
+        self.__thread = threading.Thread(target=self.__run, name='spline-metrics-file', daemon=True)
+
+    def start(self):
+        self.__thread.start()
+        logger.info(f'Writing Spline agent metrics to {self.__file_path}')
+
+    def stop(self):
+        self.__stopped.set()
+        self.write()
+
+    def write(self):
+        tmp_path = f'{self.__file_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.__registry.render())
+        os.replace(tmp_path, self.__file_path)
+
+    def __run(self):
+        while not self.__stopped.wait(self.__interval_sec):
+            try:
+                self.write()
+            except Exception as ex:
+                logger.error(f'Failed to write metrics to {self.__file_path}: {ex}')
+
+
+def _escape_help(s: str) -> str:
+    return s.replace('\\', r'\\').replace('\n', r'\n')
+
+
+def _escape_label_value(s: str) -> str:
+    return s.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _format_value(value: Number) -> str:
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+metrics_registry = MetricsRegistry()
+
+PLANS_SENT = metrics_registry.counter(
+    'spline_plans_sent_total', 'Execution plans sent', ('dispatcher',))
+EVENTS_SENT = metrics_registry.counter(
+    'spline_events_sent_total', 'Execution events sent', ('dispatcher',))
+PAYLOAD_BYTES = metrics_registry.counter(
+    'spline_payload_bytes_total', 'Serialized lineage payload size, before compression', ('dispatcher', 'kind'))
+SENT_BYTES = metrics_registry.counter(
+    'spline_sent_bytes_total', 'Lineage payload size as sent, after compression', ('dispatcher', 'kind'))
+DISPATCH_DURATION = metrics_registry.histogram(
+    'spline_dispatch_duration_seconds', 'Time spent sending a single plan or event', ('dispatcher', 'kind'))
+DISPATCH_FAILURES = metrics_registry.counter(
+    'spline_dispatch_failures_total', 'Failed dispatches, by HTTP status code', ('dispatcher', 'kind', 'status'))
+QUEUE_DEPTH = metrics_registry.gauge(
+    'spline_queue_depth', 'Items waiting in a lineage queue', ('queue',))
+DROPPED = metrics_registry.counter(
+    'spline_dropped_total', 'Items dropped because a lineage queue was full', ('queue',))
+
+
+def record_dispatch(
+        dispatcher: str, kind: str, payload_size: int, sent_size: int, duration_sec: float, count: int = 1):
+    """
+    Record a successfully dispatched plan or event.
+    :param kind: `plan` or `event`
+    :param count: the number of plans or events sent together
+    """
+    (PLANS_SENT if kind == 'plan' else EVENTS_SENT).inc(count, dispatcher=dispatcher)
+    PAYLOAD_BYTES.inc(payload_size, dispatcher=dispatcher, kind=kind)
+    SENT_BYTES.inc(sent_size, dispatcher=dispatcher, kind=kind)
+    DISPATCH_DURATION.observe(duration_sec, dispatcher=dispatcher, kind=kind)
+
+
+_exporters_lock = threading.Lock()
+_http_server: Optional[MetricsHttpServer] = None
+_unavailable_http_port: Optional[int] = None
+_file_writer: Optional[MetricsFileWriter] = None
+
+
+def configure_metrics(config: Configuration):
+    """
+    Start the metrics HTTP endpoint and/or the file writer, if configured and not started yet.
+    When the HTTP endpoint can't be started, e.g. the port is in use, the agent works on without it.
+    """
+    global _http_server, _unavailable_http_port, _file_writer
+    port: Optional[int] = config.get('spline.metrics.http_port')
+    file_path: Optional[str] = config.get('spline.metrics.file')
+    with _exporters_lock:
+        if port is not None and _http_server is None and int(port) != _unavailable_http_port:
+            try:
+                http_server = MetricsHttpServer(metrics_registry, config['spline.metrics.http_host'], int(port))
+                http_server.start()
+                _http_server = http_server
+            except OSError as ex:
+                _unavailable_http_port = int(port)
+                logger.warning(f'Spline agent metrics endpoint could not be started on port {port}, '
+                               f'the metrics are not served over HTTP: {ex}')
+        if file_path and _file_writer is None:
+            _file_writer = MetricsFileWriter(metrics_registry, file_path,
+                                             float(config['spline.metrics.file_interval_sec']))
+            _file_writer.start()
@@ -0,0 +1,175 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import logging
+import os
+import signal
+import threading
+from typing import Optional, Union
+
+from spline_agent.commons.configuration import Configuration
+from spline_agent.enums import SplineMode
+
+logger = logging.getLogger(__name__)
+
+
+class ModeSwitch:
+    """
+    Process-global runtime override of the Spline mode.
+
+    Every function decorated with `@track_lineage()` in the ENABLED or BYPASS mode reads the `mode` attribute
+    on each call. When it's `None` the mode resolved at decoration time is used,
+    otherwise the override takes precedence.
+    Reading (and assigning) a single attribute is atomic, so no locking is needed on the hot path.
+    """
+
+    def __init__(self) -> None:
+        self.mode: Optional[SplineMode] = None
+        self.__watcher: Optional[ModeWatcher] = None
+        self.__lock = threading.Lock()
+
+    def set_mode(self, mode: Optional[SplineMode]):
+        """
+        Override the Spline mode for all tracked functions.
+        :param mode: the new mode, or `None` to fall back to the mode resolved at decoration time.
+        """
+        if mode is not self.mode:
+            logger.info(f"Spline mode is switched at runtime: {_mode_name(self.mode)} -> {_mode_name(mode)}")
+        self.mode = mode
+
+    def reset_mode(self):
+        """
+        Remove the runtime override
+        """
+        self.set_mode(None)
+
+    def install_signal_handler(self, signum: Union[int, signal.Signals], mode: Optional[SplineMode]):
+        """
+        Switch to the given mode when the process receives the given signal.
+        Must be called from the main thread (a limitation of the `signal` module).
+        :param signum: signal number, e.g. `signal.SIGUSR1`
+        :param mode: the mode to switch to, or `None` to reset the override
+        """
+        signal.signal(signum, lambda _signum, _frame: self.set_mode(mode))
+
+    def watch(self, file_path: Optional[str], env_var: Optional[str], interval_sec: float):
+        """
+        Start (or restart) a background thread that periodically reads the mode override from a file
+        and/or an environment variable. See `ModeWatcher`.
+        """
+        with self.__lock:
+            if self.__watcher is not None:
+                if self.__watcher.is_watching(file_path, env_var, interval_sec):
+                    return
+                self.__watcher.stop()
+            self.__watcher = ModeWatcher(self, file_path, env_var, interval_sec)
+            self.__watcher.start()
+
+    def stop_watching(self):
+        with self.__lock:
+            if self.__watcher is not None:
+                self.__watcher.stop()
+                self.__watcher = None
+
+    def configure(self, config: Configuration):
+        """
+        Start watching the mode override sources, if any is configured
+        """
+        file_path: Optional[str] = config.get('spline.mode_switch.watch_file')
+        env_var: Optional[str] = config.get('spline.mode_switch.watch_env_var')
+        if file_path or env_var:
+            interval_sec = float(config['spline.mode_switch.watch_interval_sec'])
+            self.watch(file_path, env_var, interval_sec)
+
+
+class ModeWatcher:
+    """
+    Polls the given file and/or environment variable and applies its content as the Spline mode override.
+    The value is a mode name (e.g. `DISABLED`). An empty value, or a missing file, removes the override.
+    The file takes precedence over the environment variable.
+    The override is only (re)applied when the watched value changes, so it doesn't clash with the API calls.
+    """
+
+    def __init__(self, switch: ModeSwitch, file_path: Optional[str], env_var: Optional[str], interval_sec: float):
+        assert interval_sec > 0
+        self.__switch = switch
+        self.__file_path = file_path
+        self.__env_var = env_var
+        self.__interval_sec = interval_sec
+        self.__last_value: Optional[str] = None
+        self.__stopped = threading.Event()
+        self.__thread = threading.Thread(target=self.__run, name='spline-mode-watcher', daemon=True)
+
+    def is_watching(self, file_path: Optional[str], env_var: Optional[str], interval_sec: float) -> bool:
+        return (self.__file_path, self.__env_var, self.__interval_sec) == (file_path, env_var, interval_sec)
+
+    def start(self):
+        logger.info(f"Watching Spline mode override: file '{self.__file_path}', env var '{self.__env_var}'")
+        self.poll()
+        self.__thread.start()
+
+    def stop(self):
+        self.__stopped.set()
+
+    def poll(self):
+        value = self.__read_value()
+        if value == self.__last_value:
+            return
+        self.__last_value = value
+        try:
+            self.__switch.set_mode(SplineMode[value.upper()] if value else None)
+        except KeyError:
+            logger.error(f"Invalid Spline mode override '{value}', expected one of {[m.name for m in SplineMode]}")
+
+    def __run(self):
+        while not self.__stopped.wait(self.__interval_sec):
+            try:
+                self.poll()
+            except Exception as ex:
+                logger.error(f'Failed to read Spline mode override: {ex}')
+
+    def __read_value(self) -> Optional[str]:
+        if self.__file_path and os.path.isfile(self.__file_path):
+            with open(self.__file_path) as f:
+                file_value = f.read().strip()
+            if file_value:
+                return file_value
+        if self.__env_var:
+            env_value = os.environ.get(self.__env_var, '').strip()
+            if env_value:
+                return env_value
+        return None
+
+
+def _mode_name(mode: Optional[SplineMode]) -> str:
+    return mode.name if mode is not None else 'none'
+
+
+mode_switch = ModeSwitch()
+
+
+def set_mode(mode: Optional[SplineMode]):
+    """
+    Override the Spline mode at runtime for all functions decorated with `@track_lineage()`.
+    Pass `None` to restore the mode that was resolved when the functions were decorated.
+    Note: functions decorated in the DISABLED mode are left unwrapped, so they can't be switched on at runtime.
+    """
+    mode_switch.set_mode(mode)
+
+
+def get_mode() -> Optional[SplineMode]:
+    """
+    Returns the current runtime Spline mode override, or `None` if it's not set.
+    """
+    return mode_switch.mode
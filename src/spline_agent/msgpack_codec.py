@@ -0,0 +1,319 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""
+MessagePack encoding of the lineage records, and the binary lineage file format.
+
+The records are encoded into the same structure as their JSON, so they convert to the producer API JSON as is.
+The `msgpack` package is used if it's installed, otherwise the built-in pure Python implementation,
+that produces the same bytes.
+
+A binary lineage file is the `FILE_MAGIC` followed by the frames: each one is a 4-byte big-endian payload length,
+and the payload, a MessagePack array of the record kind and data, e.g. `["plan", {...}]`.
+"""
+
+import dataclasses
+import struct
+import uuid
+from typing import Any, BinaryIO, Callable, Iterator, Mapping, Optional
+
+try:
+    import msgpack
+    _NATIVE = True
+except ImportError:
+    _NATIVE = False
+
+FILE_MAGIC = b'SPLINE\x00\x01'
+
+_FRAME_HEADER = struct.Struct('>I')
+
+_PACK_INT8 = struct.Struct('>Bb').pack
+_PACK_INT16 = struct.Struct('>Bh').pack
+_PACK_INT32 = struct.Struct('>Bi').pack
+_PACK_INT64 = struct.Struct('>Bq').pack
+_PACK_UINT8 = struct.Struct('>BB').pack
+_PACK_UINT16 = struct.Struct('>BH').pack
+_PACK_UINT32 = struct.Struct('>BI').pack
+_PACK_UINT64 = struct.Struct('>BQ').pack
+_PACK_FLOAT64 = struct.Struct('>Bd').pack
+
+
+def packb(obj: Any) -> bytes:
+    """
+    Encode the lineage model object, or a JSON compatible value, into MessagePack
+    """
+    if _NATIVE:
+        return msgpack.packb(obj, default=_primitive)
+    buffer = bytearray()
+    _pack(obj, buffer)
+    return bytes(buffer)
+
+
+def unpackb(data: bytes) -> Any:
+    if _NATIVE:
+        return msgpack.unpackb(data, raw=False)
+    value, end = _unpack(memoryview(data), 0)
+    if end != len(data):
+        raise ValueError(f'{len(data) - end} extra bytes after the MessagePack value')
+    return value
+
+
+def encode_frame(kind: str, obj: Any) -> bytes:
+    payload = packb([kind, obj])
+    return _FRAME_HEADER.pack(len(payload)) + payload
+
+
+def read_frames(f: BinaryIO) -> Iterator[tuple[str, Any, int]]:
+    """
+    Reads the frames from the current position, till the end of the file. A truncated last frame is ignored.
+    Yields the kind, the data, and the frame size in bytes.
+    """
+    while True:
+        payload = _read_frame(f)
+        if payload is None:
+            return
+        kind, data = unpackb(payload)
+        yield kind, data, _FRAME_HEADER.size + len(payload)
+
+
+def skip_frames(f: BinaryIO, count: int) -> int:
+    """
+    Skips the given number of frames without decoding them, and returns the number of bytes skipped
+    """
+    skipped = 0
+    for _ in range(count):
+        payload = _read_frame(f)
+        if payload is None:
+            break
+        skipped += _FRAME_HEADER.size + len(payload)
+    return skipped
+
+
+def _read_frame(f: BinaryIO) -> Optional[bytes]:
+    header = f.read(_FRAME_HEADER.size)
+    if len(header) < _FRAME_HEADER.size:
+        return None
+    (size,) = _FRAME_HEADER.unpack(header)
+    payload = f.read(size)
+    return payload if len(payload) == size else None
+
+
+def _primitive(o: Any) -> Any:
+    """
+    Same conversions as `json_serde.LineageEncoder`
+    """
+    if isinstance(o, uuid.UUID):
+        return str(o)
+    if dataclasses.is_dataclass(o) and not isinstance(o, type):
+        return {f.name: getattr(o, f.name) for f in dataclasses.fields(o)}
+    if isinstance(o, Mapping):
+        return dict(o)
+    raise TypeError(f'Object of type {type(o).__name__} is not MessagePack serializable')
+
+
+def _pack(o: Any, buffer: bytearray):
+    packer: Optional[Callable[[Any, bytearray], None]] = _PACKERS.get(type(o))
+    if packer is None:
+        packer = _pack_other
+    packer(o, buffer)
+
+
+def _pack_other(o: Any, buffer: bytearray):
+    # subclasses of the supported types are packed as their base, e.g. a str enum as a str
+    for typ, packer in _PACKERS.items():
+        if isinstance(o, typ):
+            packer(o, buffer)
+            return
+    _pack(_primitive(o), buffer)
+
+
+def _pack_none(_o: None, buffer: bytearray):
+    buffer.append(0xc0)
+
+
+def _pack_bool(o: bool, buffer: bytearray):
+    buffer.append(0xc3 if o else 0xc2)
+
+
+def _pack_int(o: int, buffer: bytearray):
+    if 0 <= o < 0x80:
+        buffer.append(o)
+    elif -0x20 <= o < 0:
+        buffer.append(o & 0xff)
+    elif o >= 0:
+        if o <= 0xff:
+            buffer += _PACK_UINT8(0xcc, o)
+        elif o <= 0xffff:
+            buffer += _PACK_UINT16(0xcd, o)
+        elif o <= 0xffffffff:
+            buffer += _PACK_UINT32(0xce, o)
+        else:
+            buffer += _PACK_UINT64(0xcf, o)
+    elif o >= -0x80:
+        buffer += _PACK_INT8(0xd0, o)
+    elif o >= -0x8000:
+        buffer += _PACK_INT16(0xd1, o)
+    elif o >= -0x80000000:
+        buffer += _PACK_INT32(0xd2, o)
+    else:
+        buffer += _PACK_INT64(0xd3, o)
+
+
+def _pack_float(o: float, buffer: bytearray):
+    buffer += _PACK_FLOAT64(0xcb, o)
+
+
+def _pack_str(o: str, buffer: bytearray):
+    data = o.encode('utf-8')
+    n = len(data)
+    if n < 32:
+        buffer.append(0xa0 | n)
+    elif n <= 0xff:
+        buffer += _PACK_UINT8(0xd9, n)
+    elif n <= 0xffff:
+        buffer += _PACK_UINT16(0xda, n)
+    else:
+        buffer += _PACK_UINT32(0xdb, n)
+    buffer += data
+
+
+def _pack_bytes(o: bytes, buffer: bytearray):
+    n = len(o)
+    if n <= 0xff:
+        buffer += _PACK_UINT8(0xc4, n)
+    elif n <= 0xffff:
+        buffer += _PACK_UINT16(0xc5, n)
+    else:
+        buffer += _PACK_UINT32(0xc6, n)
+    buffer += o
+
+
+def _pack_array(o: Any, buffer: bytearray):
+    n = len(o)
+    if n < 16:
+        buffer.append(0x90 | n)
+    elif n <= 0xffff:
+        buffer += _PACK_UINT16(0xdc, n)
+    else:
+        buffer += _PACK_UINT32(0xdd, n)
+    for item in o:
+        _pack(item, buffer)
+
+
+def _pack_map(o: Mapping, buffer: bytearray):
+    n = len(o)
+    if n < 16:
+        buffer.append(0x80 | n)
+    elif n <= 0xffff:
+        buffer += _PACK_UINT16(0xde, n)
+    else:
+        buffer += _PACK_UINT32(0xdf, n)
+    for key, value in o.items():
+        _pack(key, buffer)
+        _pack(value, buffer)
+
+
+_PACKERS: dict[type, Callable[[Any, bytearray], None]] = {
+    type(None): _pack_none,
+    bool: _pack_bool,
+    int: _pack_int,
+    float: _pack_float,
+    str: _pack_str,
+    bytes: _pack_bytes,
+    list: _pack_array,
+    tuple: _pack_array,
+    dict: _pack_map,
+}
+
+
+def _unpack(data: memoryview, pos: int) -> tuple[Any, int]:
+    b = data[pos]
+    pos += 1
+    if b < 0x80:
+        return b, pos
+    if b >= 0xe0:
+        return b - 0x100, pos
+    if 0xa0 <= b <= 0xbf:
+        return _unpack_str(data, pos, b & 0x1f)
+    if 0x90 <= b <= 0x9f:
+        return _unpack_array(data, pos, b & 0x0f)
+    if 0x80 <= b <= 0x8f:
+        return _unpack_map(data, pos, b & 0x0f)
+    if b == 0xc0:
+        return None, pos
+    if b == 0xc2:
+        return False, pos
+    if b == 0xc3:
+        return True, pos
+    fixed = _FIXED_SIZE_TYPES.get(b)
+    if fixed is not None:
+        (value,) = fixed.unpack_from(data, pos)
+        return value, pos + fixed.size
+    sized = _SIZED_TYPES.get(b)
+    if sized is not None:
+        length_format, unpack_sized = sized
+        (n,) = length_format.unpack_from(data, pos)
+        return unpack_sized(data, pos + length_format.size, n)
+    raise ValueError(f'Unsupported MessagePack type 0x{b:02x} at {pos - 1}')
+
+
+def _unpack_str(data: memoryview, pos: int, n: int) -> tuple[str, int]:
+    return str(data[pos:pos + n], 'utf-8'), pos + n
+
+
+def _unpack_bytes(data: memoryview, pos: int, n: int) -> tuple[bytes, int]:
+    return bytes(data[pos:pos + n]), pos + n
+
+
+def _unpack_array(data: memoryview, pos: int, n: int) -> tuple[list, int]:
+    items = []
+    for _ in range(n):
+        item, pos = _unpack(data, pos)
+        items.append(item)
+    return items, pos
+
+
+def _unpack_map(data: memoryview, pos: int, n: int) -> tuple[dict, int]:
+    items = {}
+    for _ in range(n):
+        key, pos = _unpack(data, pos)
+        items[key], pos = _unpack(data, pos)
+    return items, pos
+
+
+_FIXED_SIZE_TYPES: dict[int, struct.Struct] = {
+    0xca: struct.Struct('>f'),
+    0xcb: struct.Struct('>d'),
+    0xcc: struct.Struct('>B'),
+    0xcd: struct.Struct('>H'),
+    0xce: struct.Struct('>I'),
+    0xcf: struct.Struct('>Q'),
+    0xd0: struct.Struct('>b'),
+    0xd1: struct.Struct('>h'),
+    0xd2: struct.Struct('>i'),
+    0xd3: struct.Struct('>q'),
+}
+
+_SIZED_TYPES: dict[int, tuple[struct.Struct, Callable[[memoryview, int, int], tuple[Any, int]]]] = {
+    0xd9: (struct.Struct('>B'), _unpack_str),
+    0xda: (struct.Struct('>H'), _unpack_str),
+    0xdb: (struct.Struct('>I'), _unpack_str),
+    0xc4: (struct.Struct('>B'), _unpack_bytes),
+    0xc5: (struct.Struct('>H'), _unpack_bytes),
+    0xc6: (struct.Struct('>I'), _unpack_bytes),
+    0xdc: (struct.Struct('>H'), _unpack_array),
+    0xdd: (struct.Struct('>I'), _unpack_array),
+    0xde: (struct.Struct('>H'), _unpack_map),
+    0xdf: (struct.Struct('>I'), _unpack_map),
+}
@@ -28,7 +28,7 @@ import importlib
 import inspect
 import logging
 from enum import Enum
-from typing import Type, TypeVar, cast, Any
+from typing import Any, Optional, Type, TypeVar, cast
 
 from spline_agent.commons.configuration import Configuration
 from spline_agent.commons.utils import camel_to_snake
@@ -43,14 +43,26 @@ class ObjectFactory:
         self.__config = config
 
     def instantiate(self, typ: Type[T]) -> T:
+        """
+        Creates the implementation of the given type, that is selected by `spline.<type_name>.type`
+        """
         # the method shouldn't be called without `typ`. The Optional here is only needed to satisfy mypy.
         assert typ is not None
-        logger.debug(f'instantiating {typ}')
+        object_kind = camel_to_snake(typ.__name__)
+        object_name: str = self.__config[f'spline.{object_kind}.type']
+        return self.instantiate_named(typ, object_name)
+
+    def instantiate_named(self, typ: Type[T], object_name: str) -> T:
+        """
+        Creates the implementation of the given type, that is configured under `spline.<type_name>.<object_name>`.
+        The required constructor parameters are taken from there too, except for the ones of the `ObjectFactory` type,
+        that get this factory, e.g. to create the nested objects.
+        """
+        logger.debug(f'instantiating {typ} {object_name}')
 
         # find the implementation
         object_kind = camel_to_snake(typ.__name__)
         conf_prefix: str = f'spline.{object_kind}'
-        object_name: str = self.__config[f'{conf_prefix}.type']
         full_classname: str = self.__config[f'{conf_prefix}.{object_name}.class_name']
         logger.debug(f'found configured implementation: {full_classname}')
 
@@ -64,7 +76,9 @@ class ObjectFactory:
         kwargs: dict[str, Any] = {}
         constr_sig = inspect.signature(class_)
         for param_name, param_def in constr_sig.parameters.items():
-            if param_def.default == inspect.Parameter.empty:
+            if param_def.annotation in (ObjectFactory, Optional[ObjectFactory]):
+                kwargs[param_name] = self
+            elif param_def.default == inspect.Parameter.empty:
                 conf_value = self.__config[f'{conf_prefix}.{object_name}.{param_name}']
                 type_annotation = param_def.annotation
                 if isinstance(type_annotation, type) and issubclass(type_annotation, Enum):
@@ -0,0 +1,140 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+from enum import Enum
+from types import MappingProxyType
+from typing import Any, Mapping, Optional
+
+from spline_agent.commons.configuration import Configuration
+from spline_agent.json_serde import ExtraInfo, PreSerializedMapping, to_compact_json_str
+from spline_agent.process_environment import ProcessEnvironment
+
+_EMPTY: Mapping[str, Any] = MappingProxyType({})
+
+_TRUNCATION_MARK = '...'
+
+# Lists the `extra` entries that were truncated
+TRUNCATED_FIELDS_KEY = 'truncated_fields'
+
+
+class EnvironmentPlacement(Enum):
+    """
+    Where the process environment facts (see `spline_agent.process_environment`) are reported
+    """
+    EVENT = 'event'  # in the `extra` of every execution event
+    # the host-invariant facts in the `extraInfo` of the execution plan, that is only sent once,
+    # the host specific ones in the `extra` of every execution event
+    PLAN = 'plan'
+
+
+class PayloadLayout:
+    """
+    Decides what goes into the execution plan and the execution event, and keeps the event fields within the limits.
+
+    A string value over its limit is cut. For other values the limit applies to their JSON:
+    a list keeps as many leading items as fit, other values are replaced by their cut JSON string.
+    The names of the truncated `extra` entries are listed in the `extra` under `truncated_fields`.
+    """
+
+    def __init__(self):
+        self.environment_placement = EnvironmentPlacement.PLAN
+        self.error_limit: Optional[int] = None
+        self.extra_limit: Optional[int] = None
+        self.extra_limits: dict[str, int] = {}
+
+    def reset(self):
+        """
+        Restore the defaults: the environment in the plan, and no limits
+        """
+        self.environment_placement = EnvironmentPlacement.PLAN
+        self.error_limit = None
+        self.extra_limit = None
+        self.extra_limits = {}
+
+    def configure(self, config: Configuration):
+        self.environment_placement = EnvironmentPlacement(config['spline.payload.environment'].lower())
+        limits: Mapping[str, Any] = config.get('spline.payload.event_field_limits') or {}
+        limits = {str(k).lower(): v for k, v in limits.items() if v is not None}
+        self.error_limit = limits.pop('error', None)
+        self.extra_limit = limits.pop('extra', None)
+        self.extra_limits = limits
+
+    def plan_extra_info(self, environment: ProcessEnvironment) -> Mapping[str, Any]:
+        """
+        The environment facts to put into the plan `extraInfo`.
+        The server keeps the plan of the first execution only, so only the host-invariant facts can go there.
+        """
+        if self.environment_placement is EnvironmentPlacement.PLAN:
+            return environment.invariant_snapshot()
+        return _EMPTY
+
+    def event_environment(self, environment: ProcessEnvironment) -> PreSerializedMapping:
+        """
+        The environment facts to put into the event `extra`, see `event_extra()`
+        """
+        if self.environment_placement is EnvironmentPlacement.PLAN:
+            return environment.host_snapshot()
+        return environment.snapshot()
+
+    def event_error(self, error: Optional[Any]) -> Optional[Any]:
+        if self.error_limit is None or not isinstance(error, str):
+            return error
+        return _truncate_str(error, self.error_limit)
+
+    def event_extra(self, environment: PreSerializedMapping, own: dict[str, Any]) -> Mapping[str, Any]:
+        if self.extra_limit is not None or self.extra_limits:
+            own = self.__truncate_extra(own)
+        return ExtraInfo(environment, own) if environment else own
+
+    def __truncate_extra(self, extra: dict[str, Any]) -> dict[str, Any]:
+        truncated_fields = []
+        result = {}
+        for key, value in extra.items():
+            limit = self.extra_limits.get(key, self.extra_limit)
+            truncated_value = value if limit is None else _truncate(value, limit)
+            if truncated_value is not value:
+                truncated_fields.append(key)
+            result[key] = truncated_value
+        if truncated_fields:
+            result[TRUNCATED_FIELDS_KEY] = truncated_fields
+        return result
+
+
+def _truncate(value: Any, limit: int) -> Any:
+    if isinstance(value, str):
+        return _truncate_str(value, limit)
+
+    value_json = to_compact_json_str(value)
+    if len(value_json) <= limit:
+        return value
+
+    if isinstance(value, (list, tuple)):
+        # the JSON of a list with indent=0 is '[\n' + ',\n'.join(items) + '\n]'
+        size = 4
+        for n, item in enumerate(value):
+            size += len(to_compact_json_str(item)) + (2 if n else 0)
+            if size > limit:
+                return list(value[:n])
+        return value  # not reached, as the whole list doesn't fit
+
+    return _truncate_str(value_json, limit)
+
+
+def _truncate_str(s: str, limit: int) -> str:
+    if len(s) <= limit:
+        return s
+    return s[:max(limit - len(_TRUNCATION_MARK), 0)] + _TRUNCATION_MARK[:limit]
+
+
+payload_layout = PayloadLayout()
@@ -0,0 +1,151 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import logging
+import os
+import platform
+import re
+import threading
+from typing import Any, Callable, NamedTuple, Optional
+
+from spline_agent.json_serde import PreSerializedMapping
+
+logger = logging.getLogger(__name__)
+
+_CONTAINER_ID_PATTERN = re.compile(r'[0-9a-f]{64}')
+
+
+class _Snapshots(NamedTuple):
+    all: PreSerializedMapping
+    invariant: PreSerializedMapping
+    host: PreSerializedMapping
+
+
+class ProcessEnvironment:
+    """
+    Static facts about the current process, the host and the container it runs in,
+    that are reported with every execution event.
+
+    The facts are collected once per process on the first use, and again in a forked child.
+    The snapshot, and its JSON, is shared by all the events.
+    Additional facts can be added by registering a provider function.
+
+    The facts are either host-invariant, i.e. the same wherever the same code runs (e.g. the Python version),
+    or host specific (e.g. the hostname). Only the former can be reported once per execution plan.
+    """
+
+    def __init__(self):
+        self.__providers: dict[str, tuple[Callable[[], Any], bool]] = {}
+        self.__snapshots: Optional[_Snapshots] = None
+        self.__lock = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self.__reset)
+
+    def register(self, name: str, provider: Callable[[], Any], host_invariant: bool = False):
+        """
+        Add a fact to the snapshot, or replace an existing one.
+        :param name: the key in the event `extra`
+        :param provider: called once per process. If it returns `None` or fails, the fact is omitted.
+        :param host_invariant: the fact doesn't depend on the host or container the process runs on
+        """
+        with self.__lock:
+            self.__providers[name] = (provider, host_invariant)
+            self.__snapshots = None
+
+    def unregister(self, name: str):
+        with self.__lock:
+            self.__providers.pop(name, None)
+            self.__snapshots = None
+
+    def snapshot(self) -> PreSerializedMapping:
+        """
+        All the facts
+        """
+        return self.__get_snapshots().all
+
+    def invariant_snapshot(self) -> PreSerializedMapping:
+        """
+        The host-invariant facts only
+        """
+        return self.__get_snapshots().invariant
+
+    def host_snapshot(self) -> PreSerializedMapping:
+        """
+        The host specific facts only
+        """
+        return self.__get_snapshots().host
+
+    def __get_snapshots(self) -> '_Snapshots':
+        snapshots = self.__snapshots
+        if snapshots is None:
+            with self.__lock:
+                if self.__snapshots is None:
+                    self.__snapshots = self.__collect()
+                snapshots = self.__snapshots
+        return snapshots
+
+    def __collect(self) -> '_Snapshots':
+        facts = {}
+        invariant_names = set()
+        for name, (provider, host_invariant) in self.__providers.items():
+            try:
+                value = provider()
+            except Exception as e:
+                logger.debug(f'Failed to obtain the process environment fact "{name}": {e}')
+                continue
+            if value is not None:
+                facts[name] = value
+                if host_invariant:
+                    invariant_names.add(name)
+        return _Snapshots(
+            PreSerializedMapping(facts),
+            PreSerializedMapping({k: v for k, v in facts.items() if k in invariant_names}),
+            PreSerializedMapping({k: v for k, v in facts.items() if k not in invariant_names}))
+
+    def __reset(self):
+        self.__snapshots = None
+        self.__lock = threading.Lock()
+
+
+def hostname() -> str:
+    import socket  # only needed once the first lineage is harvested
+    return socket.gethostname()
+
+
+def container_id() -> Optional[str]:
+    """
+    Returns the ID of the Docker (or alike) container the process runs in, if it can be determined from procfs
+    """
+    for path in ('/proc/self/cgroup', '/proc/self/mountinfo'):
+        try:
+            with open(path) as f:
+                for line in f:
+                    if 'docker' in line or 'containers' in line or 'kubepods' in line or 'containerd' in line:
+                        match = _CONTAINER_ID_PATTERN.search(line)
+                        if match:
+                            return match.group(0)
+        except OSError:
+            pass
+    return None
+
+
+process_environment = ProcessEnvironment()
+process_environment.register('python_implementation', platform.python_implementation, host_invariant=True)
+process_environment.register('python_version', platform.python_version, host_invariant=True)
+process_environment.register('platform', platform.platform)
+process_environment.register('system', platform.system)
+process_environment.register('release', platform.release)
+process_environment.register('machine', platform.machine)
+process_environment.register('hostname', hostname)
+process_environment.register('container_id', container_id)
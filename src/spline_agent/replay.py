@@ -0,0 +1,336 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Iterable, NamedTuple, Optional
+from urllib.parse import urljoin
+
+import requests
+from http_constants.headers import HttpHeaders
+
+from spline_agent.exceptions import ReplayError
+from spline_agent.lineage_file import PLAN_KIND, read_head, read_records
+
+logger = logging.getLogger(__name__)
+
+# The statuses worth retrying, besides the connection errors
+_RETRYABLE_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+
+_CHECKPOINT_INTERVAL_S = 1.0
+
+# A file is recognized by the hash of that many bytes of its uncompressed content, or less if it's smaller
+_FINGERPRINT_SIZE = 64 * 1024
+
+
+class ReplayStats(NamedTuple):
+    plans_sent: int
+    duplicate_plans: int
+    events_sent: int
+    requests: int
+    retries: int
+    elapsed_s: float
+
+    @property
+    def events_per_s(self) -> float:
+        return self.events_sent / self.elapsed_s if self.elapsed_s else 0.0
+
+
+class Checkpoint:
+    """
+    The replay progress of every file: the number of lines and bytes sent.
+    Saved into a JSON file, that is replaced atomically.
+
+    The files are identified by the fingerprint of their content, i.e. the hash of its beginning,
+    rather than by their paths. So a file that has been renamed or compressed, e.g. rotated, is not replayed again.
+    A file that has grown, e.g. the active file of a dispatcher, is resumed where it was left, if it's at the same
+    path or has the same inode. Another file only starting with the same content is replayed from the beginning.
+    """
+
+    def __init__(self, path: Optional[str]):
+        self.__path = path
+        # keyed by the fingerprint, `<size>:<hash>` of the first `size` bytes of the uncompressed content
+        self.__files: dict[str, dict[str, Any]] = {}
+        # the fingerprints of the files being replayed, keyed by their paths
+        self.__fingerprints: dict[str, str] = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.__files = {
+                    k: v for k, v in json.load(f)['files'].items() if _fingerprint_size(k) is not None}
+
+    def position(self, file_path: str) -> tuple[int, int]:
+        """
+        The line and offset to resume the file from
+        """
+        head = read_head(file_path, _FINGERPRINT_SIZE)
+        if not head:
+            return 0, 0
+        fingerprint = _fingerprint(head)
+        abs_path = os.path.abspath(file_path)
+        inode = os.stat(file_path).st_ino
+        self.__fingerprints[abs_path] = fingerprint
+
+        entry = self.__files.pop(fingerprint, None)
+        if entry is None:
+            entry = self.__pop_grown(head, abs_path, inode)
+        if entry is None:
+            return 0, 0
+        self.__files[fingerprint] = entry
+        return entry['line'], entry['offset']
+
+    def update(self, file_path: str, line: int, offset: int):
+        abs_path = os.path.abspath(file_path)
+        fingerprint = self.__fingerprints.get(abs_path)
+        if fingerprint is not None:
+            self.__files[fingerprint] = {
+                'path': abs_path, 'inode': os.stat(file_path).st_ino, 'line': line, 'offset': offset}
+
+    def __pop_grown(self, head: bytes, abs_path: str, inode: int) -> Optional[dict[str, Any]]:
+        # the file might have been smaller when it was replayed, so look for a fingerprint of its beginning.
+        # Other files might start with the same records too, e.g. the same plan, so it must be the same file.
+        sizes = {_fingerprint_size(k) for k in self.__files}
+        for size in sorted((s for s in sizes if s is not None and s < len(head)), reverse=True):
+            key = _fingerprint(head[:size])
+            entry = self.__files.get(key)
+            if entry is not None and (entry.get('path') == abs_path or entry.get('inode') == inode):
+                return self.__files.pop(key)
+        return None
+
+    def save(self):
+        if not self.__path:
+            return
+        tmp_path = f'{self.__path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'files': self.__files}, f, indent=2)
+        os.replace(tmp_path, self.__path)
+
+
+def _fingerprint(head: bytes) -> str:
+    return f'{len(head)}:{hashlib.sha256(head).hexdigest()}'
+
+
+def _fingerprint_size(fingerprint: str) -> Optional[int]:
+    size, _, digest = fingerprint.partition(':')
+    return int(size) if size.isdigit() and digest else None
+
+
+class RateLimiter:
+    """
+    Spaces out the acquired permits evenly, to keep the rate
+    """
+
+    def __init__(self, rate_per_s: float):
+        self.__interval = 1 / rate_per_s
+        self.__next_time = time.monotonic()
+        self.__lock = threading.Lock()
+
+    def acquire(self, permits: int = 1):
+        with self.__lock:
+            now = time.monotonic()
+            start = max(now, self.__next_time)
+            self.__next_time = start + permits * self.__interval
+        if start > now:
+            time.sleep(start - now)
+
+
+class _Progress:
+    """
+    Tracks the completion of the event batches of a file, that complete out of order,
+    and advances the checkpoint up to the last batch, that all the preceding ones are completed too.
+    """
+
+    def __init__(self, file_path: str, checkpoint: Checkpoint):
+        self.__file_path = file_path
+        self.__checkpoint = checkpoint
+        self.__positions: dict[int, tuple[int, int]] = {}
+        self.__completed: set[int] = set()
+        self.__next_seq = 0
+        self.__committed_seq = 0
+        self.__last_save = time.monotonic()
+        self.__lock = threading.Lock()
+
+    def submit(self, line: int, offset: int) -> int:
+        with self.__lock:
+            seq = self.__next_seq
+            self.__next_seq += 1
+            self.__positions[seq] = (line, offset)
+            return seq
+
+    def complete(self, seq: int):
+        with self.__lock:
+            self.__completed.add(seq)
+            position = None
+            while self.__committed_seq in self.__completed:
+                self.__completed.remove(self.__committed_seq)
+                position = self.__positions.pop(self.__committed_seq)
+                self.__committed_seq += 1
+            if position is not None:
+                self.__checkpoint.update(self.__file_path, *position)
+                if time.monotonic() - self.__last_save >= _CHECKPOINT_INTERVAL_S:
+                    self.__checkpoint.save()
+                    self.__last_save = time.monotonic()
+
+
+class LineageReplayer:
+    """
+    Uploads the lineage files (see `spline_agent.lineage_file`) to a Spline producer.
+
+    The files are streamed, and never loaded into memory whole. Every plan is only sent once, by its ID,
+    synchronously, so it's received before the events referencing it. The events are sent in batches,
+    concurrently over the given number of connections, and at most at the given rate (events per second).
+    A request failing with a connection error or a transient status is retried with an exponential backoff.
+
+    With a checkpoint file, the progress is saved as the batches complete, and the replay is resumed from there.
+    Only the new records are sent when a file is replayed again, e.g. one a dispatcher is still appending to.
+    """
+
+    def __init__(self,
+                 base_url: str,
+                 plans_url: str = 'execution-plans',
+                 events_url: str = 'execution-events',
+                 content_type: str = 'application/json',
+                 batch_size: int = 100,
+                 connections: int = 4,
+                 max_events_per_s: Optional[float] = None,
+                 retries: int = 3,
+                 backoff_s: float = 0.5,
+                 checkpoint_path: Optional[str] = None,
+                 ):
+        base_url_with_slash = f'{base_url}/'
+        self.__plans_url = urljoin(base_url_with_slash, plans_url)
+        self.__events_url = urljoin(base_url_with_slash, events_url)
+        self.__headers = {HttpHeaders.CONTENT_TYPE: content_type}
+        self.__batch_size = batch_size
+        self.__connections = connections
+        self.__rate_limiter = RateLimiter(max_events_per_s) if max_events_per_s else None
+        self.__retries = retries
+        self.__backoff_s = backoff_s
+        self.__checkpoint = Checkpoint(checkpoint_path)
+        self.__sent_plan_ids: set[str] = set()
+        self.__local = threading.local()
+        self.__lock = threading.Lock()
+        self.__counts = {'plans_sent': 0, 'duplicate_plans': 0, 'events_sent': 0, 'requests': 0, 'retries': 0}
+
+    def replay(self, paths: Iterable[str]) -> ReplayStats:
+        """
+        Replays the files one by one. Raises `ReplayError` if any request finally fails.
+        """
+        start_time = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(self.__connections, thread_name_prefix='spline-replay') as executor:
+                for path in paths:
+                    self.__replay_file(path, executor)
+        finally:
+            self.__checkpoint.save()
+        return ReplayStats(**self.__counts, elapsed_s=time.perf_counter() - start_time)
+
+    def __replay_file(self, path: str, executor: ThreadPoolExecutor):
+        line, offset = self.__checkpoint.position(path)
+        logger.info(f'Replaying {path}' + (f' from line {line}' if line else ''))
+
+        progress = _Progress(path, self.__checkpoint)
+        # bounds the number of the batches read ahead, waiting to be sent
+        in_flight = threading.BoundedSemaphore(self.__connections * 2)
+        failed = threading.Event()
+        futures: list[Future] = []
+        batch: list[Any] = []
+
+        def send_batch(events: list[Any], seq: int):
+            try:
+                self.__send_events(events)
+                progress.complete(seq)
+            except BaseException:
+                failed.set()
+                raise
+            finally:
+                in_flight.release()
+
+        def submit_batch():
+            seq = progress.submit(line, offset)
+            events = list(batch)
+            batch.clear()
+            in_flight.acquire()
+            futures.append(executor.submit(send_batch, events, seq))
+
+        for record in read_records(path, line, offset):
+            if failed.is_set():
+                break
+            # a line can contain several events, the batch is only cut on a line boundary to be resumable
+            if len(batch) >= self.__batch_size and record.line != line:
+                submit_batch()
+            if record.kind == PLAN_KIND:
+                self.__send_plan(record.data)
+            else:
+                batch.append(record.data)
+            line, offset = record.line, record.offset
+
+        if not failed.is_set():
+            submit_batch()
+        errors = [e for e in (f.exception() for f in futures) if e is not None]
+        if errors:
+            raise ReplayError(f'Replaying {path} failed: {errors[0]}')
+        self.__checkpoint.update(path, line, offset)
+        logger.info(f'Replayed {path}')
+
+    def __send_plan(self, plan: Any):
+        plan_id = plan.get('id')
+        if plan_id in self.__sent_plan_ids:
+            self.__count('duplicate_plans')
+            return
+        try:
+            self.__post(self.__plans_url, plan)
+        except requests.RequestException as e:
+            raise ReplayError(f'Sending the plan {plan_id} failed: {e}') from e
+        if plan_id:
+            self.__sent_plan_ids.add(plan_id)
+        self.__count('plans_sent')
+
+    def __send_events(self, events: list[Any]):
+        if not events:
+            return
+        if self.__rate_limiter:
+            self.__rate_limiter.acquire(len(events))
+        self.__post(self.__events_url, events)
+        self.__count('events_sent', len(events))
+
+    def __post(self, url: str, payload: Any):
+        session = getattr(self.__local, 'session', None)
+        if session is None:
+            session = self.__local.session = requests.Session()
+        body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        for attempt in range(self.__retries + 1):
+            self.__count('requests')
+            try:
+                res = session.post(url, data=body, headers=self.__headers)
+                if res.status_code not in _RETRYABLE_STATUSES or attempt == self.__retries:
+                    res.raise_for_status()
+                    return
+                logger.debug(f'POST {url} responded {res.status_code}, retrying')
+            except requests.HTTPError:
+                raise
+            except requests.RequestException as e:
+                if attempt == self.__retries:
+                    raise
+                logger.debug(f'POST {url} failed: {e}, retrying')
+            self.__count('retries')
+            time.sleep(self.__backoff_s * 2 ** attempt)
+
+    def __count(self, name: str, n: int = 1):
+        with self.__lock:
+            self.__counts[name] += n
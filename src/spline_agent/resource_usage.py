@@ -0,0 +1,127 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import os
+import sys
+import threading
+import time
+from typing import Any, NamedTuple, Optional
+
+try:
+    import resource
+except ImportError:  # pragma: no cover -- not available on Windows
+    resource = None  # type: ignore
+
+_PROC_IO_PATH = '/proc/self/io'
+
+# `ru_maxrss` is in kilobytes on Linux, but in bytes on macOS
+_MAXRSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+
+class ResourceSnapshot(NamedTuple):
+    """
+    Process resource usage counters at a given moment.
+    The counters are process-wide, so they also include the activity of other threads.
+    The values that are unavailable on the current platform are `None`.
+    """
+    perf_counter_ns: int
+    cpu_user_sec: Optional[float]
+    cpu_system_sec: Optional[float]
+    max_rss_bytes: Optional[int]
+    voluntary_context_switches: Optional[int]
+    involuntary_context_switches: Optional[int]
+    read_chars: Optional[int]
+    write_chars: Optional[int]
+    storage_read_bytes: Optional[int]
+    storage_write_bytes: Optional[int]
+
+
+def take_snapshot() -> ResourceSnapshot:
+    perf_counter_ns = time.perf_counter_ns()
+    if resource is not None:
+        ru = resource.getrusage(resource.RUSAGE_SELF)
+        utime, stime, maxrss, nvcsw, nivcsw = \
+            ru.ru_utime, ru.ru_stime, ru.ru_maxrss * _MAXRSS_UNIT, ru.ru_nvcsw, ru.ru_nivcsw
+    else:
+        utime = stime = maxrss = nvcsw = nivcsw = None
+    io = _proc_io_reader.read()
+    return ResourceSnapshot(
+        perf_counter_ns=perf_counter_ns,
+        cpu_user_sec=utime,
+        cpu_system_sec=stime,
+        max_rss_bytes=maxrss,
+        voluntary_context_switches=nvcsw,
+        involuntary_context_switches=nivcsw,
+        read_chars=io.get('rchar'),
+        write_chars=io.get('wchar'),
+        storage_read_bytes=io.get('read_bytes'),
+        storage_write_bytes=io.get('write_bytes'),
+    )
+
+
+def usage_delta(start: ResourceSnapshot, end: ResourceSnapshot) -> dict[str, Any]:
+    """
+    Returns the resources used between the two snapshots, omitting the unavailable ones.
+    `max_rss_bytes` becomes the growth of the peak resident set size,
+    and `perf_counter_ns` - the monotonic duration in nanoseconds.
+    """
+    return {
+        'duration_perf_ns' if field == 'perf_counter_ns' else field: _diff(s, e)
+        for field, s, e in zip(ResourceSnapshot._fields, start, end)
+        if s is not None and e is not None
+    }
+
+
+def _diff(start, end):
+    diff = end - start
+    return round(diff, 6) if isinstance(diff, float) else diff
+
+
+class _ProcIoReader:
+    """
+    Reads `/proc/self/io` via a file descriptor that is opened once, and re-opened after `fork()`.
+    Reading a procfs file from offset 0 regenerates its content, so no re-opening is needed between the reads.
+    """
+
+    def __init__(self):
+        self.__fd: Optional[int] = None
+        self.__available = os.path.exists(_PROC_IO_PATH)
+        self.__lock = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self.__reset)
+
+    def read(self) -> dict[str, int]:
+        if not self.__available:
+            return {}
+        try:
+            if self.__fd is None:
+                with self.__lock:
+                    if self.__fd is None:
+                        self.__fd = os.open(_PROC_IO_PATH, os.O_RDONLY)
+            content = os.pread(self.__fd, 4096, 0).decode('ascii')
+        except OSError:
+            # e.g. restricted by the container security policy
+            self.__available = False
+            return {}
+        return {k: int(v) for k, _, v in (line.partition(': ') for line in content.splitlines())}
+
+    def __reset(self):
+        # the inherited descriptor still points to the parent process
+        if self.__fd is not None:
+            os.close(self.__fd)
+        self.__fd = None
+        self.__lock = threading.Lock()
+
+
+_proc_io_reader = _ProcIoReader()
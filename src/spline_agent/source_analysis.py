@@ -0,0 +1,226 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import ast
+import inspect
+import logging
+import os
+import threading
+import weakref
+from collections import OrderedDict
+from types import CodeType, ModuleType
+from typing import Any, Callable, NamedTuple, Optional, Sequence, Union
+
+from spline_agent.commons.configuration import Configuration
+
+logger = logging.getLogger(__name__)
+
+FunctionNode = Union[ast.FunctionDef, ast.AsyncFunctionDef]
+
+# A rough estimate of the memory taken by a parsed AST node, used to enforce the cache memory cap
+_AST_NODE_SIZE_ESTIMATE = 150
+
+# The path, modification time and size of a source file
+FileStamp = tuple[str, int, int]
+
+
+class ParsedModule:
+    """
+    A parsed source file and its symbol table: the function definitions keyed by their first line number,
+    i.e. the line of the first decorator if any, matching the `co_firstlineno` of the function code object.
+    """
+
+    __slots__ = ('tree', 'functions', 'size_estimate')
+
+    def __init__(self, source: bytes):
+        self.tree = ast.parse(source)
+        self.functions: dict[int, FunctionNode] = {}
+        node_count = 0
+        for node in ast.walk(self.tree):
+            node_count += 1
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                first_lineno = min([node.lineno] + [d.lineno for d in node.decorator_list])
+                self.functions[first_lineno] = node
+        self.size_estimate = len(source) + node_count * _AST_NODE_SIZE_ESTIMATE
+
+
+class AstCache:
+    """
+    Parses every source file at most once, as long as it's not modified or evicted.
+    The entries are keyed by the file path, modification time and size.
+    The least recently used entries are evicted when the estimated memory taken exceeds the cap.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.parse_count = 0
+        self.__entries: OrderedDict[tuple[str, int, int], ParsedModule] = OrderedDict()
+        self.__size = 0
+        self.__lock = threading.Lock()
+
+    @property
+    def size_estimate(self) -> int:
+        return self.__size
+
+    def get(self, file_path: str) -> Optional[ParsedModule]:
+        key = _file_stamp(file_path)
+        if key is None:
+            return None
+
+        with self.__lock:
+            module = self.__entries.get(key)
+            if module is not None:
+                self.__entries.move_to_end(key)
+                return module
+
+        try:
+            with open(file_path, 'rb') as f:
+                module = ParsedModule(f.read())
+        except (OSError, SyntaxError, ValueError) as e:
+            logger.debug(f'Failed to parse {file_path}: {e}')
+            return None
+
+        with self.__lock:
+            self.parse_count += 1
+            if key not in self.__entries:
+                self.__entries[key] = module
+                self.__size += module.size_estimate
+            while self.__size > self.max_bytes and len(self.__entries) > 1:
+                _, evicted = self.__entries.popitem(last=False)
+                self.__size -= evicted.size_estimate
+        return module
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+            self.__size = 0
+
+
+class _FoundCallees(NamedTuple):
+    max_depth: int
+    packages: tuple[str, ...]
+    sources: tuple[FileStamp, ...]
+    callees: tuple[Callable, ...]
+
+
+class CalleeFinder:
+    """
+    Finds the user code functions called by a given function, and by those functions, up to the max depth.
+    User code is the module of the root function, and the configured packages.
+
+    The calls are found in the function AST, and are resolved by name against the function globals,
+    i.e. `foo()` and `foo.bar()` where `foo` is a global name. Calls of local functions, methods of instances,
+    and the functions that are not plain Python functions, e.g. builtins, are not followed.
+
+    The callees are found once per function code object, until any of the source files they were found in
+    is modified.
+    """
+
+    def __init__(self, ast_cache: AstCache):
+        self.ast_cache = ast_cache
+        self.max_depth = 0
+        self.packages: tuple[str, ...] = ()
+        self.__found: weakref.WeakKeyDictionary[CodeType, _FoundCallees] = weakref.WeakKeyDictionary()
+        self.__lock = threading.Lock()
+
+    def configure(self, config: Configuration):
+        self.max_depth = int(config['spline.source_capture.callees.max_depth'])
+        self.packages = tuple(config.get('spline.source_capture.callees.packages') or ())
+        self.ast_cache.max_bytes = int(config['spline.source_capture.callees.ast_cache_max_bytes'])
+
+    def find_callees(self, func: Callable) -> list[Callable]:
+        """
+        Returns the callees in breadth-first order, each one once, excluding the given function
+        """
+        root = inspect.unwrap(func)
+        if self.max_depth <= 0 or not hasattr(root, '__code__'):
+            return []
+
+        max_depth, packages = self.max_depth, self.packages
+        with self.__lock:
+            found = self.__found.get(root.__code__)
+        if (found is not None and found.max_depth == max_depth and found.packages == packages
+                and all(_file_stamp(stamp[0]) == stamp for stamp in found.sources)):
+            return list(found.callees)
+
+        user_modules = (root.__module__,)
+        visited = {root.__code__}
+        source_files: set[str] = set()
+        callees: list[Callable] = []
+        level = [root]
+        for _ in range(max_depth):
+            next_level = []
+            for caller in level:
+                for callee in self.__direct_callees(caller, source_files):
+                    if callee.__code__ not in visited and _is_user_code(callee, user_modules, packages):
+                        visited.add(callee.__code__)
+                        next_level.append(callee)
+            callees.extend(next_level)
+            level = next_level
+
+        stamps = tuple(stamp for stamp in map(_file_stamp, sorted(source_files)) if stamp is not None)
+        with self.__lock:
+            self.__found[root.__code__] = _FoundCallees(max_depth, packages, stamps, tuple(callees))
+        return callees
+
+    def __direct_callees(self, func: Any, source_files: set[str]) -> list[Any]:
+        node = self.__function_node(func, source_files)
+        if node is None:
+            return []
+        func_globals = func.__globals__
+        callees = []
+        for call in ast.walk(node):
+            if isinstance(call, ast.Call):
+                callee = inspect.unwrap(_resolve(call.func, func_globals))
+                if inspect.isfunction(callee):
+                    callees.append(callee)
+        return callees
+
+    def __function_node(self, func: Any, source_files: set[str]) -> Optional[FunctionNode]:
+        try:
+            file_path = inspect.getsourcefile(func)
+        except TypeError:
+            return None
+        if not file_path:
+            return None
+        source_files.add(file_path)
+        module = self.ast_cache.get(file_path)
+        return module.functions.get(func.__code__.co_firstlineno) if module else None
+
+
+def _file_stamp(file_path: str) -> Optional[FileStamp]:
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        return None
+    return file_path, st.st_mtime_ns, st.st_size
+
+
+def _resolve(expr: ast.expr, func_globals: dict[str, Any]) -> Any:
+    if isinstance(expr, ast.Name):
+        return func_globals.get(expr.id)
+    if isinstance(expr, ast.Attribute):
+        owner = _resolve(expr.value, func_globals)
+        if isinstance(owner, (ModuleType, type)):
+            return getattr(owner, expr.attr, None)
+    return None
+
+
+def _is_user_code(func: Any, user_modules: Sequence[str], packages: Sequence[str]) -> bool:
+    module_name = getattr(func, '__module__', None) or ''
+    return module_name in user_modules or any(
+        module_name == pkg or module_name.startswith(f'{pkg}.') for pkg in packages)
+
+
+callee_finder = CalleeFinder(AstCache())
@@ -0,0 +1,245 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import inspect
+import logging
+import mmap
+import os
+import threading
+import tokenize
+from collections import OrderedDict
+from enum import Enum
+from typing import Any, Callable, Iterable, Optional
+
+from spline_agent.commons.configuration import Configuration
+from spline_agent.lineage_model import ExecutionPlan
+
+logger = logging.getLogger(__name__)
+
+HASH_ALGORITHM = 'sha256'
+
+# The key of the source code blobs in the plan `extraInfo`
+SOURCE_BLOBS_KEY = 'source_blobs'
+
+# Source files larger than that are memory-mapped, and only the lines of the captured function are decoded
+MMAP_THRESHOLD_BYTES = 1024 * 1024
+
+
+class SourceCaptureLevel(Enum):
+    NONE = 'none'  # no source code
+    HASH = 'hash'  # only the source code hash
+    TRUNCATED = 'truncated'  # the hash, and the source code cut to the `max_length`
+    FULL = 'full'  # the hash, and the source code as a blob, that's only sent or stored once
+
+
+class SourceBlob:
+    """
+    Source code of a function, addressed by its content hash
+    """
+
+    __slots__ = ('hash', 'text', 'stored')
+
+    def __init__(self, hash_: str, text: str):
+        self.hash = hash_
+        self.text = text
+        # whether it's been already sent in a plan, or written into the blob directory
+        self.stored = False
+
+
+class SourceCapture:
+    """
+    Captures the source code of the tracked functions.
+
+    The plans only reference the source code by its hash, so the plan ID doesn't require hashing the source again.
+    In the FULL level the source code blob is put into the `extraInfo` of the plans referencing it
+    (under `source_blobs`) until one of them is delivered (see `plan_sent()`),
+    or written into the blob directory if one is configured.
+
+    The blobs are cached in a bounded LRU cache, keyed by the source file path, its modification time and size,
+    and the function location in the file.
+    """
+
+    def __init__(self, cache_size: int = 256):
+        self.level = SourceCaptureLevel.FULL
+        self.max_length = 1000
+        self.blob_dir: Optional[str] = None
+        self.__cache_size = cache_size
+        self.__cache: OrderedDict[tuple, SourceBlob] = OrderedDict()
+        # the blobs attached to the plans, that haven't been delivered yet, keyed by their hashes
+        self.__pending: dict[str, SourceBlob] = {}
+        self.__lock = threading.Lock()
+
+    def configure(self, config: Configuration):
+        self.level = SourceCaptureLevel(config['spline.source_capture.level'].lower())
+        self.max_length = int(config['spline.source_capture.max_length'])
+        self.blob_dir = config.get('spline.source_capture.blob_dir')
+        self.__cache_size = int(config['spline.source_capture.cache_size'])
+
+    def reset(self):
+        with self.__lock:
+            self.__cache.clear()
+            self.__pending.clear()
+
+    def operation_extra(self, blob: Optional[SourceBlob]) -> dict[str, Any]:
+        """
+        Returns the source code info to put into the operation `extra`
+        """
+        if blob is None or self.level is SourceCaptureLevel.NONE:
+            return {}
+        if self.level is SourceCaptureLevel.TRUNCATED:
+            return {'source_hash': blob.hash, 'source_code': blob.text[:self.max_length]}
+        return {'source_hash': blob.hash}
+
+    def unsent_blobs(self, blobs: Iterable[Optional[SourceBlob]]) -> dict[str, str]:
+        """
+        In the FULL level, returns the given blobs, that haven't been sent yet, keyed by their hashes,
+        to be attached to the plan. They keep being returned until a plan with them is sent, see `plan_sent()`.
+        If the blob directory is configured, the blobs are written there instead, and nothing is returned.
+        """
+        if self.level is not SourceCaptureLevel.FULL:
+            return {}
+        blob_dir = self.blob_dir
+        with self.__lock:
+            unsent_blobs = [b for b in blobs if b is not None and not b.stored]
+            for blob in unsent_blobs:
+                if blob_dir:
+                    blob.stored = True
+                else:
+                    self.__pending[blob.hash] = blob
+        if blob_dir:
+            for blob in unsent_blobs:
+                _write_blob(blob_dir, blob)
+            return {}
+        return {blob.hash: blob.text for blob in unsent_blobs}
+
+    def plan_sent(self, plan: ExecutionPlan):
+        """
+        Marks the source code blobs attached to the plan as sent, so that they are not attached to the next plans.
+        To be called once the plan is delivered, see `LineageDispatcher.reports_delivery`.
+        """
+        blobs = plan.extraInfo.get(SOURCE_BLOBS_KEY)
+        if not blobs:
+            return
+        with self.__lock:
+            for blob_hash in blobs:
+                blob = self.__pending.pop(blob_hash, None)
+                if blob is not None:
+                    blob.stored = True
+
+    def blob(self, func: Callable) -> Optional[SourceBlob]:
+        """
+        Returns the source code of the given function, or `None` if it's not available or not captured
+        """
+        if self.level is SourceCaptureLevel.NONE:
+            return None
+        func = inspect.unwrap(func)
+        code = getattr(func, '__code__', None)
+        try:
+            file_path = inspect.getsourcefile(func)
+            if code is None or file_path is None:
+                raise OSError('source file not found')
+            st = os.stat(file_path)
+        except (OSError, TypeError) as e:
+            logger.debug(f'Source code of {func} is not available: {e}')
+            return None
+
+        key = (file_path, st.st_mtime_ns, st.st_size, code.co_firstlineno, func.__qualname__)
+        with self.__lock:
+            blob = self.__cache.get(key)
+            if blob is not None:
+                self.__cache.move_to_end(key)
+                return blob
+
+        try:
+            if st.st_size > MMAP_THRESHOLD_BYTES:
+                text, digest = _read_block_mmap(file_path, code.co_firstlineno)
+            else:
+                text = inspect.getsource(func)
+                digest = _hash_chunks([text.encode('utf-8')])
+        except (OSError, SyntaxError, tokenize.TokenError) as e:
+            logger.debug(f'Failed to read source code of {func}: {e}')
+            return None
+
+        blob = SourceBlob(f'{HASH_ALGORITHM}:{digest}', text)
+        with self.__lock:
+            # another thread might have cached the same source meanwhile, keep the one that might be marked stored
+            blob = self.__cache.setdefault(key, blob)
+            self.__cache.move_to_end(key)
+            while len(self.__cache) > self.__cache_size:
+                self.__cache.popitem(last=False)
+        return blob
+
+
+def _hash_chunks(chunks: Iterable[bytes]) -> str:
+    import hashlib  # loads OpenSSL, only needed once the source code is captured
+    h = hashlib.new(HASH_ALGORITHM)
+    for chunk in chunks:
+        h.update(chunk)
+    return h.hexdigest()
+
+
+def _read_block_mmap(file_path: str, first_lineno: int) -> tuple[str, str]:
+    """
+    Reads the code block (e.g. a function with its decorators) starting on the given line,
+    without reading the whole file into memory.
+    Same as `inspect.getblock()`, it relies on the tokenizer to find the block end.
+    """
+    with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        encoding, _ = tokenize.detect_encoding(mm.readline)
+        pos = 0
+        for _ in range(first_lineno - 1):
+            pos = mm.find(b'\n', pos) + 1
+            if pos == 0:
+                raise OSError(f'line {first_lineno} is out of range in {file_path}')
+        mm.seek(pos)
+
+        lines: list[bytes] = []
+
+        def readline() -> str:
+            line = mm.readline()
+            lines.append(line)
+            return line.decode(encoding)
+
+        block_finder = inspect.BlockFinder()
+        try:
+            for token in tokenize.generate_tokens(readline):
+                block_finder.tokeneater(*token)
+        except (inspect.EndOfBlock, IndentationError):
+            pass
+
+    block_lines = lines[:block_finder.last]
+    text = b''.join(block_lines).decode(encoding)
+    if encoding != 'utf-8':
+        # the hash is always calculated from the UTF-8 representation
+        block_lines = [line.decode(encoding).encode('utf-8') for line in block_lines]
+    return text, _hash_chunks(block_lines)
+
+
+def _write_blob(blob_dir: str, blob: SourceBlob):
+    algorithm, _, digest = blob.hash.partition(':')
+    blob_path = os.path.join(blob_dir, algorithm, digest[:2], digest)
+    if os.path.exists(blob_path):
+        return
+    try:
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        tmp_path = f'{blob_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(blob.text)
+        os.replace(tmp_path, blob_path)
+    except OSError as e:
+        blob.stored = False
+        logger.warning(f'Failed to store source code blob {blob_path}: {e}')
+
+
+source_capture = SourceCapture()
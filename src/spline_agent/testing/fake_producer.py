@@ -0,0 +1,289 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import json
+import logging
+import random
+import socket
+import struct
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+PLANS_PATH = 'execution-plans'
+EVENTS_PATH = 'execution-events'
+
+_READ_CHUNK_SIZE = 4096
+
+
+@dataclass
+class ProducerBehavior:
+    """
+    How the fake producer responds. The rates are probabilities between 0 and 1, decided per request.
+    """
+    latency_s: float = 0.0  # delay before responding
+    latency_jitter_s: float = 0.0  # random extra delay, up to this value
+    error_rate: float = 0.0  # respond with the `error_status`
+    error_status: int = 503
+    reset_rate: float = 0.0  # reset the connection instead of responding
+    read_bytes_per_s: Optional[float] = None  # throttle reading the request body, i.e. a slow reader
+    success_status: int = 201
+
+
+class RecordedRequest(NamedTuple):
+    kind: Optional[str]  # 'plan', 'event', or `None` for an unknown path
+    path: str
+    headers: dict[str, str]
+    body: bytes
+    status: Optional[int]  # `None` if the connection was reset
+
+    def json(self) -> Any:
+        return json.loads(self.body)
+
+
+class ProducerStats(NamedTuple):
+    requests: int
+    plans: int
+    events: int
+    errors: int
+    resets: int
+    bytes_received: int
+    elapsed_s: float
+
+    @property
+    def requests_per_s(self) -> float:
+        return self.requests / self.elapsed_s if self.elapsed_s else 0.0
+
+    @property
+    def events_per_s(self) -> float:
+        return self.events / self.elapsed_s if self.elapsed_s else 0.0
+
+
+class FakeSplineProducer:
+    """
+    A stand-in for the Spline producer REST API, for tests and load testing of the HTTP dispatcher.
+    It accepts `POST <url>/execution-plans` and `POST <url>/execution-events`, misbehaves as configured
+    by the `behavior`, that can be changed at any time, records the requests, and counts the throughput.
+
+    Only the last `record_limit` requests are kept, so it can run for a long time under load.
+
+        with FakeSplineProducer(ProducerBehavior(error_rate=0.1)) as producer:
+            dispatcher = HttpLineageDispatcher(producer.url, PLANS_PATH, EVENTS_PATH, 'application/json')
+            ...
+            producer.stats()
+    """
+
+    def __init__(self,
+                 behavior: Optional[ProducerBehavior] = None,
+                 host: str = '127.0.0.1',
+                 port: int = 0,
+                 record_limit: int = 10_000,
+                 seed: Optional[int] = None,
+                 ):
+        self.behavior = behavior or ProducerBehavior()
+        self.__host = host
+        self.__port = port
+        self.__recorded: deque[RecordedRequest] = deque(maxlen=record_limit)
+        self.__random = random.Random(seed)
+        self.__lock = threading.Lock()
+        self.__server: Optional[ThreadingHTTPServer] = None
+        self.__thread: Optional[threading.Thread] = None
+        self.__counts = _Counts()
+        self.__start_time = time.perf_counter()
+
+    @property
+    def url(self) -> str:
+        """
+        The producer API base URL, e.g. `http://127.0.0.1:12345/producer`
+        """
+        assert self.__server is not None, 'The fake producer is not started'
+        return f'http://{self.__host}:{self.__server.server_port}/producer'
+
+    def start(self) -> 'FakeSplineProducer':
+        server = ThreadingHTTPServer((self.__host, self.__port), _handler_class(self))
+        server.daemon_threads = True
+        self.__server = server
+        self.__thread = threading.Thread(target=server.serve_forever, name='fake-spline-producer', daemon=True)
+        self.__thread.start()
+        self.reset()
+        logger.info(f'Fake Spline producer is listening on {self.url}')
+        return self
+
+    def stop(self):
+        if self.__server is not None:
+            self.__server.shutdown()
+            self.__server.server_close()
+            self.__server = None
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+    def __enter__(self) -> 'FakeSplineProducer':
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @property
+    def requests(self) -> list[RecordedRequest]:
+        with self.__lock:
+            return list(self.__recorded)
+
+    def plans(self) -> list[Any]:
+        """
+        The successfully received execution plans, parsed
+        """
+        return [r.json() for r in self.requests if r.kind == 'plan' and r.status == self.behavior.success_status]
+
+    def events(self) -> list[Any]:
+        """
+        The successfully received execution events, parsed. (Every request body is a list of events)
+        """
+        return [e for r in self.requests if r.kind == 'event' and r.status == self.behavior.success_status
+                for e in r.json()]
+
+    def stats(self) -> ProducerStats:
+        with self.__lock:
+            c = self.__counts
+            return ProducerStats(
+                c.requests, c.plans, c.events, c.errors, c.resets, c.bytes_received,
+                time.perf_counter() - self.__start_time)
+
+    def reset(self):
+        """
+        Forget the recorded requests, and restart the counters
+        """
+        with self.__lock:
+            self.__recorded.clear()
+            self.__counts = _Counts()
+            self.__start_time = time.perf_counter()
+
+    def _decide(self, behavior: ProducerBehavior) -> tuple[float, bool, bool]:
+        with self.__lock:
+            rnd = self.__random
+            delay = behavior.latency_s + (rnd.uniform(0, behavior.latency_jitter_s) if behavior.latency_jitter_s else 0)
+            reset = rnd.random() < behavior.reset_rate
+            error = not reset and rnd.random() < behavior.error_rate
+        return delay, reset, error
+
+    def _record(self, request: RecordedRequest, event_count: int):
+        with self.__lock:
+            self.__recorded.append(request)
+            c = self.__counts
+            c.requests += 1
+            c.bytes_received += len(request.body)
+            if request.status is None:
+                c.resets += 1
+            elif request.status >= 400:
+                c.errors += 1
+            elif request.kind == 'plan':
+                c.plans += 1
+            elif request.kind == 'event':
+                c.events += event_count
+
+
+class _Counts:
+    __slots__ = ('requests', 'plans', 'events', 'errors', 'resets', 'bytes_received')
+
+    def __init__(self):
+        self.requests = 0
+        self.plans = 0
+        self.events = 0
+        self.errors = 0
+        self.resets = 0
+        self.bytes_received = 0
+
+
+def _handler_class(producer: FakeSplineProducer) -> type[BaseHTTPRequestHandler]:
+    class FakeProducerHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            behavior = producer.behavior
+            body = self.__read_body(behavior.read_bytes_per_s)
+            kind = _request_kind(self.path)
+            delay, reset, error = producer._decide(behavior)
+            if delay:
+                time.sleep(delay)
+
+            if kind is None:
+                status: Optional[int] = 404
+            elif reset:
+                status = None
+            elif error:
+                status = behavior.error_status
+            else:
+                status = behavior.success_status
+
+            payload: Any = None
+            if status == behavior.success_status:
+                try:
+                    payload = json.loads(body)
+                except ValueError:
+                    status = 400
+            event_count = len(payload) if kind == 'event' and isinstance(payload, list) else 0
+            producer._record(RecordedRequest(kind, self.path, dict(self.headers), body, status), event_count)
+
+            if status is None:
+                self.__reset_connection()
+            else:
+                # the real producer responds with the ID of the received plan
+                plan_id = payload.get('id') if kind == 'plan' and isinstance(payload, dict) else None
+                self.__respond(status, json.dumps(plan_id).encode() if plan_id else b'')
+
+        def __read_body(self, bytes_per_s: Optional[float]) -> bytes:
+            remaining = int(self.headers.get('Content-Length') or 0)
+            if not bytes_per_s:
+                return self.rfile.read(remaining)
+            chunks = []
+            while remaining > 0:
+                chunk = self.rfile.read(min(remaining, _READ_CHUNK_SIZE))
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                remaining -= len(chunk)
+                time.sleep(len(chunk) / bytes_per_s)
+            return b''.join(chunks)
+
+        def __respond(self, status: int, payload: bytes):
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def __reset_connection(self):
+            # closing a socket with a zero linger timeout sends RST, instead of the normal FIN
+            self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+            self.connection.close()
+            self.close_connection = True
+
+        def log_message(self, format, *args):
+            logger.debug(format, *args)
+
+    return FakeProducerHandler
+
+
+def _request_kind(path: str) -> Optional[str]:
+    path = path.split('?', 1)[0].rstrip('/')
+    if path.endswith(f'/{PLANS_PATH}'):
+        return 'plan'
+    if path.endswith(f'/{EVENTS_PATH}'):
+        return 'event'
+    return None
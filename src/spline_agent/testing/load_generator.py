@@ -0,0 +1,171 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+"""
+Drives tracked functions dispatching to a Spline producer from many threads and processes,
+and reports the throughput and the call latency distribution.
+
+    python -m spline_agent.testing.load_generator --threads 8 --processes 2 --calls 500 --error-rate 0.01
+
+Without `--url` a fake producer is started in this process, with the given misbehavior.
+"""
+
+import argparse
+import logging
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple, Optional, Sequence
+
+import spline_agent
+from spline_agent.dispatchers.http_dispatcher import HttpLineageDispatcher
+from spline_agent.enums import SplineMode, WriteMode
+from spline_agent.lineage_model import NameAndVersion
+from spline_agent.testing.fake_producer import EVENTS_PATH, PLANS_PATH, FakeSplineProducer, ProducerBehavior
+
+logger = logging.getLogger(__name__)
+
+
+class LoadReport(NamedTuple):
+    calls: int
+    errors: int
+    elapsed_s: float
+    latencies_ns: tuple[int, ...]  # of every call, sorted
+
+    @property
+    def calls_per_s(self) -> float:
+        return self.calls / self.elapsed_s if self.elapsed_s else 0.0
+
+    def percentile(self, q: float) -> int:
+        """
+        The call latency (in nanoseconds) at the given percentile, e.g. `99` or `99.9`
+        """
+        if not self.latencies_ns:
+            return 0
+        index = min(len(self.latencies_ns) - 1, int(len(self.latencies_ns) * q / 100))
+        return self.latencies_ns[index]
+
+
+def generate_load(
+        url: str,
+        threads: int = 4,
+        processes: int = 1,
+        calls: int = 100,
+        input_count: int = 1,
+) -> LoadReport:
+    """
+    Calls a tracked function, that dispatches its lineage to the producer at the given URL over HTTP,
+    `calls` times in each of the `threads` threads in each of the `processes` processes.
+    A call that raises, e.g. as the dispatch failed, is counted as an error.
+    """
+    start_time = time.perf_counter()
+    if processes <= 1:
+        results = [_run_threads(url, threads, calls, input_count)]
+    else:
+        with ProcessPoolExecutor(processes) as executor:
+            futures = [executor.submit(_run_threads, url, threads, calls, input_count) for _ in range(processes)]
+            results = [f.result() for f in futures]
+    elapsed_s = time.perf_counter() - start_time
+
+    latencies = sorted(latency for process_latencies, _ in results for latency in process_latencies)
+    errors = sum(process_errors for _, process_errors in results)
+    return LoadReport(len(latencies), errors, elapsed_s, tuple(latencies))
+
+
+def _run_threads(url: str, threads: int, calls: int, input_count: int) -> tuple[list[int], int]:
+    dispatcher = HttpLineageDispatcher(url, PLANS_PATH, EVENTS_PATH, 'application/json')
+
+    @spline_agent.track_lineage(
+        name='load-test', mode=SplineMode.ENABLED, dispatcher=dispatcher,
+        system_info=NameAndVersion(name='load-generator', version='1.0'))
+    @spline_agent.inputs(*(f'file:///load-test/input-{i}.csv' for i in range(input_count)))
+    @spline_agent.output('file:///load-test/output-{thread_id}.csv', WriteMode.APPEND)
+    def tracked_function(thread_id: int):
+        pass
+
+    latencies: list[int] = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def worker(thread_id: int):
+        thread_latencies = []
+        thread_errors = 0
+        for _ in range(calls):
+            start = time.perf_counter_ns()
+            try:
+                tracked_function(thread_id)
+            except Exception as e:
+                logger.debug(f'Tracked call failed: {e}')
+                thread_errors += 1
+            thread_latencies.append(time.perf_counter_ns() - start)
+        with lock:
+            latencies.extend(thread_latencies)
+            errors[0] += thread_errors
+
+    workers = [threading.Thread(target=worker, args=(i,), name=f'load-{i}') for i in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return latencies, errors[0]
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='Spline producer API URL (default: start a fake producer)')
+    parser.add_argument('--threads', type=int, default=4, help='threads per process')
+    parser.add_argument('--processes', type=int, default=1)
+    parser.add_argument('--calls', type=int, default=100, help='tracked function calls per thread')
+    parser.add_argument('--inputs', type=int, default=1, help='inputs of the tracked function')
+    fake = parser.add_argument_group('fake producer')
+    fake.add_argument('--latency', type=float, default=0.0, help='response delay in seconds')
+    fake.add_argument('--jitter', type=float, default=0.0, help='random extra response delay in seconds')
+    fake.add_argument('--error-rate', type=float, default=0.0)
+    fake.add_argument('--error-status', type=int, default=503)
+    fake.add_argument('--reset-rate', type=float, default=0.0)
+    fake.add_argument('--read-rate', type=float, help='request body read throttle in bytes per second')
+    args = parser.parse_args(argv)
+
+    # the agent logs every dispatch
+    logging.basicConfig(level=logging.WARNING)
+
+    producer: Optional[FakeSplineProducer] = None
+    url = args.url
+    if url is None:
+        behavior = ProducerBehavior(
+            latency_s=args.latency, latency_jitter_s=args.jitter, error_rate=args.error_rate,
+            error_status=args.error_status, reset_rate=args.reset_rate, read_bytes_per_s=args.read_rate)
+        producer = FakeSplineProducer(behavior).start()
+        url = producer.url
+    try:
+        report = generate_load(url, args.threads, args.processes, args.calls, args.inputs)
+    finally:
+        if producer is not None:
+            producer.stop()
+
+    print(f'calls:       {report.calls} ({report.errors} failed) in {report.elapsed_s:.2f} s')
+    print(f'throughput:  {report.calls_per_s:.1f} calls/s')
+    for q in (50, 90, 99, 99.9):
+        print(f'{f"p{q}:":<13}{report.percentile(q) / 1e6:.2f} ms')
+    print(f'max:         {report.percentile(100) / 1e6:.2f} ms')
+    if producer is not None:
+        stats = producer.stats()
+        print(f'producer:    {stats.plans} plans, {stats.events} events, {stats.errors} errors, {stats.resets} resets, '
+              f'{stats.bytes_received} bytes received')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
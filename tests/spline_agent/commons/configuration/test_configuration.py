@@ -207,3 +207,47 @@ def test_env_configuration(set_env_vars):
     _assert_item(conf_test_foo, 'test.foo.env', 42)
     _assert_no_item(conf_test_foo, 'test.bar.env')
     _assert_no_item(conf_test_foo, 'some.other.env')
+
+
+def test_file_configuration__snapshot():
+    # prepare
+    conf = FileConfiguration(f'{_PATH}/test_configuration_settings.mixed_struct.yaml')
+
+    # execute
+    snapshot = conf.snapshot()
+
+    # verify
+    assert set(snapshot) == {'a', 'a.b', 'a.b.c', 'd', 'd.e', 'd.e.f', 'g', 'j', 'j.k'}
+    assert snapshot['a.b.c'] == 1
+    assert snapshot['d.e.f'] is True
+    assert snapshot['g'] == {'h.i': 'Hello'}
+    assert snapshot['j.k'] == {'l.m': [10, 20]}
+    with pytest.raises(TypeError):
+        snapshot['x'] = 'y'  # type: ignore
+
+
+def test_composite_configuration__snapshot_precedence(set_env_vars):
+    # prepare
+    set_env_vars({
+        'TEST_A_B_C': 42,
+        'TEST_ONLY_IN_ENV': 'env',
+    })
+
+    # execute
+    conf = CompositeConfiguration(
+        EnvConfiguration(prefix='test'),
+        DictConfiguration({'test.a.b.c': 'dict', 'test.d.e.f': 'dict'}),
+        FileConfiguration(f'{_PATH}/test_configuration_settings.mixed_struct.yaml'),
+    )
+
+    # verify
+    snapshot = conf.snapshot()
+    assert snapshot['a.b.c'] == 1
+    assert snapshot['d.e.f'] is True
+    assert snapshot['test.d.e.f'] == 'dict'
+    assert snapshot['test.a.b.c'] == 42
+
+    _assert_item(conf, 'test.a.b.c', 42)
+    _assert_item(conf, 'test.only.in.env', 'env')
+    _assert_item(conf, 'A.B.C', 1)
+    _assert_no_item(conf, 'nah')
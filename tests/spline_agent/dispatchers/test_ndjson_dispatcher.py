@@ -0,0 +1,281 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import gzip
+import io
+import json
+import os
+import subprocess
+import sys
+import textwrap
+import time
+
+import pytest
+
+import spline_agent
+from spline_agent.dispatchers.ndjson_dispatcher import NdjsonLineageDispatcher, _write_fully
+from spline_agent.lineage_file import EVENT_KIND, PLAN_KIND, read_records
+from spline_agent.metrics import DROPPED
+from spline_agent.replay import LineageReplayer
+from spline_agent.testing.fake_producer import FakeSplineProducer
+from ..lineage_fixtures import dummy_lineage
+
+
+def test_writes_enveloped_records_when_the_buffer_is_full(tmp_path):
+    # prepare
+    path = tmp_path / 'lineage.ndjson'
+    lineage = dummy_lineage()
+    dispatcher = NdjsonLineageDispatcher(str(path), 1500, None, None, None, False)
+
+    # execute
+    dispatcher.send_plan(lineage.plan)
+    buffered = not path.exists()
+    dispatcher.send_events([lineage.event] * 5)
+    flushed = path.exists()
+    dispatcher.close()
+
+    # verify
+    assert buffered and flushed
+    lines = path.read_text().splitlines()
+    assert len(lines) == 6
+    assert json.loads(lines[0]) == {'kind': PLAN_KIND, 'data': json.loads(lines[0])['data']}
+    assert json.loads(lines[0])['data']['id'] == str(lineage.plan.id)
+    assert all(json.loads(line)['kind'] == EVENT_KIND for line in lines[1:])
+
+
+def test_flushes_periodically(tmp_path):
+    # prepare
+    path = tmp_path / 'lineage.ndjson'
+    dispatcher = NdjsonLineageDispatcher(str(path), 1_000_000, 0.05, None, None, False)
+
+    # execute
+    dispatcher.send_plan(dummy_lineage().plan)
+    deadline = time.time() + 5
+    while not path.exists() and time.time() < deadline:
+        time.sleep(0.01)
+
+    # verify
+    assert len(path.read_text().splitlines()) == 1
+    dispatcher.close()
+
+
+def test_rotates_by_size_and_compresses_segments(tmp_path):
+    # prepare
+    path = tmp_path / 'lineage.ndjson'
+    lineage = dummy_lineage()
+    dispatcher = NdjsonLineageDispatcher(str(path), 1, None, 600, None, True)
+
+    # execute
+    dispatcher.send_plan(lineage.plan)
+    for _ in range(10):
+        dispatcher.send_event(lineage.event)
+    dispatcher.close()
+
+    # verify
+    segments = sorted(p.name for p in tmp_path.iterdir())
+    rotated = [name for name in segments if name != 'lineage.ndjson']
+    assert len(rotated) >= 2
+    assert all(name.startswith('lineage-') and name.endswith('.ndjson.gz') for name in rotated)
+    with gzip.open(tmp_path / segments[0], 'rt') as f:
+        assert json.loads(f.readline())['kind'] == PLAN_KIND
+    records = [r for name in segments for r in read_records(str(tmp_path / name))]
+    assert [r.kind for r in records] == [PLAN_KIND] + [EVENT_KIND] * 10
+
+
+def test_rotates_by_age(tmp_path):
+    # prepare
+    path = tmp_path / 'lineage.ndjson'
+    dispatcher = NdjsonLineageDispatcher(str(path), 1, None, None, 0.01, False)
+
+    # execute
+    dispatcher.send_plan(dummy_lineage().plan)
+    time.sleep(0.02)
+    dispatcher.flush()
+    dispatcher.close()
+
+    # verify
+    assert [p.name.endswith('-000001.ndjson') for p in tmp_path.iterdir()] == [True]
+
+
+def test_written_files_can_be_replayed(tmp_path):
+    # prepare
+    dispatcher = NdjsonLineageDispatcher(str(tmp_path / 'lineage.ndjson'), 4096, None, 1500, None, True)
+    for i in range(20):
+        lineage = dummy_lineage(duration_ns=i)
+        dispatcher.send_plan(lineage.plan)
+        dispatcher.send_event(lineage.event)
+    dispatcher.close()
+    files = sorted(str(p) for p in tmp_path.iterdir())
+
+    # execute
+    with FakeSplineProducer() as producer:
+        stats = LineageReplayer(producer.url).replay(files)
+
+    # verify
+    assert (stats.plans_sent, stats.duplicate_plans, stats.events_sent) == (1, 19, 20)
+    assert sorted(e['durationNs'] for e in producer.events()) == list(range(20))
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='requires fork()')
+def test_forked_child_does_not_write_the_parent_buffer(tmp_path):
+    # prepare
+    path = tmp_path / 'lineage.ndjson'
+    lineage = dummy_lineage()
+    dispatcher = NdjsonLineageDispatcher(str(path), 1024 * 1024, None, None, None, False)
+    dispatcher.send_plan(lineage.plan)
+    dispatcher.send_event(lineage.event)
+
+    # execute
+    pid = os.fork()
+    if pid == 0:
+        dispatcher.send_event(lineage.event)
+        dispatcher.close()
+        os._exit(0)
+    os.waitpid(pid, 0)
+    dispatcher.close()
+
+    # verify
+    assert [r.kind for r in read_records(str(path))] == [EVENT_KIND, PLAN_KIND, EVENT_KIND]
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='requires fork()')
+def test_forked_child_rotates_its_own_file(tmp_path):
+    # prepare
+    path = tmp_path / 'lineage.ndjson'
+    lineage = dummy_lineage()
+    dispatcher = NdjsonLineageDispatcher(str(path), 1, None, 2000, None, False)
+    dispatcher.send_plan(lineage.plan)
+
+    # execute
+    pid = os.fork()
+    if pid == 0:
+        for _ in range(10):
+            dispatcher.send_event(lineage.event)
+        dispatcher.close()
+        os._exit(0)
+    for _ in range(20):
+        dispatcher.send_event(lineage.event)
+    os.waitpid(pid, 0)
+    dispatcher.close()
+
+    # verify
+    def count_events(names):
+        return sum(1 for name in names for r in read_records(str(tmp_path / name)) if r.kind == EVENT_KIND)
+
+    names = os.listdir(tmp_path)
+    child_names = [name for name in names if name.startswith((f'lineage-{pid}.', f'lineage-{pid}-'))]
+    assert f'lineage-{pid}.ndjson' in child_names
+    assert len(child_names) > 1
+    assert count_events(child_names) == 10
+    assert count_events(set(names) - set(child_names)) == 20
+
+
+def test_records_written_after_close_are_dropped(tmp_path):
+    # prepare
+    lineage = dummy_lineage()
+    dispatcher = NdjsonLineageDispatcher(str(tmp_path / 'lineage.ndjson'), 1024, None, None, None, False)
+    dispatcher.close()
+    dropped_before = DROPPED.value(queue='ndjson_closed')
+
+    # execute
+    dispatcher.send_events([lineage.event] * 2)
+
+    # verify
+    assert DROPPED.value(queue='ndjson_closed') - dropped_before == 2
+    assert not (tmp_path / 'lineage.ndjson').exists()
+
+
+def test_deferred_lineage_is_written_before_closing_on_exit(tmp_path):
+    # prepare
+    path = tmp_path / 'lineage.ndjson'
+    script = textwrap.dedent(f'''
+        import time
+        from spline_agent.context import LineageTrackingContext
+        from spline_agent.datasources import DataSource
+        from spline_agent.deferred_harvester import ExecutionRecord, get_deferred_harvester
+        from spline_agent.dispatchers.ndjson_dispatcher import NdjsonLineageDispatcher
+        from spline_agent.enums import WriteMode
+        from spline_agent.lineage_model import NameAndVersion
+
+        class SlowDispatcher(NdjsonLineageDispatcher):
+            def send_plan(self, plan):
+                time.sleep(0.5)
+                super().send_plan(plan)
+
+        def dummy_func():
+            pass
+
+        # the harvester is created first, e.g. by a call tracked in the BYPASS mode
+        harvester = get_deferred_harvester(10)
+        dispatcher = SlowDispatcher({str(path)!r}, 1024 * 1024, None, None, None, False)
+        ctx = LineageTrackingContext()
+        ctx.name = 'dummy_func'
+        ctx.system_info = NameAndVersion(name='dummy', version='dummy')
+        ctx.add_input(DataSource('in.csv'))
+        ctx.output = DataSource('out.csv')
+        ctx.write_mode = WriteMode.APPEND
+        harvester.submit(ExecutionRecord(ctx, dummy_func, 0, 1000, None, dispatcher))
+    ''')
+    src_path = os.path.dirname(os.path.dirname(spline_agent.__file__))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [src_path, os.environ.get('PYTHONPATH')])))
+
+    # execute
+    subprocess.run([sys.executable, '-c', script], env=env, check=True, capture_output=True)
+
+    # verify
+    assert [r.kind for r in read_records(str(path))] == [PLAN_KIND, EVENT_KIND]
+
+
+def test_partial_writes_are_completed():
+    # prepare
+    class ShortWritingFile(io.RawIOBase):
+        def __init__(self):
+            super().__init__()
+            self.data = b''
+
+        def writable(self):
+            return True
+
+        def write(self, b):
+            chunk = bytes(b[:3])
+            self.data += chunk
+            return len(chunk)
+
+    f = ShortWritingFile()
+
+    # execute
+    written = _write_fully(f, bytearray(b'0123456789'))  # type: ignore
+
+    # verify
+    assert written == 10
+    assert f.data == b'0123456789'
+
+
+def test_buffer_is_bounded_when_the_file_cannot_be_written(tmp_path):
+    # prepare
+    lineage = dummy_lineage()
+    dispatcher = NdjsonLineageDispatcher(str(tmp_path / 'missing' / 'lineage.ndjson'), 1000, None, None, None, False)
+    dropped_before = DROPPED.value(queue='ndjson_buffer')
+
+    # execute
+    for _ in range(50):
+        dispatcher.send_event(lineage.event)
+    (tmp_path / 'missing').mkdir()
+    dispatcher.close()
+
+    # verify
+    dropped = DROPPED.value(queue='ndjson_buffer') - dropped_before
+    written = list(read_records(str(tmp_path / 'missing' / 'lineage.ndjson')))
+    assert dropped > 0
+    assert dropped + len(written) == 50
@@ -0,0 +1,345 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import dataclasses
+import json
+import os
+import threading
+import time
+from unittest.mock import create_autospec, patch
+
+import pytest
+
+from spline_agent.commons.configuration import DictConfiguration
+from spline_agent.dispatcher import LineageDispatcher, dispatch_lineage
+from spline_agent.dispatchers.ndjson_dispatcher import NdjsonLineageDispatcher
+from spline_agent.dispatchers.pipeline_dispatcher import PipelineLineageDispatcher
+from spline_agent.lineage_file import read_records
+from spline_agent.lineage_model import DataOperation
+from spline_agent.metrics import DROPPED
+from spline_agent.object_factory import ObjectFactory
+from spline_agent.source_capture import source_capture, SOURCE_BLOBS_KEY
+from spline_agent.testing.fake_producer import FakeSplineProducer
+from ..lineage_fixtures import dummy_lineage
+from ..mocks import LineageDispatcherMock
+
+
+def test_fans_out_serializing_once():
+    # prepare
+    lineage = dummy_lineage()
+    sink1: LineageDispatcherMock = create_autospec(LineageDispatcher)
+    sink2: LineageDispatcherMock = create_autospec(LineageDispatcher)
+    pipeline = PipelineLineageDispatcher([sink1, sink2], 10, [], False, 5)
+
+    # execute
+    with patch('spline_agent.dispatchers.pipeline_dispatcher.to_compact_json_str', return_value='{}') as to_json:
+        pipeline.send_plan(lineage.plan)
+        pipeline.send_event(lineage.event)
+        pipeline.close()
+
+    # verify
+    assert to_json.call_count == 2
+    assert all(c.args[0] in (lineage.plan, lineage.event) for c in to_json.call_args_list)
+    for sink in (sink1, sink2):
+        assert [c.args for c in sink.send_serialized.call_args_list] == [
+            ('plan', [lineage.plan], ['{}']),
+            ('event', [lineage.event], ['{}']),
+        ]
+
+
+def test_slow_or_failing_sink_does_not_block_the_others():
+    # prepare
+    lineage = dummy_lineage()
+    release = threading.Event()
+    slow_sink: LineageDispatcherMock = create_autospec(LineageDispatcher)
+    slow_sink.send_serialized.side_effect = lambda *_: release.wait()
+    failing_sink: LineageDispatcherMock = create_autospec(LineageDispatcher)
+    failing_sink.send_serialized.side_effect = IOError('boom')
+    fast_sink: LineageDispatcherMock = create_autospec(LineageDispatcher)
+    pipeline = PipelineLineageDispatcher([slow_sink, failing_sink, fast_sink], 100, [], False, 5)
+
+    # execute
+    for _ in range(10):
+        pipeline.send_event(lineage.event)
+    while fast_sink.send_serialized.call_count < 10:
+        threading.Event().wait(0.01)
+    release.set()
+    pipeline.close()
+
+    # verify
+    assert failing_sink.send_serialized.call_count == 10
+    assert slow_sink.send_serialized.call_count == 10
+
+
+def test_drops_lineage_when_the_sink_queue_is_full():
+    # prepare
+    lineage = dummy_lineage()
+    release = threading.Event()
+    sink: LineageDispatcherMock = create_autospec(LineageDispatcher)
+    sink.send_serialized.side_effect = lambda *_: release.wait()
+    pipeline = PipelineLineageDispatcher([sink], 2, [], False, 5)
+    queue_label = f'sink_0_{type(sink).__name__}'
+    dropped_before = DROPPED.value(queue=queue_label)
+
+    # execute
+    for _ in range(10):
+        pipeline.send_event(lineage.event)
+    release.set()
+    pipeline.close()
+
+    # verify
+    # one event is taken by the worker, two are queued
+    dropped = DROPPED.value(queue=queue_label) - dropped_before
+    assert 7 <= dropped <= 8
+    assert sink.send_serialized.call_count == 10 - dropped
+
+
+def test_serializes_off_the_caller_thread():
+    # prepare
+    lineage = dummy_lineage()
+    sink: LineageDispatcherMock = create_autospec(LineageDispatcher)
+    pipeline = PipelineLineageDispatcher([sink], 10, [], False, 5)
+    serializing_threads = []
+
+    def to_json(_):
+        serializing_threads.append(threading.current_thread())
+        return '{}'
+
+    # execute
+    with patch('spline_agent.dispatchers.pipeline_dispatcher.to_compact_json_str', side_effect=to_json):
+        pipeline.send_event(lineage.event)
+        pipeline.close()
+
+    # verify
+    assert len(serializing_threads) == 1
+    assert serializing_threads[0] is not threading.current_thread()
+
+
+def test_close_drops_what_is_not_sent_by_the_drain_timeout():
+    # prepare
+    lineage = dummy_lineage()
+    release = threading.Event()
+    sink: LineageDispatcherMock = create_autospec(LineageDispatcher)
+    sink.send_serialized.side_effect = lambda *_: release.wait(10)
+    pipeline = PipelineLineageDispatcher([sink], 10, [], False, 0.2)
+    queue_label = f'sink_0_{type(sink).__name__}'
+    dropped_before = DROPPED.value(queue=queue_label)
+
+    # execute
+    for _ in range(5):
+        pipeline.send_event(lineage.event)
+    while not sink.send_serialized.called:
+        threading.Event().wait(0.01)
+    started = time.monotonic()
+    pipeline.close()
+    close_duration = time.monotonic() - started
+    release.set()
+
+    # verify
+    # one event is taken by the worker, four are queued
+    assert close_duration < 5
+    assert DROPPED.value(queue=queue_label) - dropped_before == 4
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='requires fork()')
+def test_forked_child_sends_with_its_own_sink_workers():
+    # prepare
+    lineage = dummy_lineage()
+    release = threading.Event()
+    sink: LineageDispatcherMock = create_autospec(LineageDispatcher)
+    sink.send_serialized.side_effect = lambda *_: release.wait(10)
+    pipeline = PipelineLineageDispatcher([sink], 10, [], False, 5)
+    pipeline.send_event(lineage.event)
+    pipeline.send_event(lineage.event)
+    while not sink.send_serialized.called:
+        threading.Event().wait(0.01)
+    read_fd, write_fd = os.pipe()
+
+    # execute
+    pid = os.fork()
+    if pid == 0:
+        release.set()
+        pipeline.send_event(lineage.event)
+        pipeline.flush()
+        os.write(write_fd, str(sink.send_serialized.call_count).encode())
+        os._exit(0)
+    os.close(write_fd)
+    os.waitpid(pid, 0)
+    with os.fdopen(read_fd) as f:
+        child_sent = int(f.read())
+    release.set()
+    pipeline.close()
+
+    # verify
+    # the child's mock has the parent's call in progress recorded, but not the queued one
+    assert child_sent == 2
+    assert sink.send_serialized.call_count == 2
+
+
+def test_drops_plans_and_their_events_by_url():
+    # prepare
+    kept = dummy_lineage('hdfs://data/out.csv')
+    dropped = dummy_lineage('file:///tmp/scratch.csv')
+    sink: LineageDispatcherMock = create_autospec(LineageDispatcher)
+    pipeline = PipelineLineageDispatcher([sink], 10, ['^file:///tmp/', r'\.bak$'], False, 5)
+
+    # execute
+    pipeline.send_plan(dropped.plan)
+    pipeline.send_plan(kept.plan)
+    pipeline.send_events([dropped.event, kept.event])
+    pipeline.close()
+
+    # verify
+    assert [c.args[:2] for c in sink.send_serialized.call_args_list] == [
+        ('plan', [kept.plan]),
+        ('event', [kept.event]),
+    ]
+
+
+def test_strips_source_code():
+    # prepare
+    lineage = dummy_lineage()
+    operations = lineage.plan.operations
+    func_op = DataOperation(id='op-1', childIds=(), name='dummy_func',
+                            extra={'source_hash': 'sha256:abc', 'source_code': 'def dummy_func(): pass'})
+    plan = dataclasses.replace(
+        lineage.plan,
+        operations=dataclasses.replace(operations, other=(func_op,)),
+        extraInfo={**lineage.plan.extraInfo, 'source_blobs': {'sha256:abc': 'def dummy_func(): pass'}})
+    sink: LineageDispatcherMock = create_autospec(LineageDispatcher)
+    pipeline = PipelineLineageDispatcher([sink], 10, [], True, 5)
+
+    # execute
+    pipeline.send_plan(plan)
+    pipeline.close()
+
+    # verify
+    sent_plan, = sink.send_serialized.call_args.args[1]
+    plan_json = json.loads(sink.send_serialized.call_args.args[2][0])
+    assert sent_plan.id == plan.id
+    assert sent_plan.operations.other[0].extra == {'source_hash': 'sha256:abc'}
+    assert 'source_blobs' not in sent_plan.extraInfo
+    assert 'source_code' not in plan_json['operations']['other'][0]['extra']
+    assert 'source_blobs' not in plan_json['extraInfo']
+
+
+def test_source_blobs_are_attached_until_all_sinks_send_the_plan():
+    # prepare
+    source_capture.reset()
+    ok_sink: LineageDispatcherMock = create_autospec(LineageDispatcher)
+    flaky_sink: LineageDispatcherMock = create_autospec(LineageDispatcher)
+    plan_failures = [IOError('boom')]
+
+    def fail_first_plan(kind, *_):
+        if kind == 'plan' and plan_failures:
+            raise plan_failures.pop()
+
+    flaky_sink.send_serialized.side_effect = fail_first_plan
+    pipeline = PipelineLineageDispatcher([ok_sink, flaky_sink], 10, ['^dropped'], False, 5)
+
+    # execute
+    blobs_attached = []
+    for output in ('dropped.csv', 'out.csv', 'out.csv', 'out.csv'):
+        lineage = dummy_lineage(output)
+        blobs_attached.append(SOURCE_BLOBS_KEY in lineage.plan.extraInfo)
+        dispatch_lineage(pipeline, lineage)
+        pipeline.flush()
+    pipeline.close()
+    source_capture.reset()
+
+    # verify
+    # dropped by the filter, failed in one of the sinks, sent, and not attached anymore
+    assert blobs_attached == [True, True, True, False]
+
+
+def test_stripped_source_blobs_are_not_attached_once_the_plan_is_sent():
+    # prepare
+    source_capture.reset()
+    sink: LineageDispatcherMock = create_autospec(LineageDispatcher)
+    pipeline = PipelineLineageDispatcher([sink], 10, [], True, 5)
+
+    # execute
+    blobs_attached = []
+    for _ in range(2):
+        lineage = dummy_lineage()
+        blobs_attached.append(SOURCE_BLOBS_KEY in lineage.plan.extraInfo)
+        dispatch_lineage(pipeline, lineage)
+        pipeline.flush()
+    pipeline.close()
+    source_capture.reset()
+
+    # verify
+    assert blobs_attached == [True, False]
+    sent_plan = sink.send_serialized.call_args_list[0].args[1][0]
+    assert SOURCE_BLOBS_KEY not in sent_plan.extraInfo
+
+
+def test_sends_to_configured_http_and_ndjson_sinks(tmp_path):
+    # prepare
+    lineage = dummy_lineage()
+    ndjson_path = tmp_path / 'lineage.ndjson'
+    with FakeSplineProducer() as producer:
+        config = DictConfiguration({
+            'spline.lineage_dispatcher.pipeline.class_name':
+                'spline_agent.dispatchers.pipeline_dispatcher.PipelineLineageDispatcher',
+            'spline.lineage_dispatcher.pipeline.sinks': ['http', 'ndjson'],
+            'spline.lineage_dispatcher.pipeline.queue_size': 10,
+            'spline.lineage_dispatcher.pipeline.drop_urls': [],
+            'spline.lineage_dispatcher.pipeline.strip_source_code': False,
+            'spline.lineage_dispatcher.pipeline.drain_timeout_sec': 5,
+            'spline.lineage_dispatcher.http.class_name':
+                'spline_agent.dispatchers.http_dispatcher.HttpLineageDispatcher',
+            'spline.lineage_dispatcher.http.base_url': producer.url,
+            'spline.lineage_dispatcher.http.plans_url': 'execution-plans',
+            'spline.lineage_dispatcher.http.events_url': 'execution-events',
+            'spline.lineage_dispatcher.http.content_type': 'application/json',
+            'spline.lineage_dispatcher.ndjson.class_name':
+                'spline_agent.dispatchers.ndjson_dispatcher.NdjsonLineageDispatcher',
+            'spline.lineage_dispatcher.ndjson.path': str(ndjson_path),
+            'spline.lineage_dispatcher.ndjson.buffer_size': 1024 * 1024,
+            'spline.lineage_dispatcher.ndjson.flush_interval_sec': 1,
+            'spline.lineage_dispatcher.ndjson.max_bytes': 1024 * 1024,
+            'spline.lineage_dispatcher.ndjson.max_age_sec': 3600,
+            'spline.lineage_dispatcher.ndjson.compress': False,
+        })
+
+        # execute
+        pipeline = ObjectFactory(config).instantiate_named(LineageDispatcher, 'pipeline')
+        pipeline.send_plan(lineage.plan)
+        pipeline.send_events([lineage.event, lineage.event])
+        assert isinstance(pipeline, PipelineLineageDispatcher)
+        pipeline.close()
+
+        # verify
+        assert [p['id'] for p in producer.plans()] == [str(lineage.plan.id)]
+        assert [e['planId'] for e in producer.events()] == [str(lineage.plan.id)] * 2
+    records = list(read_records(str(ndjson_path)))
+    assert [r.kind for r in records] == ['plan', 'event', 'event']
+    assert records[0].data == json.loads(producer.requests[0].body)
+
+
+def test_sink_flush_is_called():
+    # prepare
+    sink = create_autospec(NdjsonLineageDispatcher)
+    pipeline = PipelineLineageDispatcher([sink], 10, [], False, 5)
+
+    # execute
+    pipeline.send_event(dummy_lineage().event)
+    pipeline.flush()
+
+    # verify
+    sink.send_serialized.assert_called_once()
+    sink.flush.assert_called_once()
+    pipeline.close()
+    sink.close.assert_called_once()
@@ -0,0 +1,42 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+from typing import Any, Mapping, Optional
+
+from spline_agent.context import LineageTrackingContext
+from spline_agent.datasources import DataSource
+from spline_agent.enums import WriteMode
+from spline_agent.harvester import harvest_lineage
+from spline_agent.lineage_model import Lineage, NameAndVersion
+
+
+def dummy_func():
+    pass
+
+
+def dummy_lineage(
+        output: str = 'out.csv',
+        duration_ns: int = 1000,
+        error: Optional[str] = None,
+        event_extra: Optional[Mapping[str, Any]] = None) -> Lineage:
+    """
+    Harvests the lineage of a `dummy_func` execution, that reads `in.csv` and appends to the output
+    """
+    ctx = LineageTrackingContext()
+    ctx.name = 'dummy_func'
+    ctx.system_info = NameAndVersion(name="dummy", version="dummy")
+    ctx.add_input(DataSource('in.csv'))
+    ctx.output = DataSource(output)
+    ctx.write_mode = WriteMode.APPEND
+    return harvest_lineage(ctx, dummy_func, duration_ns, error, event_extra=event_extra)
@@ -42,6 +42,14 @@ class LineageDispatcherMock(LineageDispatcher):
     @abstractmethod
     def send_event(self) -> NonCallableMock: pass
 
+    @property
+    @abstractmethod
+    def send_events(self) -> NonCallableMock: pass
+
+    @property
+    @abstractmethod
+    def send_serialized(self) -> NonCallableMock: pass
+
 
 # noinspection PyMethodOverriding
 class ConfigurationMock(Configuration):
@@ -0,0 +1,188 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+import json
+from unittest.mock import create_autospec, patch
+
+import spline_agent
+from spline_agent.batch import ExecutionBatch
+from spline_agent.context import LineageTrackingContext
+from spline_agent.datasources import DataSource
+from spline_agent.dispatcher import LineageDispatcher
+from spline_agent.dispatchers.http_dispatcher import HttpLineageDispatcher
+from spline_agent.enums import WriteMode
+from spline_agent.harvester import harvest_lineage, harvest_many
+from spline_agent.json_serde import to_compact_json_str
+from spline_agent.lineage_model import ExecutionEvent, ExecutionPlan, NameAndVersion
+from spline_agent.payload_layout import EnvironmentPlacement, payload_layout
+from spline_agent.process_environment import process_environment
+from spline_agent.source_capture import source_capture, SOURCE_BLOBS_KEY
+from .mocks import LineageDispatcherMock
+
+
+def partition_task():
+    pass
+
+
+def _tracking_context() -> LineageTrackingContext:
+    ctx = LineageTrackingContext()
+    ctx.name = 'partition_task'
+    ctx.system_info = NameAndVersion(name="dummy", version="dummy")
+    ctx.add_input(DataSource('in.csv'))
+    ctx.output = DataSource('out.csv')
+    ctx.write_mode = WriteMode.APPEND
+    return ctx
+
+
+def test_harvest_many_builds_the_plan_once():
+    # prepare
+    batch = ExecutionBatch()
+    batch.append(1000, 10, None)
+    batch.append(2000, None, 'boom')
+    batch.append(3000, 30)
+
+    # execute
+    lineage = harvest_many(_tracking_context(), partition_task, batch, event_extra={'job': 'nightly'})
+    batch.append(4000, 40)
+
+    # verify
+    single = harvest_lineage(_tracking_context(), partition_task, 10, None)
+    extra = {**process_environment.host_snapshot(), 'job': 'nightly'}
+    assert lineage.plan.id == single.plan.id
+    assert len(lineage.events) == 3
+    assert [(e.planId, e.timestamp, e.durationNs, e.error, dict(e.extra)) for e in lineage.events] == [
+        (single.plan.id, 1000, 10, None, extra),
+        (single.plan.id, 2000, None, 'boom', extra),
+        (single.plan.id, 3000, 30, None, extra),
+    ]
+
+
+def test_harvest_many_truncates_errors():
+    # prepare
+    batch = ExecutionBatch()
+    batch.append(1000, 10, 'x' * 100)
+    payload_layout.error_limit = 10
+
+    # execute
+    try:
+        lineage = harvest_many(_tracking_context(), partition_task, batch)
+    finally:
+        payload_layout.reset()
+
+    # verify
+    assert [e.error for e in lineage.events] == ['xxxxxxx...']
+
+
+def test_events_sharing_environment_are_serialized_once():
+    # prepare
+    batch = ExecutionBatch()
+    for i in range(3):
+        batch.append(i, i)
+    payload_layout.environment_placement = EnvironmentPlacement.EVENT
+
+    # execute
+    try:
+        lineage = harvest_many(_tracking_context(), partition_task, batch)
+        events_json = to_compact_json_str(list(lineage.events))
+    finally:
+        payload_layout.reset()
+
+    # verify
+    events = json.loads(events_json)
+    assert [e['timestamp'] for e in events] == [0, 1, 2]
+    assert all(e['extra'] == events[0]['extra'] for e in events)
+    assert 'python_version' in events[0]['extra']
+
+
+def test_dispatcher_sends_events_one_by_one_by_default():
+    # prepare
+    class Dispatcher(LineageDispatcher):
+        def __init__(self):
+            self.events: list[ExecutionEvent] = []
+
+        def send_plan(self, plan: ExecutionPlan):
+            pass
+
+        def send_event(self, event: ExecutionEvent):
+            self.events.append(event)
+
+    batch = ExecutionBatch()
+    batch.append(1000, 10)
+    batch.append(2000, 20)
+    lineage = spline_agent.harvest_many(_tracking_context(), partition_task, batch)
+    dispatcher = Dispatcher()
+
+    # execute
+    dispatcher.send_events(lineage.events)
+
+    # verify
+    assert [e.timestamp for e in dispatcher.events] == [1000, 2000]
+
+
+def test_dispatch_batch_reports_the_plan_delivered():
+    # prepare
+    source_capture.reset()
+    mock_disp: LineageDispatcherMock = create_autospec(LineageDispatcher)
+    batch = ExecutionBatch()
+    batch.append(1000, 10)
+
+    # execute
+    blobs_attached = []
+    for _ in range(2):
+        lineage = harvest_many(_tracking_context(), partition_task, batch)
+        blobs_attached.append(SOURCE_BLOBS_KEY in lineage.plan.extraInfo)
+        spline_agent.dispatch_batch(mock_disp, lineage)
+    source_capture.reset()
+
+    # verify
+    assert blobs_attached == [True, False]
+    mock_disp.send_plan.assert_called_with(lineage.plan)
+    mock_disp.send_events.assert_called_with(lineage.events)
+
+
+def test_http_dispatcher_posts_events_in_one_request():
+    # prepare
+    batch = ExecutionBatch()
+    batch.append(1000, 10)
+    batch.append(2000, 20)
+    lineage = harvest_many(_tracking_context(), partition_task, batch)
+    dispatcher = HttpLineageDispatcher('http://localhost:8080', 'plans', 'events', 'application/json')
+
+    # execute
+    with patch('spline_agent.dispatchers.http_dispatcher.requests.post') as mock_post:
+        dispatcher.send_events(lineage.events)
+
+    # verify
+    mock_post.assert_called_once()
+    assert mock_post.call_args.kwargs['url'] == 'http://localhost:8080/events'
+    body = json.loads(mock_post.call_args.kwargs['data'])
+    assert [(e['planId'], e['durationNs']) for e in body] == [(str(lineage.plan.id), 10), (str(lineage.plan.id), 20)]
+
+
+def test_decorated_function_events_are_unaffected():
+    # prepare
+    mock_disp: LineageDispatcherMock = create_autospec(LineageDispatcher)
+
+    @spline_agent.track_lineage(dispatcher=mock_disp, system_info=NameAndVersion(name="dummy", version="dummy"))
+    @spline_agent.output('dummy', WriteMode.OVERWRITE)
+    def test_func():
+        pass
+
+    # execute
+    test_func()
+
+    # verify
+    mock_disp.send_event.assert_called_once()
+    mock_disp.send_events.assert_not_called()
@@ -0,0 +1,146 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import sys
+from unittest.mock import create_autospec
+
+import spline_agent
+from spline_agent.call_recorder import CallRecorder
+from spline_agent.dispatcher import LineageDispatcher
+from spline_agent.enums import WriteMode
+from spline_agent.lineage_model import NameAndVersion, ExecutionPlan
+from .mocks import LineageDispatcherMock
+
+_DUMMY_NV = NameAndVersion(name="dummy", version="dummy")
+
+
+def _used():
+    return 1
+
+
+def _unused():
+    return 2
+
+
+def _dynamically_dispatched():
+    return 3
+
+
+def _job(callee_name: str):
+    return _used() + globals()[callee_name]()
+
+
+class _Job:
+    def run(self):
+        return self.create().step()
+
+    @classmethod
+    def create(cls) -> '_Job':
+        return cls()
+
+    def step(self):
+        return 4
+
+
+def test_executed_methods_are_recorded_with_class_names():
+    # prepare
+    mock_disp: LineageDispatcherMock = create_autospec(LineageDispatcher)
+
+    @spline_agent.track_lineage(dispatcher=mock_disp, system_info=_DUMMY_NV, record_calls=True)
+    @spline_agent.output('dummy', WriteMode.OVERWRITE)
+    def tracked_func():
+        return _Job().run()
+
+    # execute
+    tracked_func()
+
+    # verify
+    plan: ExecutionPlan = mock_disp.send_plan.call_args.args[0]
+    assert plan.operations.other[0].extra['executed_functions'] == [
+        f'{__name__}._Job.create',
+        f'{__name__}._Job.run',
+        f'{__name__}._Job.step',
+        f'{__name__}.test_executed_methods_are_recorded_with_class_names.<locals>.tracked_func',
+    ]
+
+
+def test_executed_functions_are_recorded():
+    # prepare
+    mock_disp: LineageDispatcherMock = create_autospec(LineageDispatcher)
+
+    @spline_agent.track_lineage(dispatcher=mock_disp, system_info=_DUMMY_NV, record_calls=True)
+    @spline_agent.output('dummy', WriteMode.OVERWRITE)
+    def tracked_func():
+        return _job('_dynamically_dispatched')
+
+    # execute
+    tracked_func()
+
+    # verify
+    plan: ExecutionPlan = mock_disp.send_plan.call_args.args[0]
+    assert plan.operations.other[0].extra['executed_functions'] == [
+        f'{__name__}._dynamically_dispatched',
+        f'{__name__}._job',
+        f'{__name__}._used',
+        f'{__name__}.test_executed_functions_are_recorded.<locals>.tracked_func',
+    ]
+
+
+def test_calls_are_not_recorded_by_default():
+    # prepare
+    mock_disp: LineageDispatcherMock = create_autospec(LineageDispatcher)
+
+    @spline_agent.track_lineage(dispatcher=mock_disp, system_info=_DUMMY_NV)
+    @spline_agent.output('dummy', WriteMode.OVERWRITE)
+    def tracked_func():
+        return _used()
+
+    # execute
+    tracked_func()
+
+    # verify
+    plan: ExecutionPlan = mock_disp.send_plan.call_args.args[0]
+    assert 'executed_functions' not in plan.operations.other[0].extra
+
+
+def test_nested_recordings():
+    # prepare
+    recorder = CallRecorder()
+    recorder.allow_modules([__name__])
+    profile_before = sys.getprofile()
+
+    # execute
+    with recorder.recording() as outer_calls:
+        _used()
+        with recorder.recording() as inner_calls:
+            _unused()
+        _dynamically_dispatched()
+
+    # verify
+    assert recorder.function_names(outer_calls) == [f'{__name__}._dynamically_dispatched', f'{__name__}._used']
+    assert recorder.function_names(inner_calls) == [f'{__name__}._unused']
+    assert sys.getprofile() is profile_before
+
+
+def test_modules_outside_allow_list_are_not_recorded():
+    # prepare
+    recorder = CallRecorder()
+    recorder.allow_modules(['some_other_module'])
+
+    # execute
+    with recorder.recording() as calls:
+        _used()
+
+    # verify
+    assert calls == set()
@@ -0,0 +1,87 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import os
+from unittest.mock import patch
+
+from spline_agent.config_loader import ConfigCache
+from spline_agent.constants import CONFIG_FILE_DEFAULT
+
+
+def _config_cache(tmp_path) -> ConfigCache:
+    user_file = tmp_path / 'spline.yaml'
+    if not user_file.exists():
+        user_file.write_text('spline:\n  mode: BYPASS\n  foo: bar\n')
+    return ConfigCache(str(tmp_path / 'cache'), (str(user_file), CONFIG_FILE_DEFAULT))
+
+
+def test_warm_load_reads_cache_only(tmp_path, set_env_vars):
+    # prepare
+    set_env_vars({'SPLINE_FOO': 'baz'})
+    cold_config = _config_cache(tmp_path).load()
+
+    # execute
+    with patch('spline_agent.config_loader.FileConfiguration', side_effect=AssertionError('not cached')):
+        warm_config = _config_cache(tmp_path).load()
+
+    # verify
+    assert os.path.isfile(_config_cache(tmp_path).cache_file_path)
+    for config in (cold_config, warm_config):
+        assert config['spline.mode'] == 'BYPASS'
+        assert config['spline.foo'] == 'baz'
+        assert config['SPLINE.LINEAGE_DISPATCHER.LOGGING.LEVEL'] == 'INFO'
+        assert config.get('spline.metrics.http_port') is None
+
+
+def test_cache_is_invalidated_by_file_change(tmp_path):
+    # prepare
+    _config_cache(tmp_path).load()
+    user_file = tmp_path / 'spline.yaml'
+    user_file.write_text('spline:\n  mode: DISABLED\n')
+    os.utime(user_file, ns=(0, 0))
+
+    # execute
+    config = _config_cache(tmp_path).load()
+
+    # verify
+    assert config['spline.mode'] == 'DISABLED'
+    assert config.get('spline.foo') is None
+
+
+def test_cache_is_invalidated_by_env_change(tmp_path, set_env_vars):
+    # prepare
+    _config_cache(tmp_path).load()
+    set_env_vars({'SPLINE_MODE': 'ENABLED'})
+
+    # execute
+    config = _config_cache(tmp_path).load()
+
+    # verify
+    assert config['spline.mode'] == 'ENABLED'
+
+
+def test_corrupted_cache_is_rebuilt(tmp_path):
+    # prepare
+    cache = _config_cache(tmp_path)
+    cache.load()
+    with open(cache.cache_file_path, 'w') as f:
+        f.write('{not a json')
+
+    # execute
+    config = _config_cache(tmp_path).load()
+
+    # verify
+    assert config['spline.mode'] == 'BYPASS'
+    with patch('spline_agent.config_loader.FileConfiguration', side_effect=AssertionError('not cached')):
+        assert _config_cache(tmp_path).load()['spline.mode'] == 'BYPASS'
@@ -0,0 +1,88 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import io
+from unittest.mock import create_autospec
+
+import spline_agent
+from spline_agent.data_volume import CountingRawIO
+from spline_agent.dispatcher import LineageDispatcher
+from spline_agent.enums import WriteMode
+from spline_agent.lineage_model import NameAndVersion, ExecutionEvent
+from .mocks import LineageDispatcherMock
+
+_DUMMY_NV = NameAndVersion(name="dummy", version="dummy")
+
+
+def test_data_volume_is_reported_per_operation(tmp_path):
+    # prepare
+    in_path = tmp_path / 'in.csv'
+    in_path.write_bytes(b'a,b\n1,2\n3,4\n')
+    out_path = tmp_path / 'out.csv'
+    mock_disp: LineageDispatcherMock = create_autospec(LineageDispatcher)
+
+    @spline_agent.track_lineage(dispatcher=mock_disp, system_info=_DUMMY_NV)
+    @spline_agent.inputs('{src}', 'mem://buffer')
+    @spline_agent.output('{dst}', WriteMode.OVERWRITE)
+    def copy_func(src: str, dst: str):
+        with spline_agent.tracked_open(src, count_records=True) as fin:
+            lines = fin.readlines()
+        with spline_agent.track_stream(io.BytesIO(b'xyz'), 'mem://buffer') as buf:
+            buf.read()
+        with spline_agent.tracked_open(dst, 'wb') as fout:
+            fout.writelines(line.encode() for line in lines[1:])
+
+    # execute
+    copy_func(str(in_path), str(out_path))
+
+    # verify
+    assert out_path.read_bytes() == b'1,2\n3,4\n'
+    event: ExecutionEvent = mock_disp.send_event.call_args.args[0]
+    assert event.extra['data_volume'] == [
+        {'operation_id': 'op-2', 'url': str(in_path),
+         'bytes_read': 12, 'bytes_written': 0, 'records_read': 3, 'records_written': 0},
+        {'operation_id': 'op-3', 'url': 'mem://buffer', 'bytes_read': 3, 'bytes_written': 0},
+        {'operation_id': 'op-0', 'url': str(out_path), 'bytes_read': 0, 'bytes_written': 8},
+    ]
+
+
+def test_no_data_volume_when_not_used():
+    # prepare
+    mock_disp: LineageDispatcherMock = create_autospec(LineageDispatcher)
+
+    @spline_agent.track_lineage(dispatcher=mock_disp, system_info=_DUMMY_NV)
+    @spline_agent.output('dummy', WriteMode.OVERWRITE)
+    def test_func():
+        pass
+
+    # execute
+    test_func()
+
+    # verify
+    event: ExecutionEvent = mock_disp.send_event.call_args.args[0]
+    assert 'data_volume' not in event.extra
+
+
+def test_plain_open_outside_tracking_context(tmp_path):
+    # prepare
+    file_path = tmp_path / 'dummy.txt'
+    file_path.write_text('dummy')
+
+    # execute
+    with spline_agent.tracked_open(file_path) as f:
+        content = f.read()
+
+    # verify
+    assert content == 'dummy'
+    assert not isinstance(f.buffer.raw, CountingRawIO)
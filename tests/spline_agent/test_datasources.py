@@ -0,0 +1,155 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+import gc
+import os
+from unittest.mock import create_autospec
+
+import pytest
+
+import spline_agent
+from spline_agent.commons.configuration import DictConfiguration
+from spline_agent.datasources import DataSource, DataSourceInterner, data_source_interner
+from spline_agent.dispatcher import LineageDispatcher
+from spline_agent.enums import WriteMode
+from spline_agent.lineage_model import NameAndVersion, ExecutionPlan
+from .mocks import LineageDispatcherMock
+
+_DUMMY_NV = NameAndVersion(name="dummy", version="dummy")
+_S3_ALIASES = {'s3a': 's3', 's3n': 's3'}
+
+
+@pytest.fixture(autouse=True)
+def reset_data_source_interner():
+    yield
+    data_source_interner.enabled = False
+    data_source_interner.scheme_aliases = {}
+    data_source_interner.reset()
+
+
+def _interner(max_size: int = 4096) -> DataSourceInterner:
+    interner = DataSourceInterner(max_size)
+    interner.enabled = True
+    interner.scheme_aliases = dict(_S3_ALIASES)
+    return interner
+
+
+@pytest.mark.parametrize('url, expected', [
+    ('s3://bucket/data/table', 's3://bucket/data/table'),
+    ('S3A://Bucket/data/table', 's3://bucket/data/table'),
+    # the object store keys are names, not paths
+    ('s3n://bucket/data//./table/', 's3://bucket/data//./table/'),
+    ('s3://bucket/a/../b', 's3://bucket/a/../b'),
+    ('gs://bucket/a/./b/', 'gs://bucket/a/./b/'),
+    ('hdfs://NameNode:8020/data//./tmp/../table/', 'hdfs://namenode:8020/data/table'),
+    ('http://User@Host/path/?q=A#F', 'http://User@host/path/?q=A#F'),
+    ('file:///tmp//data/', 'file:///tmp/data'),
+    # the nested and opaque URLs are kept as they are
+    ('jdbc:postgresql://Host:5432/db', 'jdbc:postgresql://Host:5432/db'),
+    ('jdbc:sqlserver://Host:1433;databaseName=Db', 'jdbc:sqlserver://Host:1433;databaseName=Db'),
+    ('jdbc:oracle:thin:@//Host:1521/svc/../x', 'jdbc:oracle:thin:@//Host:1521/svc/../x'),
+    ('mem://buffer', 'mem://buffer'),
+    ('', ''),
+    (os.path.join('data', '.', 'table'), os.path.join('data', 'table')),
+])
+def test_canonical_url(url: str, expected: str):
+    # execute
+    canonical_url = _interner().canonical_url(url)
+
+    # verify
+    assert canonical_url == expected
+
+
+def test_equivalent_urls_share_data_source():
+    # prepare
+    interner = _interner()
+
+    # execute
+    ds1 = interner.data_source('s3a://bucket/table')
+    ds2 = interner.data_source(DataSource('S3://BUCKET/table'))
+    ds3 = interner.data_source('s3://bucket/table')
+
+    # verify
+    assert ds1 == DataSource('s3://bucket/table')
+    assert ds1 is ds2 is ds3
+
+
+def test_data_sources_in_use_stay_shared_when_table_is_full():
+    # prepare
+    interner = _interner(max_size=4)
+    ds = interner.data_source('s3://bucket/table')
+
+    # execute
+    for i in range(10):
+        interner.data_source(f's3://bucket/other-{i}')
+    gc.collect()
+
+    # verify
+    assert interner.data_source('s3a://bucket/table') is ds
+
+
+def test_canonicalization_disabled_by_default():
+    # prepare
+    interner = DataSourceInterner()
+
+    # execute
+    ds = interner.data_source('s3a://bucket/table/')
+
+    # verify
+    assert ds == DataSource('s3a://bucket/table/')
+
+
+def test_default_config_keeps_urls_as_they_are():
+    # execute
+    plan = _plan('S3A://bucket/data//table/', {})
+
+    # verify
+    assert plan.operations.reads[0].inputSources == ('S3A://bucket/data//table/',)
+
+
+def _plan(url: str, settings: dict) -> ExecutionPlan:
+    mock_disp: LineageDispatcherMock = create_autospec(LineageDispatcher)
+
+    @spline_agent.track_lineage(dispatcher=mock_disp, system_info=_DUMMY_NV, config=DictConfiguration(settings))
+    @spline_agent.inputs('{src}')
+    @spline_agent.output('s3://bucket/out', WriteMode.OVERWRITE)
+    def test_func(src: str):
+        pass
+
+    test_func(url)
+    return mock_disp.send_plan.call_args.args[0]
+
+
+def test_equivalent_urls_result_in_same_plan_id():
+    # execute
+    settings = {'spline.data_sources.canonicalize': True, 'spline.data_sources.scheme_aliases': _S3_ALIASES}
+    plan1 = _plan('s3://bucket/data/table', settings)
+    plan2 = _plan('S3A://Bucket/data/table', settings)
+
+    # verify
+    assert plan1.id == plan2.id
+    assert plan2.operations.reads[0].inputSources == ('s3://bucket/data/table',)
+
+
+def test_configured_scheme_aliases():
+    # execute
+    plan = _plan('abfss://container/table', {
+        'spline.data_sources.canonicalize': True,
+        'spline.data_sources.scheme_aliases': {'abfss': 'abfs'},
+    })
+
+    # verify
+    assert plan.operations.reads[0].inputSources == ('abfs://container/table',)
+    assert data_source_interner.data_source('s3a://bucket').url == 's3a://bucket'
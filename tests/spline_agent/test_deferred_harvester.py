@@ -0,0 +1,156 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import os
+import threading
+from unittest.mock import create_autospec, patch
+
+import pytest
+
+import spline_agent
+from spline_agent.context import LineageTrackingContext
+from spline_agent.datasources import DataSource
+from spline_agent.deferred_harvester import DeferredHarvester, ExecutionRecord, get_deferred_harvester
+from spline_agent.dispatcher import LineageDispatcher
+from spline_agent.enums import WriteMode
+from spline_agent.exceptions import LineageTrackingContextIncompleteError
+from spline_agent.lineage_model import NameAndVersion, ExecutionEvent
+from .mocks import LineageDispatcherMock
+
+_DUMMY_NV = NameAndVersion(name="dummy", version="dummy")
+
+
+def test_deferred_harvesting():
+    # prepare
+    mock_disp: LineageDispatcherMock = create_autospec(LineageDispatcher)
+
+    @spline_agent.track_lineage(dispatcher=mock_disp, system_info=_DUMMY_NV, deferred=True)
+    @spline_agent.inputs('{x}')
+    @spline_agent.output(DataSource('dummy_out'), WriteMode.APPEND)
+    def test_func(x: str):
+        return x
+
+    # execute
+    assert test_func('dummy_in') == 'dummy_in'
+    get_deferred_harvester(10_000).flush()
+
+    # verify
+    mock_disp.send_plan.assert_called_once()
+    mock_disp.send_event.assert_called_once()
+
+    captured_event: ExecutionEvent = mock_disp.send_event.call_args.args[0]
+    assert captured_event.planId == mock_disp.send_plan.call_args.args[0].id
+    assert captured_event.error is None
+
+
+def test_deferred_harvesting__incomplete_context_fails_on_caller_thread():
+    # prepare
+    mock_disp: LineageDispatcherMock = create_autospec(LineageDispatcher)
+
+    @spline_agent.track_lineage(dispatcher=mock_disp, system_info=_DUMMY_NV, deferred=True)
+    def test_func():
+        pass
+
+    # execute and verify
+    with pytest.raises(LineageTrackingContextIncompleteError):
+        test_func()
+
+
+def test_records_are_dropped_when_queue_is_full():
+    # prepare
+    in_dispatcher = threading.Event()
+    release_dispatcher = threading.Event()
+
+    def blocking_send_plan(_):
+        in_dispatcher.set()
+        release_dispatcher.wait(10)
+
+    mock_disp: LineageDispatcherMock = create_autospec(LineageDispatcher)
+    mock_disp.send_plan.side_effect = blocking_send_plan
+
+    ctx = LineageTrackingContext()
+    ctx.name = 'dummy'
+    ctx.output = DataSource('dummy')
+    ctx.write_mode = WriteMode.OVERWRITE
+    ctx.system_info = _DUMMY_NV
+
+    record = ExecutionRecord(ctx, test_records_are_dropped_when_queue_is_full, 0, 0, None, mock_disp)
+    harvester = DeferredHarvester(queue_size=1)
+
+    # execute
+    accepted_1 = harvester.submit(record)
+    in_dispatcher.wait(10)
+    accepted_2 = harvester.submit(record)
+    accepted_3 = harvester.submit(record)
+    release_dispatcher.set()
+    harvester.flush()
+
+    # verify
+    assert (accepted_1, accepted_2, accepted_3) == (True, True, False)
+    assert harvester.dropped == 1
+    assert harvester.queue_depth == 0
+    assert mock_disp.send_event.call_count == 2
+
+
+def _record(dispatcher: LineageDispatcher) -> ExecutionRecord:
+    ctx = LineageTrackingContext()
+    ctx.name = 'dummy'
+    ctx.output = DataSource('dummy')
+    ctx.write_mode = WriteMode.OVERWRITE
+    ctx.system_info = _DUMMY_NV
+    return ExecutionRecord(ctx, _record, 0, 0, None, dispatcher)
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='requires fork()')
+def test_forked_child_harvests_with_its_own_worker():
+    # prepare
+    release_dispatcher = threading.Event()
+    blocked_disp: LineageDispatcherMock = create_autospec(LineageDispatcher)
+    blocked_disp.send_plan.side_effect = lambda _: release_dispatcher.wait(10)
+    child_disp: LineageDispatcherMock = create_autospec(LineageDispatcher)
+    harvester = DeferredHarvester(queue_size=10)
+    harvester.submit(_record(blocked_disp))
+    harvester.submit(_record(blocked_disp))
+    read_fd, write_fd = os.pipe()
+
+    # execute
+    pid = os.fork()
+    if pid == 0:
+        harvester.submit(_record(child_disp))
+        harvester.flush()
+        os.write(write_fd, str(child_disp.send_event.call_count).encode())
+        os._exit(0)
+    os.close(write_fd)
+    os.waitpid(pid, 0)
+    with os.fdopen(read_fd) as f:
+        child_events = int(f.read())
+    release_dispatcher.set()
+    harvester.flush()
+
+    # verify
+    assert child_events == 1
+    assert blocked_disp.send_event.call_count == 2
+
+
+def test_different_queue_size_is_reported():
+    # prepare
+    queue_size = get_deferred_harvester(10_000).queue_size
+
+    # execute
+    with patch('spline_agent.deferred_harvester.logger') as logger:
+        harvester = get_deferred_harvester(queue_size + 1)
+
+    # verify
+    assert harvester.queue_size == queue_size
+    logger.warning.assert_called_once()
@@ -0,0 +1,75 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import os
+import subprocess
+import sys
+from typing import Optional
+
+import spline_agent
+
+# Total self time of the modules that `import spline_agent` adds on top of a bare interpreter start up.
+# Can be overridden for slow CI machines.
+IMPORT_TIME_BUDGET_MS = float(os.environ.get('SPLINE_TEST_IMPORT_TIME_BUDGET_MS', 100))
+
+# Must only be imported on the first use, i.e. on the first config read, the dispatcher instantiation,
+# or the decoration of a function with the runtime calls recording enabled
+LAZY_MODULES = ('dynaconf', 'requests', 'http_constants', 'importlib.metadata', 'http.server',
+                'spline_agent.call_recorder')
+
+
+def _import_times(statement: str, pycache_prefix: Optional[str] = None) -> dict[str, int]:
+    """
+    Runs the statement in a fresh interpreter, and returns the self import time in microseconds per module.
+    With the `pycache_prefix` the compiled modules are cached there, as they are in an installed package,
+    even if writing the bytecode is disabled in the environment, so the compilation time isn't measured.
+    """
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(spline_agent.__file__)))
+    if pycache_prefix is not None:
+        env.pop('PYTHONDONTWRITEBYTECODE', None)
+        env['PYTHONPYCACHEPREFIX'] = pycache_prefix
+    stderr = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        env=env, check=True, capture_output=True, text=True).stderr
+    times = {}
+    for line in stderr.splitlines():
+        self_us, _, module = line[len('import time:'):].split('|')
+        if self_us.strip().isdigit():
+            times[module.strip()] = int(self_us)
+    return times
+
+
+def test_heavy_dependencies_are_imported_lazily():
+    # execute
+    imported = _import_times('import spline_agent').keys() - _import_times('pass').keys()
+
+    # verify
+    assert 'spline_agent' in imported
+    assert [m for m in imported if any(m == lm or m.startswith(f'{lm}.') for lm in LAZY_MODULES)] == []
+
+
+def test_import_time_budget(tmp_path):
+    # prepare
+    pycache_prefix = str(tmp_path)
+    baseline = _import_times('pass', pycache_prefix).keys()
+    _import_times('import spline_agent', pycache_prefix)
+
+    # execute
+    best_ms = min(
+        sum(us for module, us in _import_times('import spline_agent', pycache_prefix).items()
+            if module not in baseline) / 1000
+        for _ in range(5))
+
+    # verify
+    assert best_ms <= IMPORT_TIME_BUDGET_MS
@@ -0,0 +1,116 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+from unittest.mock import create_autospec
+
+import pytest
+
+import spline_agent
+from spline_agent.commons.configuration import DictConfiguration
+from spline_agent.commons.histogram import Histogram
+from spline_agent.datasources import DataSource
+from spline_agent.dispatcher import LineageDispatcher
+from spline_agent.dispatchers.console_dispatcher import ConsoleLineageDispatcher
+from spline_agent.enums import WriteMode
+from spline_agent.instrumentation import overhead_stats, Phase
+from spline_agent.lineage_model import NameAndVersion, ExecutionEvent
+from .mocks import LineageDispatcherMock
+
+_DUMMY_NV = NameAndVersion(name="dummy", version="dummy")
+
+
+@pytest.fixture(autouse=True)
+def reset_overhead_stats():
+    overhead_stats.reset()
+    yield
+    overhead_stats.disable()
+    overhead_stats.reset()
+
+
+def _tracked_func(dispatcher: LineageDispatcher, instrumentation: bool = False, attach_to_event: bool = False):
+    config = DictConfiguration({
+        'spline.instrumentation.enabled': instrumentation,
+        'spline.instrumentation.attach_to_event': attach_to_event,
+    })
+
+    @spline_agent.track_lineage(name='{x}', dispatcher=dispatcher, system_info=_DUMMY_NV, config=config)
+    @spline_agent.output(DataSource('dummy'), WriteMode.APPEND)
+    def test_func(x: str):
+        return x
+
+    return test_func
+
+
+def test_histogram():
+    # prepare
+    histogram = Histogram(bounds=(10, 100))
+
+    # execute
+    for value in (1, 10, 11, 1000):
+        histogram.observe(value)
+
+    # verify
+    assert histogram.snapshot() == (1022, 4, (2, 3))
+
+
+def test_stats_are_not_collected_when_disabled():
+    # execute
+    _tracked_func(ConsoleLineageDispatcher())('foo')
+
+    # verify
+    assert all(phase_stats['count'] == 0 for phase_stats in spline_agent.stats().values())
+
+
+def test_instrumentation_is_toggled_by_the_configuration():
+    # execute
+    _tracked_func(ConsoleLineageDispatcher(), instrumentation=True, attach_to_event=True)
+    enabled = (overhead_stats.enabled, overhead_stats.attach_to_event)
+    _tracked_func(ConsoleLineageDispatcher())('foo')
+
+    # verify
+    assert enabled == (True, True)
+    assert (overhead_stats.enabled, overhead_stats.attach_to_event) == (False, False)
+    assert all(phase_stats['count'] == 0 for phase_stats in spline_agent.stats().values())
+
+
+def test_stats_are_collected_per_phase():
+    # execute
+    _tracked_func(ConsoleLineageDispatcher(), instrumentation=True)('foo')
+    _tracked_func(ConsoleLineageDispatcher(), instrumentation=True)('bar')
+
+    # verify
+    stats = spline_agent.stats()
+    for phase in (Phase.SPEL_EVALUATION, Phase.CONTEXT_SETUP, Phase.HARVEST, Phase.PLAN_ID_HASHING, Phase.DISPATCH):
+        assert stats[phase.value]['count'] == 2
+        assert stats[phase.value]['buckets_ns']['+Inf'] == 2
+        assert stats[phase.value]['sum_ns'] > 0
+    # plan hashing + printing plan and event, per call
+    assert stats[Phase.SERIALIZATION.value]['count'] == 6
+
+
+def test_timings_attached_to_event():
+    # prepare
+    mock_disp: LineageDispatcherMock = create_autospec(LineageDispatcher)
+
+    # execute
+    _tracked_func(mock_disp, instrumentation=True, attach_to_event=True)('foo')
+
+    # verify
+    captured_event: ExecutionEvent = mock_disp.send_event.call_args.args[0]
+    assert set(captured_event.extra['agent_overhead_ns']) == {
+        Phase.SPEL_EVALUATION.value,
+        Phase.CONTEXT_SETUP.value,
+        Phase.HARVEST.value,
+        Phase.PLAN_ID_HASHING.value,
+    }
@@ -0,0 +1,82 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+import copy
+import dataclasses
+import pickle
+
+import pytest
+
+from spline_agent.context import LineageTrackingContext
+from spline_agent.datasources import DataSource
+from spline_agent.enums import WriteMode
+from spline_agent.harvester import harvest_lineage
+from spline_agent.lineage_model import NameAndVersion
+
+_DUMMY_NV = NameAndVersion(name="dummy", version="dummy")
+
+
+def tracked_func():
+    pass
+
+
+def _harvest():
+    ctx = LineageTrackingContext()
+    ctx.name = 'tracked_func'
+    ctx.system_info = _DUMMY_NV
+    # the URLs are built at runtime, so that they are not the same string constants
+    ctx.add_input(DataSource(''.join(['s3://bucket/', 'in'])))
+    ctx.output = DataSource(''.join(['s3://bucket/', 'out']))
+    ctx.write_mode = WriteMode.OVERWRITE
+    return harvest_lineage(ctx, tracked_func, 1, None)
+
+
+def test_model_is_immutable_and_slotted():
+    # execute
+    lineage = _harvest()
+
+    # verify
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        lineage.plan.id = None  # type: ignore
+    assert lineage.plan.id is not None
+    assert not hasattr(lineage.plan, '__dict__')
+    assert not hasattr(lineage.plan.operations.write, '__dict__')
+
+
+def test_model_can_be_pickled_and_copied():
+    # prepare
+    lineage = _harvest()
+
+    # execute
+    unpickled = pickle.loads(pickle.dumps(lineage.plan.operations))
+    copied = copy.deepcopy(lineage.plan.operations)
+
+    # verify
+    assert unpickled == lineage.plan.operations
+    assert copied == lineage.plan.operations
+
+
+def test_operation_ids_and_urls_are_shared_between_plans():
+    # execute
+    plan1 = _harvest().plan
+    plan2 = _harvest().plan
+
+    # verify
+    assert plan1.id == plan2.id
+    assert plan1.operations.write.id is plan2.operations.write.id
+    assert plan1.operations.write.outputSource is plan2.operations.write.outputSource
+    assert plan1.operations.reads[0].id is plan2.operations.reads[0].id
+    assert plan1.operations.reads[0].inputSources[0] is plan2.operations.reads[0].inputSources[0]
+    assert plan1.operations.other[0].childIds is plan2.operations.other[0].childIds
@@ -0,0 +1,127 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import socket
+import urllib.request
+from unittest.mock import Mock, patch
+
+from spline_agent import metrics
+from spline_agent.commons.configuration import DictConfiguration
+from spline_agent.dispatchers.console_dispatcher import ConsoleLineageDispatcher
+from spline_agent.lineage_model import ExecutionPlan
+from spline_agent.metrics import MetricsRegistry, MetricsHttpServer, MetricsFileWriter, PLANS_SENT, PAYLOAD_BYTES, \
+    configure_metrics
+
+
+def _test_registry() -> MetricsRegistry:
+    registry = MetricsRegistry()
+    counter = registry.counter('test_requests_total', 'Test "requests"\nsent', ('status',))
+    counter.inc(status='200')
+    counter.inc(2, status='500')
+    registry.gauge('test_depth', 'Test depth').set_function(lambda: 7)
+    histogram = registry.histogram('test_latency_seconds', 'Test latency', ('kind',), bounds=(0.1, 1))
+    histogram.observe(0.05, kind='a"b')
+    histogram.observe(0.5, kind='a"b')
+    return registry
+
+
+def test_render_prometheus_text_format():
+    # execute
+    text = _test_registry().render()
+
+    # verify
+    assert text == (
+        '# HELP test_requests_total Test "requests"\\nsent\n'
+        '# TYPE test_requests_total counter\n'
+        'test_requests_total{status="200"} 1\n'
+        'test_requests_total{status="500"} 2\n'
+        '# HELP test_depth Test depth\n'
+        '# TYPE test_depth gauge\n'
+        'test_depth 7\n'
+        '# HELP test_latency_seconds Test latency\n'
+        '# TYPE test_latency_seconds histogram\n'
+        'test_latency_seconds_bucket{kind="a\\"b",le="0.1"} 1\n'
+        'test_latency_seconds_bucket{kind="a\\"b",le="1"} 2\n'
+        'test_latency_seconds_bucket{kind="a\\"b",le="+Inf"} 2\n'
+        'test_latency_seconds_sum{kind="a\\"b"} 0.55\n'
+        'test_latency_seconds_count{kind="a\\"b"} 2\n'
+    )
+
+
+def test_http_server():
+    # prepare
+    registry = _test_registry()
+    server = MetricsHttpServer(registry, '127.0.0.1', 0)
+    server.start()
+
+    # execute
+    try:
+        with urllib.request.urlopen(f'http://127.0.0.1:{server.port}/metrics') as res:
+            body = res.read().decode('utf-8')
+    finally:
+        server.stop()
+
+    # verify
+    assert body == registry.render()
+
+
+def test_agent_works_on_when_http_port_is_in_use():
+    # prepare
+    with socket.socket() as taken:
+        taken.bind(('127.0.0.1', 0))
+        taken.listen()
+        config = DictConfiguration({
+            'spline.metrics.http_port': taken.getsockname()[1],
+            'spline.metrics.http_host': '127.0.0.1',
+            'spline.metrics.file': None,
+        })
+
+        # execute
+        with patch('spline_agent.metrics._http_server', None), \
+                patch('spline_agent.metrics._unavailable_http_port', None), \
+                patch('spline_agent.metrics.logger') as logger:
+            configure_metrics(config)
+            configure_metrics(config)
+
+            # verify
+            assert metrics._http_server is None
+    logger.warning.assert_called_once()
+
+
+def test_file_writer(tmp_path):
+    # prepare
+    registry = _test_registry()
+    file_path = tmp_path / 'spline.prom'
+
+    # execute
+    MetricsFileWriter(registry, str(file_path), 60).write()
+
+    # verify
+    assert file_path.read_text() == registry.render()
+
+
+def test_dispatched_lineage_is_counted():
+    # prepare
+    plans_before = PLANS_SENT.value(dispatcher='console')
+    bytes_before = PAYLOAD_BYTES.value(dispatcher='console', kind='plan')
+    dispatcher = ConsoleLineageDispatcher()
+    dummy_plan: ExecutionPlan = Mock()
+
+    # execute
+    with patch('spline_agent.dispatchers.console_dispatcher.to_pretty_json_str', return_value='{"ü": 1}'):
+        dispatcher.send_plan(dummy_plan)
+
+    # verify
+    assert PLANS_SENT.value(dispatcher='console') == plans_before + 1
+    assert PAYLOAD_BYTES.value(dispatcher='console', kind='plan') == bytes_before + 9
@@ -0,0 +1,189 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import os
+import signal
+from typing import Optional
+from unittest.mock import create_autospec
+
+import pytest
+
+import spline_agent
+from spline_agent.context import get_tracking_context, LineageTrackingContext
+from spline_agent.datasources import DataSource
+from spline_agent.dispatcher import LineageDispatcher
+from spline_agent.enums import SplineMode, WriteMode
+from spline_agent.exceptions import LineageTrackingContextNotInitializedError
+from spline_agent.lineage_model import NameAndVersion
+from spline_agent.mode_switch import mode_switch, ModeSwitch, ModeWatcher
+from .mocks import LineageDispatcherMock
+
+
+@pytest.fixture(autouse=True)
+def reset_mode_switch():
+    yield
+    mode_switch.reset_mode()
+
+
+def test_runtime_mode_override():
+    # prepare
+    mock_disp: LineageDispatcherMock = create_autospec(LineageDispatcher)
+    dummy_nv = NameAndVersion(name="dummy", version="dummy")
+
+    @spline_agent.track_lineage(dispatcher=mock_disp, system_info=dummy_nv)
+    @spline_agent.output(DataSource('dummy'), WriteMode.APPEND)
+    def test_func():
+        return 42
+
+    # execute and verify
+    spline_agent.set_mode(SplineMode.DISABLED)
+    assert test_func() == 42
+    mock_disp.send_event.assert_not_called()
+
+    spline_agent.set_mode(SplineMode.BYPASS)
+    assert test_func() == 42
+    mock_disp.send_event.assert_not_called()
+
+    spline_agent.set_mode(None)
+    assert test_func() == 42
+    mock_disp.send_event.assert_called_once()
+
+
+def test_runtime_mode_override__disabled_gives_no_context():
+    # prepare
+    @spline_agent.track_lineage(mode=SplineMode.BYPASS)
+    def test_func():
+        get_tracking_context()
+
+    # execute and verify
+    test_func()
+    spline_agent.set_mode(SplineMode.DISABLED)
+    with pytest.raises(LineageTrackingContextNotInitializedError):
+        test_func()
+
+
+def test_runtime_mode_override__disabled_during_the_call():
+    # prepare
+    mock_disp: LineageDispatcherMock = create_autospec(LineageDispatcher)
+    dummy_nv = NameAndVersion(name="dummy", version="dummy")
+
+    @spline_agent.output(DataSource('dummy'), WriteMode.APPEND)
+    def write():
+        pass
+
+    @spline_agent.track_lineage(dispatcher=mock_disp, system_info=dummy_nv)
+    def test_func():
+        spline_agent.set_mode(SplineMode.DISABLED)
+        write()
+
+    # execute
+    test_func()
+
+    # verify
+    # the mode is fixed when the tracked call is entered
+    mock_disp.send_event.assert_called_once()
+
+
+@pytest.mark.parametrize('mode', [SplineMode.DISABLED, SplineMode.BYPASS])
+def test_runtime_mode_override__io_decorators_outside_tracked_call(mode: SplineMode):
+    # prepare
+    @spline_agent.output(DataSource('dummy'), WriteMode.APPEND)
+    def write():
+        return 42
+
+    # execute and verify
+    with pytest.raises(LineageTrackingContextNotInitializedError):
+        write()
+    spline_agent.set_mode(mode)
+    assert write() == 42
+
+
+def test_runtime_mode_override__enable_bypassed_function():
+    # prepare
+    mock_disp: LineageDispatcherMock = create_autospec(LineageDispatcher)
+    ctx: Optional[LineageTrackingContext] = None
+
+    @spline_agent.track_lineage(mode=SplineMode.BYPASS, dispatcher=mock_disp)
+    @spline_agent.output(DataSource('dummy'), WriteMode.APPEND)
+    def test_func():
+        nonlocal ctx
+        ctx = get_tracking_context()
+
+    # execute
+    spline_agent.set_mode(SplineMode.ENABLED)
+    test_func()
+
+    # verify
+    assert isinstance(ctx, LineageTrackingContext)
+    mock_disp.send_plan.assert_called_once()
+    mock_disp.send_event.assert_called_once()
+
+
+def test_signal_handler():
+    # prepare
+    switch = ModeSwitch()
+    original_handler = signal.getsignal(signal.SIGUSR1)
+
+    try:
+        switch.install_signal_handler(signal.SIGUSR1, SplineMode.BYPASS)
+
+        # execute
+        signal.raise_signal(signal.SIGUSR1)
+
+        # verify
+        assert switch.mode is SplineMode.BYPASS
+    finally:
+        signal.signal(signal.SIGUSR1, original_handler)
+
+
+def test_watcher__file_takes_precedence_over_env_var(tmp_path, set_env_vars):
+    # prepare
+    switch = ModeSwitch()
+    file_path = tmp_path / 'spline.mode'
+    watcher = ModeWatcher(switch, str(file_path), 'TEST_SPLINE_MODE', 60)
+
+    # execute and verify
+    watcher.poll()
+    assert switch.mode is None
+
+    set_env_vars({'TEST_SPLINE_MODE': 'bypass'})
+    watcher.poll()
+    assert switch.mode is SplineMode.BYPASS
+
+    file_path.write_text('DISABLED\n')
+    watcher.poll()
+    assert switch.mode is SplineMode.DISABLED
+
+    # a value that didn't change is not re-applied
+    switch.set_mode(SplineMode.ENABLED)
+    watcher.poll()
+    assert switch.mode is SplineMode.ENABLED
+
+    os.remove(file_path)
+    watcher.poll()
+    assert switch.mode is SplineMode.BYPASS
+
+
+def test_watcher__invalid_value_is_ignored(tmp_path):
+    # prepare
+    switch = ModeSwitch()
+    file_path = tmp_path / 'spline.mode'
+    file_path.write_text('NO_SUCH_MODE')
+    watcher = ModeWatcher(switch, str(file_path), None, 60)
+
+    # execute
+    watcher.poll()
+
+    # verify
+    assert switch.mode is None
@@ -0,0 +1,129 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import io
+import json
+
+import pytest
+
+from spline_agent import msgpack_codec
+from spline_agent.dispatchers.msgpack_dispatcher import MsgpackLineageDispatcher
+from spline_agent.json_serde import to_compact_json_str
+from spline_agent.lineage_file import EVENT_KIND, PLAN_KIND, read_records
+from spline_agent.lineage_model import Lineage
+from spline_agent.msgpack_codec import encode_frame, packb, read_frames, unpackb
+from .lineage_fixtures import dummy_lineage
+
+
+def _lineage() -> Lineage:
+    return dummy_lineage(error='boom', event_extra={'job': {'attempt': 2, 'ratio': 0.5}})
+
+
+@pytest.fixture(params=[True, False], ids=['default', 'pure_python'])
+def codec(request, monkeypatch):
+    if not request.param:
+        monkeypatch.setattr(msgpack_codec, '_NATIVE', False)
+    yield
+
+
+@pytest.mark.parametrize('value, expected_hex', [
+    (None, 'c0'),
+    (True, 'c3'),
+    (127, '7f'),
+    (128, 'cc80'),
+    (-32, 'e0'),
+    (-33, 'd0df'),
+    (70000, 'ce00011170'),
+    (-2 ** 40, 'd3ffffff0000000000'),
+    (1.5, 'cb3ff8000000000000'),
+    ('a' * 32, 'd920' + '61' * 32),
+    (b'\x01', 'c40101'),
+    ([1, [2]], '920191' + '02'),
+    ({'a': None}, '81a161c0'),
+])
+def test_pack_format(codec, value, expected_hex):
+    # execute
+    packed = packb(value)
+
+    # verify
+    assert packed.hex() == expected_hex
+    assert unpackb(packed) == value
+
+
+def test_lineage_round_trip_matches_json(codec):
+    # prepare
+    lineage = _lineage()
+
+    # execute
+    plan = unpackb(packb(lineage.plan))
+    event = unpackb(packb(lineage.event))
+
+    # verify
+    assert plan == json.loads(to_compact_json_str(lineage.plan))
+    assert event == json.loads(to_compact_json_str(lineage.event))
+    assert event['extra']['job'] == {'attempt': 2, 'ratio': 0.5}
+
+
+def test_same_bytes_as_msgpack_package():
+    # prepare
+    msgpack = pytest.importorskip('msgpack')
+    lineage = _lineage()
+    expected = msgpack.packb(json.loads(to_compact_json_str(lineage.plan)))
+
+    # execute
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(msgpack_codec, '_NATIVE', False)
+        packed = packb(lineage.plan)
+
+    # verify
+    assert packed == expected
+
+
+def test_frames_skip_a_truncated_tail(codec):
+    # prepare
+    plan_frame = encode_frame(PLAN_KIND, {'id': 'p1'})
+    event_frame = encode_frame(EVENT_KIND, {'planId': 'p1'})
+    stream = io.BytesIO(plan_frame + event_frame + encode_frame(EVENT_KIND, {'planId': 'p2'})[:-1])
+
+    # execute
+    frames = list(read_frames(stream))
+
+    # verify
+    assert frames == [(PLAN_KIND, {'id': 'p1'}, len(plan_frame)), (EVENT_KIND, {'planId': 'p1'}, len(event_frame))]
+
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_dispatcher_writes_binary_lineage_files(tmp_path, compress):
+    # prepare
+    path = tmp_path / 'lineage.msgpack'
+    lineage = _lineage()
+    dispatcher = MsgpackLineageDispatcher(str(path), 1, None, 1000, None, compress)
+
+    # execute
+    dispatcher.send_plan(lineage.plan)
+    for _ in range(30):
+        dispatcher.send_event(lineage.event)
+    dispatcher.close()
+
+    # verify
+    files = sorted(str(p) for p in tmp_path.iterdir())
+    rotated = [f for f in files if f != str(path)]
+    assert len(rotated) > 1
+    assert all(f.endswith('.msgpack.gz' if compress else '.msgpack') for f in rotated)
+    records = [r for f in files for r in read_records(f)]
+    assert [r.kind for r in records] == [PLAN_KIND] + [EVENT_KIND] * 30
+    assert records[0].data == json.loads(to_compact_json_str(lineage.plan))
+    first_file = [r for r in records if r.line == 1][0]
+    assert list(read_records(files[0], first_file.line, first_file.offset)) == [
+        r for r in read_records(files[0]) if r.line > 1]
@@ -0,0 +1,98 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+from unittest.mock import create_autospec
+
+import spline_agent
+from spline_agent.context import LineageTrackingContext, TrackedOutput
+from spline_agent.datasources import DataSource
+from spline_agent.dispatcher import LineageDispatcher
+from spline_agent.enums import WriteMode
+from spline_agent.lineage_model import NameAndVersion, ExecutionPlan, ExecutionEvent
+from .mocks import LineageDispatcherMock
+
+_DUMMY_NV = NameAndVersion(name="dummy", version="dummy")
+
+
+def test_plan_per_output():
+    # prepare
+    mock_disp: LineageDispatcherMock = create_autospec(LineageDispatcher)
+
+    @spline_agent.track_lineage(dispatcher=mock_disp, system_info=_DUMMY_NV)
+    @spline_agent.inputs('{orders}', '{customers}')
+    @spline_agent.output('{report}', WriteMode.OVERWRITE)
+    @spline_agent.add_output('{archive}', WriteMode.APPEND, input_sources=['{orders}'])
+    def split_func(orders: str, customers: str, report: str, archive: str):
+        pass
+
+    # execute
+    split_func('orders', 'customers', 'report', 'archive')
+
+    # verify
+    plans: list[ExecutionPlan] = [c.args[0] for c in mock_disp.send_plan.call_args_list]
+    events: list[ExecutionEvent] = [c.args[0] for c in mock_disp.send_event.call_args_list]
+    assert [e.planId for e in events] == [p.id for p in plans]
+    assert len({p.id for p in plans}) == 2
+
+    report_plan, archive_plan = plans
+    assert report_plan.operations.write.outputSource == 'report'
+    assert report_plan.operations.write.append is False
+    assert [r.inputSources for r in report_plan.operations.reads] == [('orders',), ('customers',)]
+    assert report_plan.operations.other[0].childIds == ('op-2', 'op-3')
+
+    assert archive_plan.operations.write.outputSource == 'archive'
+    assert archive_plan.operations.write.append is True
+    assert [r.inputSources for r in archive_plan.operations.reads] == [('orders',)]
+    assert archive_plan.operations.other[0].childIds == ('op-2',)
+
+
+def test_primary_output_plan_is_not_affected_by_other_outputs():
+    # prepare
+    mock_disp: LineageDispatcherMock = create_autospec(LineageDispatcher)
+
+    def func():
+        pass
+
+    single_output_func = spline_agent.track_lineage(dispatcher=mock_disp, system_info=_DUMMY_NV)(
+        spline_agent.output('out', WriteMode.OVERWRITE)(func))
+    multi_output_func = spline_agent.track_lineage(dispatcher=mock_disp, system_info=_DUMMY_NV)(
+        spline_agent.output('out', WriteMode.OVERWRITE)(
+            spline_agent.add_output('other', WriteMode.OVERWRITE)(func)))
+
+    # execute
+    single_output_func()
+    multi_output_func()
+
+    # verify
+    plan_ids = [c.args[0].id for c in mock_disp.send_plan.call_args_list]
+    assert len(plan_ids) == 3
+    assert plan_ids[0] == plan_ids[1]
+
+
+def test_first_added_output_becomes_primary():
+    # prepare
+    ctx = LineageTrackingContext()
+
+    # execute
+    ctx.add_output(DataSource('a'), WriteMode.APPEND, [DataSource('in')])
+    ctx.add_output(DataSource('b'), WriteMode.OVERWRITE)
+
+    # verify
+    assert ctx.output == DataSource('a')
+    assert ctx.write_mode == WriteMode.APPEND
+    assert ctx.outputs == (
+        TrackedOutput(DataSource('a'), WriteMode.APPEND, (DataSource('in'),)),
+        TrackedOutput(DataSource('b'), WriteMode.OVERWRITE),
+    )
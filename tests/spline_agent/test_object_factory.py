@@ -49,6 +49,15 @@ class Watermelon(FruitOrBerry):
         return self.__color
 
 
+class FruitBasket(FruitOrBerry):
+    def __init__(self, fruits: list[str], object_factory: ObjectFactory):
+        self.fruits = [object_factory.instantiate_named(FruitOrBerry, name) for name in fruits]
+
+    @property
+    def color(self) -> str:
+        return ', '.join(f.color for f in self.fruits)
+
+
 def test_create_object__default_constructor():
     # prepare
     test_conf = DictConfiguration({
@@ -90,3 +99,26 @@ def test_create_object__constructor_with_params():
     assert watermelon.color == 'whitish'
     assert watermelon.kind == MelonKind.KORDOFAN
     assert watermelon.weight == 5
+
+
+def test_create_object__by_name_with_factory_injected():
+    # prepare
+    test_conf = DictConfiguration({
+        'spline.fruit_or_berry.type': 'basket',
+        'spline.fruit_or_berry.basket.class_name': f'{FruitBasket.__module__}.{FruitBasket.__name__}',
+        'spline.fruit_or_berry.basket.fruits': ['banana', 'watermelon'],
+        'spline.fruit_or_berry.banana.class_name': f'{Banana.__module__}.{Banana.__name__}',
+        'spline.fruit_or_berry.watermelon.class_name': f'{Watermelon.__module__}.{Watermelon.__name__}',
+        'spline.fruit_or_berry.watermelon.color': 'green',
+        'spline.fruit_or_berry.watermelon.weight': 5,
+        'spline.fruit_or_berry.watermelon.kind': 'DOMESTICATED',
+    })
+
+    factory = ObjectFactory(test_conf)
+
+    # execute
+    obj: FruitOrBerry = factory.instantiate(FruitOrBerry)
+
+    # verify
+    assert obj.__class__ == FruitBasket
+    assert obj.color == 'yellow, green'
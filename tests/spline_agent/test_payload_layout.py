@@ -0,0 +1,108 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import json
+from typing import Any
+from unittest.mock import create_autospec
+
+import pytest
+
+import spline_agent
+from spline_agent.commons.configuration import DictConfiguration
+from spline_agent.dispatcher import LineageDispatcher
+from spline_agent.enums import WriteMode
+from spline_agent.json_serde import PreSerializedMapping, to_compact_json_str
+from spline_agent.lineage_model import NameAndVersion, ExecutionEvent, ExecutionPlan
+from spline_agent.payload_layout import payload_layout
+from .mocks import LineageDispatcherMock
+
+_DUMMY_NV = NameAndVersion(name="dummy", version="dummy")
+
+
+@pytest.fixture(autouse=True)
+def reset_payload_layout():
+    yield
+    payload_layout.reset()
+
+
+def _run_tracked_func(settings: dict[str, Any], error: str = 'dummy') -> tuple[ExecutionPlan, ExecutionEvent]:
+    mock_disp: LineageDispatcherMock = create_autospec(LineageDispatcher)
+
+    @spline_agent.track_lineage(dispatcher=mock_disp, system_info=_DUMMY_NV, config=DictConfiguration(settings))
+    @spline_agent.output('dummy', WriteMode.OVERWRITE)
+    def test_func():
+        with spline_agent.tracked_open(__file__, count_records=True) as f:
+            f.read()
+        raise ValueError(error)
+
+    with pytest.raises(ValueError):
+        test_func()
+
+    return mock_disp.send_plan.call_args.args[0], mock_disp.send_event.call_args.args[0]
+
+
+def test_environment_in_plan():
+    # execute
+    plan, event = _run_tracked_func({'spline.payload.environment': 'plan'})
+
+    # verify
+    assert plan.extraInfo['python_version']
+    assert 'python_version' not in event.extra
+    assert 'hostname' not in plan.extraInfo
+    assert event.extra['hostname']
+
+
+def test_environment_in_event():
+    # execute
+    plan_with_env_in_event, event = _run_tracked_func({'spline.payload.environment': 'event'})
+    plan_with_env_in_plan, _ = _run_tracked_func({'spline.payload.environment': 'plan'})
+
+    # verify
+    assert plan_with_env_in_event.extraInfo == {}
+    assert event.extra['python_version']
+    assert plan_with_env_in_event.id == plan_with_env_in_plan.id
+
+
+def test_event_fields_are_truncated():
+    # prepare
+    settings = {'spline.payload.event_field_limits': {'error': 10, 'extra': 30}}
+
+    # execute
+    _, event = _run_tracked_func(settings, error='x' * 100)
+
+    # verify
+    assert event.error == 'xxxxxxx...'
+    assert event.extra['data_volume'] == []
+    assert event.extra['truncated_fields'] == ['data_volume']
+    assert json.loads(to_compact_json_str(event))['extra']['truncated_fields'] == ['data_volume']
+
+
+def test_truncation_keeps_list_items_that_fit():
+    # prepare
+    payload_layout.extra_limits = {'items': 20, 'obj': 10, 'text': 5}
+
+    # execute
+    extra = payload_layout.event_extra(
+        environment=PreSerializedMapping({}),
+        own={'items': ['aaaa', 'bbbb', 'cccc'], 'obj': {'key': 'value'}, 'text': 'abcdefgh', 'other': 'x' * 100})
+
+    # verify
+    assert extra == {
+        'items': ['aaaa', 'bbbb'],
+        'obj': '{\n"key"...',
+        'text': 'ab...',
+        'other': 'x' * 100,
+        'truncated_fields': ['items', 'obj', 'text'],
+    }
+    assert len(to_compact_json_str(extra['items'])) <= 20
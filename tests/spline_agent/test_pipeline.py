@@ -0,0 +1,131 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+
+from unittest.mock import create_autospec
+
+import spline_agent
+from spline_agent.dispatcher import LineageDispatcher
+from spline_agent.enums import NestingPolicy, WriteMode
+from spline_agent.lineage_model import NameAndVersion, ExecutionPlan, ExecutionEvent
+from .mocks import LineageDispatcherMock
+
+_DUMMY_NV = NameAndVersion(name="dummy", version="dummy")
+
+
+def _pipeline(mock_disp: LineageDispatcherMock, nesting: NestingPolicy):
+    @spline_agent.track_lineage(dispatcher=mock_disp, system_info=_DUMMY_NV)
+    @spline_agent.inputs('{src}')
+    @spline_agent.output('{dst}', WriteMode.OVERWRITE)
+    def extract(src: str, dst: str):
+        pass
+
+    @spline_agent.track_lineage(dispatcher=mock_disp, system_info=_DUMMY_NV)
+    @spline_agent.inputs('{src}', 'dictionary')
+    @spline_agent.output('{dst}', WriteMode.OVERWRITE)
+    def transform(src: str, dst: str):
+        pass
+
+    @spline_agent.track_lineage(dispatcher=mock_disp, system_info=_DUMMY_NV)
+    @spline_agent.inputs('{src}', 'scratch')
+    @spline_agent.output('{dst}', WriteMode.APPEND)
+    def load(src: str, dst: str):
+        transform(src, 'scratch')
+
+    @spline_agent.track_lineage(dispatcher=mock_disp, system_info=_DUMMY_NV, nesting=nesting)
+    def run_pipeline():
+        extract('raw', 'staged')
+        transform('staged', 'clean')
+        load('clean', 'warehouse')
+
+    return run_pipeline
+
+
+def test_pipeline_is_reported_as_single_plan():
+    # prepare
+    mock_disp: LineageDispatcherMock = create_autospec(LineageDispatcher)
+    run_pipeline = _pipeline(mock_disp, NestingPolicy.PIPELINE)
+
+    # execute
+    run_pipeline()
+
+    # verify
+    mock_disp.send_plan.assert_called_once()
+    mock_disp.send_event.assert_called_once()
+    plan: ExecutionPlan = mock_disp.send_plan.call_args.args[0]
+    event: ExecutionEvent = mock_disp.send_event.call_args.args[0]
+
+    assert plan.name == 'run_pipeline'
+    assert plan.operations.write.outputSource == 'warehouse'
+    assert plan.operations.write.append is True
+    assert plan.operations.write.childIds == ('op-1',)
+    assert [(r.id, r.inputSources) for r in plan.operations.reads] == [
+        ('op-6', ('raw',)),
+        ('op-7', ('dictionary',)),
+    ]
+    assert [(op.id, op.name, op.childIds) for op in plan.operations.other] == [
+        ('op-1', 'Python script', ('op-5',)),
+        ('op-2', 'extract', ('op-6',)),
+        ('op-3', 'transform', ('op-2', 'op-7')),
+        ('op-4', 'transform', ('op-3', 'op-7')),  # nested in `load`
+        ('op-5', 'load', ('op-3', 'op-4')),
+    ]
+    assert plan.operations.other[2].extra['outputs'] == [{'url': 'clean', 'append': False}]
+
+    assert event.planId == plan.id
+    assert [(s['operation_id'], s['name'], s['error']) for s in event.extra['stages']] == [
+        ('op-2', 'extract', None),
+        ('op-3', 'transform', None),
+        ('op-4', 'transform', None),
+        ('op-5', 'load', None),
+    ]
+    assert all(s['duration_ns'] >= 0 for s in event.extra['stages'])
+
+
+def test_pipeline_plan_id_is_stable():
+    # prepare
+    mock_disp: LineageDispatcherMock = create_autospec(LineageDispatcher)
+    run_pipeline = _pipeline(mock_disp, NestingPolicy.PIPELINE)
+
+    # execute
+    run_pipeline()
+    run_pipeline()
+
+    # verify
+    plan_ids = [c.args[0].id for c in mock_disp.send_plan.call_args_list]
+    assert len(plan_ids) == 2
+    assert plan_ids[0] == plan_ids[1]
+
+
+def test_nested_calls_are_reported_separately_by_default():
+    # prepare
+    mock_disp: LineageDispatcherMock = create_autospec(LineageDispatcher)
+
+    @spline_agent.track_lineage(dispatcher=mock_disp, system_info=_DUMMY_NV)
+    @spline_agent.output('inner', WriteMode.OVERWRITE)
+    def inner():
+        pass
+
+    @spline_agent.track_lineage(dispatcher=mock_disp, system_info=_DUMMY_NV)
+    @spline_agent.output('outer', WriteMode.OVERWRITE)
+    def outer():
+        inner()
+
+    # execute
+    outer()
+
+    # verify
+    plans: list[ExecutionPlan] = [c.args[0] for c in mock_disp.send_plan.call_args_list]
+    assert [p.operations.write.outputSource for p in plans] == ['inner', 'outer']
+    assert all(len(p.operations.other) == 1 for p in plans)
@@ -0,0 +1,108 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import json
+import os
+import uuid
+from unittest.mock import Mock
+
+import pytest
+
+from spline_agent.json_serde import to_compact_json_str, to_pretty_json_str, ExtraInfo, PreSerializedMapping
+from spline_agent.lineage_model import ExecutionEvent
+from spline_agent.process_environment import ProcessEnvironment
+
+
+def test_snapshot_is_split_by_host_invariance():
+    # prepare
+    env = ProcessEnvironment()
+    env.register('version', lambda: '3.11', host_invariant=True)
+    env.register('host', lambda: 'node-1')
+
+    # execute
+    invariant, host, all_facts = env.invariant_snapshot(), env.host_snapshot(), env.snapshot()
+
+    # verify
+    assert dict(invariant) == {'version': '3.11'}
+    assert dict(host) == {'host': 'node-1'}
+    assert dict(all_facts) == {'version': '3.11', 'host': 'node-1'}
+
+
+def test_snapshot_is_collected_once():
+    # prepare
+    provider = Mock(return_value='bar')
+    env = ProcessEnvironment()
+    env.register('foo', provider)
+    env.register('none', lambda: None)
+    env.register('failing', Mock(side_effect=OSError('dummy')))
+
+    # execute
+    snapshots = [env.snapshot() for _ in range(3)]
+
+    # verify
+    assert provider.call_count == 1
+    assert all(s is snapshots[0] for s in snapshots)
+    assert dict(snapshots[0]) == {'foo': 'bar'}
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='requires fork()')
+def test_snapshot_is_refreshed_after_fork():
+    # prepare
+    env = ProcessEnvironment()
+    env.register('pid', os.getpid)
+    parent_pid = env.snapshot()['pid']
+    read_fd, write_fd = os.pipe()
+
+    # execute
+    pid = os.fork()
+    if pid == 0:
+        os.write(write_fd, str(env.snapshot()['pid']).encode())
+        os._exit(0)
+    os.close(write_fd)
+    os.waitpid(pid, 0)
+    with os.fdopen(read_fd) as f:
+        child_pid = int(f.read())
+
+    # verify
+    assert parent_pid == os.getpid()
+    assert child_pid == pid
+
+
+def test_shared_extra_serialization():
+    # prepare
+    shared = PreSerializedMapping({'system': 'Linux', 'versions': [1, 2]})
+    own = {'data_volume': [{'url': 'file://a', 'bytes_read': 1}], 'id': uuid.UUID(int=1)}
+    event = ExecutionEvent(uuid.UUID(int=2), 123, 456, None, ExtraInfo(shared, own))
+    expected = {'planId': str(uuid.UUID(int=2)), 'timestamp': 123, 'durationNs': 456, 'error': None,
+                'extra': {'system': 'Linux', 'versions': [1, 2],
+                          'data_volume': [{'url': 'file://a', 'bytes_read': 1}], 'id': str(uuid.UUID(int=1))}}
+
+    # execute
+    compact = to_compact_json_str([event, event])
+    pretty = to_pretty_json_str(event)
+
+    # verify
+    assert json.loads(compact) == [expected, expected]
+    assert compact == json.dumps([expected, expected], indent=0)
+    assert pretty == json.dumps(expected, indent=4)
+
+
+def test_extra_info_own_values_take_precedence():
+    # execute
+    extra = ExtraInfo(PreSerializedMapping({'a': 1, 'b': 2}), {'b': 3})
+
+    # verify
+    assert dict(extra) == {'a': 1, 'b': 3}
+    assert json.loads(to_compact_json_str(extra)) == {'a': 1, 'b': 3}
+    assert to_compact_json_str(ExtraInfo(PreSerializedMapping({}), {})) == '{}'
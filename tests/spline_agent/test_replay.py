@@ -0,0 +1,193 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import gzip
+import json
+
+import pytest
+
+from spline_agent.exceptions import ReplayError
+from spline_agent.lineage_file import EVENT_KIND, PLAN_KIND, envelope_json, read_records
+from spline_agent.msgpack_codec import FILE_MAGIC, encode_frame
+from spline_agent.replay import LineageReplayer
+from spline_agent.testing.fake_producer import FakeSplineProducer, ProducerBehavior
+
+
+@pytest.fixture
+def producer():
+    with FakeSplineProducer(seed=42) as p:
+        yield p
+
+
+def _plan(plan_id: str) -> dict:
+    return {'id': plan_id, 'operations': {}}
+
+
+def _event(plan_id: str, i: int) -> dict:
+    return {'planId': plan_id, 'timestamp': i}
+
+
+def _write_enveloped(path, plan_ids, events_per_plan):
+    with open(path, 'w') as f:
+        for plan_id in plan_ids:
+            f.write(envelope_json(PLAN_KIND, json.dumps(_plan(plan_id))) + '\n')
+            for i in range(events_per_plan):
+                f.write(envelope_json(EVENT_KIND, json.dumps(_event(plan_id, i))) + '\n')
+
+
+def test_replay_deduplicates_plans_and_batches_events(producer, tmp_path):
+    # prepare
+    _write_enveloped(tmp_path / 'a.ndjson', ['p1', 'p2'], 5)
+    with gzip.open(tmp_path / 'b.ndjson.gz', 'wt') as f:
+        f.write(json.dumps(_plan('p1')) + '\n')
+        f.write(json.dumps([_event('p1', 100), _event('p1', 101)]) + '\n\n')
+        f.write('not a JSON\n')
+    replayer = LineageReplayer(producer.url, batch_size=4, connections=2)
+
+    # execute
+    stats = replayer.replay([str(tmp_path / 'a.ndjson'), str(tmp_path / 'b.ndjson.gz')])
+
+    # verify
+    assert [p['id'] for p in producer.plans()] == ['p1', 'p2']
+    assert sorted((e['planId'], e['timestamp']) for e in producer.events()) == sorted(
+        [('p1', i) for i in range(5)] + [('p2', i) for i in range(5)] + [('p1', 100), ('p1', 101)])
+    assert (stats.plans_sent, stats.duplicate_plans, stats.events_sent) == (2, 1, 12)
+    assert producer.stats().requests == stats.requests == 2 + 4
+
+
+def test_replay_resumes_from_checkpoint(producer, tmp_path):
+    # prepare
+    _write_enveloped(tmp_path / 'a.ndjson', ['p1'], 3)
+    _write_enveloped(tmp_path / 'b.ndjson', ['p2'], 3)
+    files = [str(tmp_path / 'a.ndjson'), str(tmp_path / 'b.ndjson')]
+    checkpoint = str(tmp_path / 'checkpoint.json')
+
+    # execute
+    LineageReplayer(producer.url, checkpoint_path=checkpoint).replay(files[:1])
+    producer.behavior = ProducerBehavior(error_rate=1, error_status=400)
+    with pytest.raises(ReplayError):
+        LineageReplayer(producer.url, checkpoint_path=checkpoint).replay(files)
+    producer.behavior = ProducerBehavior()
+    producer.reset()
+    stats = LineageReplayer(producer.url, checkpoint_path=checkpoint).replay(files)
+
+    # verify
+    assert [p['id'] for p in producer.plans()] == ['p2']
+    assert {e['planId'] for e in producer.events()} == {'p2'}
+    assert stats.events_sent == 3
+    assert len(json.loads((tmp_path / 'checkpoint.json').read_text())['files']) == 2
+
+
+def test_replay_sends_appended_records_only(producer, tmp_path):
+    # prepare
+    path = tmp_path / 'a.ndjson'
+    _write_enveloped(path, ['p1'], 3)
+    checkpoint = str(tmp_path / 'checkpoint.json')
+    LineageReplayer(producer.url, checkpoint_path=checkpoint).replay([str(path)])
+    producer.reset()
+
+    # execute
+    with open(path, 'a') as f:
+        f.write(envelope_json(EVENT_KIND, json.dumps(_event('p1', 3))) + '\n')
+        # still being written
+        f.write(envelope_json(EVENT_KIND, json.dumps(_event('p1', 4)))[:10])
+    stats = LineageReplayer(producer.url, checkpoint_path=checkpoint).replay([str(path)])
+
+    # verify
+    assert producer.events() == [_event('p1', 3)]
+    assert stats.events_sent == 1
+
+
+def test_replay_skips_rotated_files(producer, tmp_path):
+    # prepare
+    path = tmp_path / 'a.ndjson'
+    _write_enveloped(path, ['p1'], 3)
+    checkpoint = str(tmp_path / 'checkpoint.json')
+    LineageReplayer(producer.url, checkpoint_path=checkpoint).replay([str(path)])
+    producer.reset()
+
+    # execute
+    renamed = tmp_path / 'a-1.ndjson'
+    path.rename(renamed)
+    with gzip.open(tmp_path / 'a-1.ndjson.gz', 'wb') as f:
+        f.write(renamed.read_bytes())
+    _write_enveloped(path, ['p2'], 1)
+    stats = LineageReplayer(producer.url, checkpoint_path=checkpoint).replay(
+        [str(renamed), str(tmp_path / 'a-1.ndjson.gz'), str(path)])
+
+    # verify
+    assert producer.plans() == [_plan('p2')]
+    assert producer.events() == [_event('p2', 0)]
+    assert stats.events_sent == 1
+
+
+def test_replay_tells_apart_files_starting_with_the_same_record(producer, tmp_path):
+    # prepare
+    _write_enveloped(tmp_path / 'a.ndjson', ['p1'], 0)
+    _write_enveloped(tmp_path / 'b.ndjson', ['p1'], 2)
+    checkpoint = str(tmp_path / 'checkpoint.json')
+    LineageReplayer(producer.url, checkpoint_path=checkpoint).replay([str(tmp_path / 'a.ndjson')])
+    producer.reset()
+
+    # execute
+    stats = LineageReplayer(producer.url, checkpoint_path=checkpoint).replay([str(tmp_path / 'b.ndjson')])
+
+    # verify
+    assert producer.plans() == [_plan('p1')]
+    assert producer.events() == [_event('p1', 0), _event('p1', 1)]
+    assert stats.events_sent == 2
+
+
+def test_replay_retries_transient_failures(producer, tmp_path):
+    # prepare
+    _write_enveloped(tmp_path / 'a.ndjson', ['p1'], 20)
+    producer.behavior = ProducerBehavior(error_rate=0.3, error_status=503)
+    replayer = LineageReplayer(producer.url, batch_size=1, retries=10, backoff_s=0)
+
+    # execute
+    stats = replayer.replay([str(tmp_path / 'a.ndjson')])
+
+    # verify
+    assert stats.events_sent == len(producer.events()) == 20
+    assert stats.retries == producer.stats().errors > 0
+
+
+def test_read_records_resumes_from_position(tmp_path):
+    # prepare
+    _write_enveloped(tmp_path / 'a.ndjson', ['p1'], 3)
+    records = list(read_records(str(tmp_path / 'a.ndjson')))
+
+    # execute
+    resumed = list(read_records(str(tmp_path / 'a.ndjson'), records[1].line, records[1].offset))
+
+    # verify
+    assert [r.kind for r in records] == [PLAN_KIND, EVENT_KIND, EVENT_KIND, EVENT_KIND]
+    assert resumed == records[2:]
+
+
+def test_replay_binary_file(producer, tmp_path):
+    # prepare
+    with open(tmp_path / 'a.msgpack', 'wb') as f:
+        f.write(FILE_MAGIC)
+        f.write(encode_frame(PLAN_KIND, _plan('p1')))
+        for i in range(3):
+            f.write(encode_frame(EVENT_KIND, _event('p1', i)))
+
+    # execute
+    stats = LineageReplayer(producer.url).replay([str(tmp_path / 'a.msgpack')])
+
+    # verify
+    assert producer.plans() == [_plan('p1')]
+    assert producer.events() == [_event('p1', i) for i in range(3)]
+    assert stats.events_sent == 3
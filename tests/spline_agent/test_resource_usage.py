@@ -0,0 +1,66 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+from unittest.mock import create_autospec
+
+import spline_agent
+from spline_agent.datasources import DataSource
+from spline_agent.dispatcher import LineageDispatcher
+from spline_agent.enums import WriteMode
+from spline_agent.lineage_model import NameAndVersion, ExecutionEvent
+from spline_agent.resource_usage import take_snapshot, usage_delta
+from .mocks import LineageDispatcherMock
+
+_DUMMY_NV = NameAndVersion(name="dummy", version="dummy")
+
+
+def test_usage_delta():
+    # prepare
+    start = take_snapshot()
+    _ = sum(i * i for i in range(100_000))
+    end = take_snapshot()
+
+    # execute
+    delta = usage_delta(start, end)
+
+    # verify
+    assert delta['duration_perf_ns'] > 0
+    assert delta['cpu_user_sec'] + delta['cpu_system_sec'] >= 0
+    assert delta['max_rss_bytes'] >= 0
+    assert 'perf_counter_ns' not in delta
+
+
+def test_resource_usage_is_attached_to_event_when_enabled():
+    # prepare
+    mock_disp: LineageDispatcherMock = create_autospec(LineageDispatcher)
+
+    @spline_agent.track_lineage(dispatcher=mock_disp, system_info=_DUMMY_NV, resource_usage=True)
+    @spline_agent.output(DataSource('dummy'), WriteMode.APPEND)
+    def test_func_with_usage():
+        pass
+
+    @spline_agent.track_lineage(dispatcher=mock_disp, system_info=_DUMMY_NV)
+    @spline_agent.output(DataSource('dummy'), WriteMode.APPEND)
+    def test_func_without_usage():
+        pass
+
+    # execute
+    test_func_with_usage()
+    event_with_usage: ExecutionEvent = mock_disp.send_event.call_args.args[0]
+    test_func_without_usage()
+    event_without_usage: ExecutionEvent = mock_disp.send_event.call_args.args[0]
+
+    # verify
+    assert event_with_usage.extra['resource_usage']['duration_perf_ns'] > 0
+    assert 'resource_usage' not in event_without_usage.extra
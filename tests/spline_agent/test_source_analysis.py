@@ -0,0 +1,142 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import importlib.util
+import os
+from typing import Optional
+from unittest.mock import create_autospec, patch
+
+from spline_agent.commons import utils
+from spline_agent.commons.configuration import DictConfiguration
+from spline_agent.dispatcher import LineageDispatcher
+from spline_agent.enums import WriteMode
+from spline_agent.lineage_model import NameAndVersion, ExecutionPlan
+from spline_agent.source_analysis import AstCache, CalleeFinder
+from spline_agent import track_lineage, output
+from .mocks import LineageDispatcherMock
+
+_DUMMY_NV = NameAndVersion(name="dummy", version="dummy")
+
+
+def _leaf():
+    return utils.camel_to_snake('Leaf')
+
+
+def _middle():
+    return _leaf() + str(os.getpid())
+
+
+def _root():
+    return _middle() + _leaf()
+
+
+def _finder(max_depth: int, packages: tuple[str, ...] = (), ast_cache: Optional[AstCache] = None) -> CalleeFinder:
+    finder = CalleeFinder(ast_cache or AstCache())
+    finder.max_depth = max_depth
+    finder.packages = packages
+    return finder
+
+
+def test_callees_up_to_max_depth():
+    # execute
+    no_callees = _finder(0).find_callees(_root)
+    direct_callees = _finder(1).find_callees(_root)
+    all_callees = _finder(5).find_callees(_root)
+
+    # verify
+    assert no_callees == []
+    assert direct_callees == [_middle, _leaf]
+    assert all_callees == [_middle, _leaf]
+
+
+def test_callees_in_configured_packages():
+    # execute
+    callees = _finder(5, packages=('spline_agent.commons',)).find_callees(_root)
+
+    # verify
+    assert callees == [_middle, _leaf, utils.camel_to_snake]
+
+
+def test_module_is_parsed_once():
+    # prepare
+    ast_cache = AstCache()
+
+    # execute
+    for func in (_root, _middle, _leaf, _root):
+        _finder(5, ast_cache=ast_cache).find_callees(func)
+
+    # verify
+    assert ast_cache.parse_count == 1
+
+
+def test_least_recently_used_module_is_evicted():
+    # prepare
+    ast_cache = AstCache()
+    ast_cache.get(__file__)
+    ast_cache.max_bytes = ast_cache.size_estimate
+
+    # execute
+    ast_cache.get(utils.__file__)
+    ast_cache.get(__file__)
+
+    # verify
+    assert ast_cache.parse_count == 3
+    assert ast_cache.size_estimate <= ast_cache.max_bytes
+
+
+def test_callees_are_found_once_until_the_source_is_modified(tmp_path):
+    # prepare
+    module_path = tmp_path / 'callees_module.py'
+    module_path.write_text('def leaf():\n    pass\n\n\ndef root():\n    leaf()\n')
+    spec = importlib.util.spec_from_file_location('callees_module', module_path)
+    assert spec is not None and spec.loader is not None
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    ast_cache = AstCache()
+    finder = _finder(5, ast_cache=ast_cache)
+
+    # execute
+    with patch.object(ast_cache, 'get', wraps=ast_cache.get) as get_module:
+        first = finder.find_callees(module.root)
+        second = finder.find_callees(module.root)
+        lookups_when_unmodified = get_module.call_count
+        st = os.stat(module_path)
+        os.utime(module_path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+        third = finder.find_callees(module.root)
+
+    # verify
+    assert first == second == third == [module.leaf]
+    assert lookups_when_unmodified == 2
+    assert get_module.call_count == 4
+
+
+def test_callees_in_plan():
+    # prepare
+    mock_disp: LineageDispatcherMock = create_autospec(LineageDispatcher)
+    config = DictConfiguration({'spline.source_capture.level': 'hash', 'spline.source_capture.callees.max_depth': 1})
+
+    @track_lineage(dispatcher=mock_disp, system_info=_DUMMY_NV, config=config)
+    @output('dummy', WriteMode.OVERWRITE)
+    def tracked_func():
+        return _middle()
+
+    # execute
+    tracked_func()
+
+    # verify
+    plan: ExecutionPlan = mock_disp.send_plan.call_args.args[0]
+    callees = plan.operations.other[0].extra['callees']
+    assert [(c['function_name'], c['module_name'], c['source_file']) for c in callees] == [
+        ('_middle', __name__, __file__)]
+    assert callees[0]['source_hash'].startswith('sha256:')
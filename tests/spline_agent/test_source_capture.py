@@ -0,0 +1,161 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import hashlib
+import inspect
+from typing import Any, Optional
+from unittest.mock import create_autospec, patch
+
+import pytest
+
+import spline_agent
+from spline_agent.commons.configuration import DictConfiguration
+from spline_agent.dispatcher import LineageDispatcher
+from spline_agent.enums import WriteMode
+from spline_agent.lineage_model import NameAndVersion, ExecutionPlan
+from spline_agent.source_capture import source_capture, SourceCapture
+from .mocks import LineageDispatcherMock
+
+_DUMMY_NV = NameAndVersion(name="dummy", version="dummy")
+
+
+@pytest.fixture(autouse=True)
+def reset_source_capture():
+    source_capture.reset()
+    yield
+    source_capture.reset()
+
+
+def _dummy_func():
+    return 'dummy'
+
+
+_DUMMY_FUNC_SOURCE = inspect.getsource(_dummy_func)
+_DUMMY_FUNC_HASH = f'sha256:{hashlib.sha256(_DUMMY_FUNC_SOURCE.encode("utf-8")).hexdigest()}'
+
+
+def _harvest_plans(settings: dict[str, Any], calls: int = 1, func=_dummy_func) -> list[ExecutionPlan]:
+    mock_disp: LineageDispatcherMock = create_autospec(LineageDispatcher)
+    tracked_func = spline_agent.track_lineage(
+        dispatcher=mock_disp, system_info=_DUMMY_NV, config=DictConfiguration(settings))(
+        spline_agent.output('dummy', WriteMode.OVERWRITE)(func))
+    for _ in range(calls):
+        tracked_func()
+    return [c.args[0] for c in mock_disp.send_plan.call_args_list]
+
+
+def _op_extra(plan: ExecutionPlan) -> dict[str, Any]:
+    return dict(plan.operations.other[0].extra)
+
+
+def test_full_source_is_sent_once():
+    # execute
+    plan1, plan2 = _harvest_plans({'spline.source_capture.level': 'full'}, calls=2)
+
+    # verify
+    assert _op_extra(plan1)['source_hash'] == _DUMMY_FUNC_HASH
+    assert 'source_code' not in _op_extra(plan1)
+    assert _op_extra(plan1)['source_file'] == __file__
+    assert plan1.extraInfo['source_blobs'] == {_DUMMY_FUNC_HASH: _DUMMY_FUNC_SOURCE}
+    assert 'source_blobs' not in plan2.extraInfo
+    assert plan1.id == plan2.id
+
+
+def test_full_source_is_attached_until_sent():
+    # prepare
+    mock_disp: LineageDispatcherMock = create_autospec(LineageDispatcher)
+    mock_disp.send_plan.side_effect = [IOError('boom'), None, None]
+    tracked_func = spline_agent.track_lineage(
+        dispatcher=mock_disp, system_info=_DUMMY_NV, config=DictConfiguration({'spline.source_capture.level': 'full'}))(
+        spline_agent.output('dummy', WriteMode.OVERWRITE)(_dummy_func))
+
+    # execute
+    with pytest.raises(IOError):
+        tracked_func()
+    tracked_func()
+    tracked_func()
+
+    # verify
+    plan1, plan2, plan3 = [c.args[0] for c in mock_disp.send_plan.call_args_list]
+    assert plan1.extraInfo['source_blobs'] == plan2.extraInfo['source_blobs'] == {_DUMMY_FUNC_HASH: _DUMMY_FUNC_SOURCE}
+    assert 'source_blobs' not in plan3.extraInfo
+
+
+def test_full_source_is_stored_in_blob_dir(tmp_path):
+    # execute
+    plan, = _harvest_plans({'spline.source_capture.level': 'full', 'spline.source_capture.blob_dir': str(tmp_path)})
+
+    # verify
+    assert 'source_blobs' not in plan.extraInfo
+    digest = _DUMMY_FUNC_HASH.partition(':')[2]
+    assert (tmp_path / 'sha256' / digest[:2] / digest).read_text() == _DUMMY_FUNC_SOURCE
+
+
+@pytest.mark.parametrize('level, expected_source_code', [
+    ('none', None),
+    ('hash', None),
+    ('truncated', _DUMMY_FUNC_SOURCE[:10]),
+])
+def test_capture_levels(level: str, expected_source_code: Optional[str]):
+    # execute
+    plan, = _harvest_plans({'spline.source_capture.level': level, 'spline.source_capture.max_length': 10})
+
+    # verify
+    extra = _op_extra(plan)
+    assert extra.get('source_hash') == (None if level == 'none' else _DUMMY_FUNC_HASH)
+    assert extra.get('source_code') == expected_source_code
+    assert 'source_blobs' not in plan.extraInfo
+
+
+def test_source_not_available():
+    # prepare
+    namespace: dict[str, Any] = {}
+    exec('def generated_func():\n    pass\n', namespace)
+
+    # execute
+    plan, = _harvest_plans({}, func=namespace['generated_func'])
+
+    # verify
+    assert 'source_hash' not in _op_extra(plan)
+
+
+def test_large_file_is_memory_mapped():
+    # prepare
+    capture = SourceCapture()
+    expected_blob = capture.blob(_dummy_func)
+    capture.reset()
+
+    # execute
+    with patch('spline_agent.source_capture.MMAP_THRESHOLD_BYTES', 0), \
+            patch('spline_agent.source_capture.inspect.getsource', side_effect=AssertionError('not mmap')):
+        blob = capture.blob(_dummy_func)
+
+    # verify
+    assert expected_blob is not None and blob is not None
+    assert blob.text == expected_blob.text == _DUMMY_FUNC_SOURCE
+    assert blob.hash == expected_blob.hash
+
+
+def test_cache_is_bounded():
+    # prepare
+    capture = SourceCapture(cache_size=1)
+
+    # execute
+    blob1 = capture.blob(_dummy_func)
+    capture.blob(test_cache_is_bounded)
+    blob2 = capture.blob(_dummy_func)
+
+    # verify
+    assert blob1 is not blob2
+    assert capture.blob(_dummy_func) is blob2
@@ -0,0 +1,126 @@
+#  Copyright 2023 ABSA Group Limited
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import pytest
+import requests
+
+import spline_agent
+from spline_agent.dispatchers.http_dispatcher import HttpLineageDispatcher
+from spline_agent.enums import WriteMode
+from spline_agent.lineage_model import NameAndVersion
+from spline_agent.testing.fake_producer import (
+    EVENTS_PATH, PLANS_PATH, FakeSplineProducer, ProducerBehavior,
+)
+from spline_agent.testing.load_generator import generate_load
+
+_DUMMY_NV = NameAndVersion(name="dummy", version="dummy")
+
+
+@pytest.fixture
+def producer():
+    with FakeSplineProducer(seed=42) as p:
+        yield p
+
+
+def _dispatcher(producer: FakeSplineProducer) -> HttpLineageDispatcher:
+    return HttpLineageDispatcher(producer.url, PLANS_PATH, EVENTS_PATH, 'application/json')
+
+
+def test_records_dispatched_lineage(producer):
+    # prepare
+    @spline_agent.track_lineage(dispatcher=_dispatcher(producer), system_info=_DUMMY_NV)
+    @spline_agent.inputs('file:///in.csv')
+    @spline_agent.output('file:///out.csv', WriteMode.OVERWRITE)
+    def test_func():
+        pass
+
+    # execute
+    test_func()
+
+    # verify
+    plans = producer.plans()
+    events = producer.events()
+    assert len(plans) == 1
+    assert plans[0]['operations']['write']['outputSource'] == 'file:///out.csv'
+    assert [e['planId'] for e in events] == [plans[0]['id']]
+    assert producer.requests[0].headers['Content-Type'] == 'application/json'
+    stats = producer.stats()
+    assert (stats.requests, stats.plans, stats.events, stats.errors, stats.resets) == (2, 1, 1, 0, 0)
+    assert stats.bytes_received == sum(len(r.body) for r in producer.requests)
+
+
+def test_error_status(producer):
+    # prepare
+    producer.behavior = ProducerBehavior(error_rate=1, error_status=500)
+
+    # execute
+    res = requests.post(f'{producer.url}/{EVENTS_PATH}', json=[])
+
+    # verify
+    assert res.status_code == 500
+    assert producer.requests[0].status == 500
+    assert producer.stats().errors == 1
+    assert producer.events() == []
+
+
+def test_connection_reset(producer):
+    # prepare
+    producer.behavior = ProducerBehavior(reset_rate=1)
+
+    # execute
+    with pytest.raises(requests.ConnectionError):
+        requests.post(f'{producer.url}/{PLANS_PATH}', json={'id': 'dummy'})
+
+    # verify
+    assert producer.requests[0].status is None
+    assert producer.stats().resets == 1
+
+
+def test_latency_and_slow_read(producer):
+    # prepare
+    producer.behavior = ProducerBehavior(latency_s=0.05, read_bytes_per_s=100_000)
+
+    # execute
+    res = requests.post(f'{producer.url}/{PLANS_PATH}', json={'id': 'dummy', 'padding': 'x' * 10_000})
+
+    # verify
+    assert res.status_code == 201
+    assert res.json() == 'dummy'
+    assert res.elapsed.total_seconds() >= 0.15
+
+
+def test_unknown_path(producer):
+    # execute
+    res = requests.post(f'{producer.url}/unknown', json={})
+
+    # verify
+    assert res.status_code == 404
+    assert producer.requests[0].kind is None
+
+
+def test_load_generator(producer):
+    # prepare
+    producer.behavior = ProducerBehavior(error_rate=0.5)
+
+    # execute
+    report = generate_load(producer.url, threads=3, calls=10)
+
+    # verify
+    stats = producer.stats()
+    assert report.calls == 30
+    assert report.errors == stats.errors
+    assert 0 < report.errors < 30
+    assert stats.plans + stats.events + stats.errors == stats.requests
+    assert report.percentile(50) <= report.percentile(99) <= report.latencies_ns[-1]
+    assert report.calls_per_s > 0